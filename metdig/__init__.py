@@ -1,18 +1,27 @@
 __author__ = "The R & D Center for Weather Forecasting Technology in NMC, CMA"
 __version__ = '1.0.7.1'
 
-from . import cal
-from . import graphics
-from . import hub
-from . import io
-from . import onestep
-from . import products
-from . import utl
-from . import package_tools
+import importlib
 
 import logging
 _log = logging.getLogger(__name__)
 
+# utl较轻且需要注册xarray的stda访问器(da.stda)，import metdig时直接导入
+from . import utl
+
+# 其余子包在第一次访问时才导入（如metdig.io、metdig.cal），避免import metdig时加载cartopy/meteva等重量级依赖
+_submodules = ['cal', 'graphics', 'hub', 'io', 'onestep', 'products', 'package_tools']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _submodules)
+
 
 def _ensure_handler():
     """
@@ -6,7 +6,7 @@
 
 import numpy as np
 import xarray as xr
-from numba import njit
+from numba import njit, prange
 
 import metpy.calc as mpcalc
 from metpy.units import units
@@ -93,35 +93,70 @@ def vertical_velocity(vvel, tmp, mir=0):
     w = utl.quantity_to_stda_byreference('w', w, vvel)
     return w
 
+def _grid_deltas(stda):
+    '''
+
+    [网格距只计算一次，并扩展成与stda相同的维数，用于对整个(member, level, time, dtime, lat, lon)数组一次性差分]
+
+    Arguments:
+        stda {[stda]} -- [网格stda]
+
+    Returns:
+        [quantity] -- [dx，lon维长度比stda少1，其余非经纬度维长度为1]
+        [quantity] -- [dy，lat维长度比stda少1，其余非经纬度维长度为1]
+        [int] -- [x_dim，lon维所在的轴]
+        [int] -- [y_dim，lat维所在的轴]
+    '''
+    x_dim = stda.get_axis_num('lon')
+    y_dim = stda.get_axis_num('lat')
+
+    dx, dy = mpcalc.lat_lon_grid_deltas(stda['lon'].values, stda['lat'].values)  # (lat, lon)
+    if y_dim > x_dim:
+        dx, dy = dx.T, dy.T
+
+    other_axes = tuple(i for i in range(stda.ndim) if i not in (x_dim, y_dim))
+    dx = np.expand_dims(dx.magnitude, other_axes) * dx.units
+    dy = np.expand_dims(dy.magnitude, other_axes) * dy.units
+    return dx, dy, x_dim, y_dim
+
+
+def _grid_latitude(stda):
+    '''
+
+    [纬度扩展成与stda相同的维数，用于计算地转参数]
+
+    Arguments:
+        stda {[stda]} -- [网格stda]
+
+    Returns:
+        [quantity] -- [纬度，除lat维外其余维长度为1]
+    '''
+    shape = [1] * stda.ndim
+    shape[stda.get_axis_num('lat')] = stda['lat'].size
+    return stda['lat'].values.reshape(shape) * units('degrees')
+
+
 @check_stda(['var', 'u', 'v'])
 @unifydim_stda(['var', 'u', 'v'])
 def var_advect(var, u, v):
     '''
 
-    [Calculate the absolute vorticity of the horizontal wind.]
+    [Calculate the advection of a scalar field by the horizontal wind.]
 
     Arguments:
         var {[stda]} -- [any variable.]
         u {[stda]} -- [x component of the wind.]
         v {[stda]} -- [y component of the wind. ]
     '''
+    dx, dy, x_dim, y_dim = _grid_deltas(u)
+
+    var_p = utl.stda_to_quantity(var.transpose(*u.dims))
+    u_p = utl.stda_to_quantity(u)  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*u.dims))  # m/s
+
+    adv_p = mpcalc.advection(var_p, u=u_p, v=v_p, dx=dx, dy=dy, x_dim=x_dim, y_dim=y_dim)
 
-    dx, dy = mpcalc.lat_lon_grid_deltas(u['lon'].values, u['lat'].values)
-    adv = xr.zeros_like(u).copy()
-    for ilvl in var['level'].values:
-        for it in var['time'].values:
-            for idt in var['dtime'].values:
-                for imdl in var['member'].values:
-                    u2d = u.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    v2d = v.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    var2d = var.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    u2d = utl.stda_to_quantity(u2d)
-                    v2d = utl.stda_to_quantity(v2d)
-                    var2d = utl.stda_to_quantity(var2d)
-                    adv2d = mpcalc.advection(var2d, u=u2d, v=v2d, dx=dx, dy=dy)
-                    adv.loc[dict(level=ilvl, time=it, dtime=idt, member=imdl)] = np.array(adv2d)
-                    adv.attrs['var_units'] = str(adv2d.units)
-    adv = utl.quantity_to_stda_byreference(var.attrs['var_name']+'adv', adv.values * units(adv.attrs['var_units']), u)
+    adv = utl.quantity_to_stda_byreference(var.attrs['var_name']+'adv', adv_p, u)
     return adv
 
 
@@ -136,30 +171,14 @@ def vorticity(u, v):
         u {[stda]} -- [x component of the wind. ]
         v {[stda]} -- [y component of the wind. ]
     '''
+    dx, dy, x_dim, y_dim = _grid_deltas(u)
 
-    x, y = np.meshgrid(u['lon'].values, u['lat'].values)
-    x = x * units('degrees')
-    y = y * units('degrees')
-
-    dx, dy = mpcalc.lat_lon_grid_deltas(u['lon'].values, u['lat'].values)
-
-    vort = v.copy(deep=True)
-    for ilvl in u['level'].values:
-        for it in u['time'].values:
-            for idt in u['dtime'].values:
-                for imdl in u['member'].values:
-                    u2d = u.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    v2d = v.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-
-                    u2d = utl.stda_to_quantity(u2d)  # m/s
-                    v2d = utl.stda_to_quantity(v2d)  # m/s
-
-                    vort2d = mpcalc.vorticity(u2d, v2d, dx=dx, dy=dy)  # 垂直涡度  '1 / second'
+    u_p = utl.stda_to_quantity(u)  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*u.dims))  # m/s
 
-                    vort.loc[dict(level=ilvl, time=it, dtime=idt, member=imdl)] = np.array(vort2d)
-                    vort.attrs['var_units'] = str(vort2d.units)
+    vort_p = mpcalc.vorticity(u_p, v_p, dx=dx, dy=dy, x_dim=x_dim, y_dim=y_dim)  # 垂直涡度  '1 / second'
 
-    vort = utl.quantity_to_stda_byreference('vort', vort.values * units(vort.attrs['var_units']), u)
+    vort = utl.quantity_to_stda_byreference('vort', vort_p, u)
 
     return vort
 
@@ -176,31 +195,15 @@ def frontogenesis(thta, u, v):
         u {[stda]} -- [x component of the wind. ]
         v {[stda]} -- [y component of the wind. ]
     '''
-    x, y = np.meshgrid(u['lon'].values, u['lat'].values)
-    x = x * units('degrees')
-    y = y * units('degrees')
-
-    dx, dy = mpcalc.lat_lon_grid_deltas(u['lon'].values, u['lat'].values)
-
-    fg = v.copy(deep=True)
-    for ilvl in u['level'].values:
-        for it in u['time'].values:
-            for idt in u['dtime'].values:
-                for imdl in u['member'].values:
-                    thta2d = thta.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    u2d = u.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    v2d = v.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
+    dx, dy, x_dim, y_dim = _grid_deltas(u)
 
-                    thta2d = utl.stda_to_quantity(thta2d)  # degC
-                    u2d = utl.stda_to_quantity(u2d)  # m/s
-                    v2d = utl.stda_to_quantity(v2d)  # m/s
-
-                    fg2d = mpcalc.frontogenesis(thta2d, u2d, v2d, dx=dx, dy=dy)  # kelvin / meter / second
+    thta_p = utl.stda_to_quantity(thta.transpose(*u.dims))  # degC
+    u_p = utl.stda_to_quantity(u)  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*u.dims))  # m/s
 
-                    fg.loc[dict(level=ilvl, time=it, dtime=idt, member=imdl)] = np.array(fg2d)
-                    fg.attrs['var_units'] = str(fg2d.units)
+    fg_p = mpcalc.frontogenesis(thta_p, u_p, v_p, dx=dx, dy=dy, x_dim=x_dim, y_dim=y_dim)  # kelvin / meter / second
 
-    fg = utl.quantity_to_stda_byreference('fg', fg.values * units(fg.attrs['var_units']), u)
+    fg = utl.quantity_to_stda_byreference('fg', fg_p, u)
 
     return fg
 
@@ -216,30 +219,15 @@ def absolute_vorticity(u, v):
         u {[stda]} -- [x component of the wind. ]
         v {[stda]} -- [y component of the wind. ]
     '''
+    dx, dy, x_dim, y_dim = _grid_deltas(u)
+    lats = _grid_latitude(u)
 
-    x, y = np.meshgrid(u['lon'].values, u['lat'].values)
-    x = x * units('degrees')
-    y = y * units('degrees')
-
-    dx, dy = mpcalc.lat_lon_grid_deltas(u['lon'].values, u['lat'].values)
-
-    absv = v.copy(deep=True)
-    for ilvl in u['level'].values:
-        for it in u['time'].values:
-            for idt in u['dtime'].values:
-                for imdl in u['member'].values:
-                    u2d = u.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-                    v2d = v.sel(level=ilvl, time=it, dtime=idt, member=imdl).squeeze()
-
-                    u2d = utl.stda_to_quantity(u2d)  # m/s
-                    v2d = utl.stda_to_quantity(v2d)  # m/s
-
-                    absv2d = mpcalc.absolute_vorticity(u2d, v2d, dx, dy, y)  # 绝对涡度  '1 / second'
+    u_p = utl.stda_to_quantity(u)  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*u.dims))  # m/s
 
-                    absv.loc[dict(level=ilvl, time=it, dtime=idt, member=imdl)] = np.array(absv2d)
-                    absv.attrs['var_units'] = str(absv2d.units)
+    absv_p = mpcalc.absolute_vorticity(u_p, v_p, dx, dy, lats, x_dim=x_dim, y_dim=y_dim)  # 绝对涡度  '1 / second'
 
-    absv = utl.quantity_to_stda_byreference('absv', absv.values * units(absv.attrs['var_units']), u)
+    absv = utl.quantity_to_stda_byreference('absv', absv_p, u)
 
     return absv
 
@@ -260,34 +248,18 @@ def potential_vorticity_baroclinic(thta, pres, u, v):
     Returns:
         [stda] -- [baroclinic potential vorticity]
     '''
+    dx, dy, x_dim, y_dim = _grid_deltas(thta)
+    lats = _grid_latitude(thta)
 
-    lons = thta['lon'].values
-    lats = thta['lat'].values
-
-    dx, dy = mpcalc.lat_lon_grid_deltas(lons, lats)
-    dx = dx[np.newaxis, :, :]
-    dy = dy[np.newaxis, :, :]
-    lats = lats[np.newaxis, :, np.newaxis] * units('degrees')
+    thta_p = utl.stda_to_quantity(thta)  # degC
+    pres_p = utl.stda_to_quantity(pres.transpose(*thta.dims))  # hPa
+    u_p = utl.stda_to_quantity(u.transpose(*thta.dims))  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*thta.dims))  # m/s
 
-    pv = thta.copy(deep=True)
-    for it in thta['time'].values:
-        for idt in thta['dtime'].values:
-            for imdl in thta['member'].values:
-                thta3d = thta.sel(time=it, dtime=idt, member=imdl)
-                pres3d = pres.sel(time=it, dtime=idt, member=imdl)
-                u3d = u.sel(time=it, dtime=idt, member=imdl)
-                v3d = v.sel(time=it, dtime=idt, member=imdl)
+    pv_p = mpcalc.potential_vorticity_baroclinic(thta_p, pres_p, u_p, v_p, dx, dy, lats,
+                                                 x_dim=x_dim, y_dim=y_dim, vertical_dim=thta.get_axis_num('level'))
 
-                thta3d = utl.stda_to_quantity(thta3d)  # degC
-                pres3d = utl.stda_to_quantity(pres3d)  # hPa
-                u3d = utl.stda_to_quantity(u3d)  # m/s
-                v3d = utl.stda_to_quantity(v3d)  # m/s
-
-                pv3d = mpcalc.potential_vorticity_baroclinic(thta3d, pres3d, u3d, v3d, dx, dy, lats)
-                pv.loc[dict(time=it, dtime=idt, member=imdl)] = np.array(pv3d)
-                pv.attrs['var_units'] = str(pv3d.units)
-
-    pv = utl.quantity_to_stda_byreference('pv', pv.values * units(pv.attrs['var_units']), thta)
+    pv = utl.quantity_to_stda_byreference('pv', pv_p, thta)
 
     return pv
 
@@ -306,18 +278,12 @@ def divergence(u, v):
     Returns:
         [stda] -- [The horizontal divergence]
     '''
-    u_p = utl.stda_to_quantity(u)  # m/s
-    v_p = utl.stda_to_quantity(v)  # m/s
-
-    lons = u['lon'].values
-    lats = u['lat'].values
+    dx, dy, x_dim, y_dim = _grid_deltas(u)
 
-    dx, dy = mpcalc.lat_lon_grid_deltas(lons, lats)
-
-    dx = dx[np.newaxis, np.newaxis, np.newaxis, np.newaxis, :, :]
-    dy = dy[np.newaxis, np.newaxis, np.newaxis, np.newaxis, :, :]
+    u_p = utl.stda_to_quantity(u)  # m/s
+    v_p = utl.stda_to_quantity(v.transpose(*u.dims))  # m/s
 
-    div_p = mpcalc.divergence(u_p, v_p, dx=dx, dy=dy)
+    div_p = mpcalc.divergence(u_p, v_p, dx=dx, dy=dy, x_dim=x_dim, y_dim=y_dim)
 
     div = utl.quantity_to_stda_byreference('div', div_p, u)
 
@@ -340,124 +306,102 @@ def shear_vorticity(u, v, fill_value=np.nan):
         [stda] -- [shear_vort: shear_component_of_atmosphere_upward_relative_vorticity]
         [stda] -- [curve_vort: curvature_component_atmosphere_upward_relative_vorticity]
     '''
+    u = u.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+    v = v.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
 
-    lons = u['lon'].values
-    lats = u['lat'].values
-    
-    vort = xr.full_like(u, fill_value=fill_value, dtype=np.float64)
-    shear_vort = xr.full_like(u, fill_value=fill_value, dtype=np.float64)
-    curve_vort = xr.full_like(u, fill_value=fill_value, dtype=np.float64)
-
-    for imember in u.member.values:
-        for ilevel in u.level.values:
-            for idtime in u.dtime.values:
-                for itime in u.time.values:
-                    _u_1d = u.sel(member=imember, level=ilevel, dtime=idtime, time=itime)
-                    _v_1d = v.sel(member=imember, level=ilevel, dtime=idtime, time=itime)
-                    _u_1d_p = utl.stda_to_quantity(_u_1d)  # m/s
-                    _v_1d_p = utl.stda_to_quantity(_v_1d)  # m/s
-                    _vor, _shear, _curve = __vorticity(np.asarray(_u_1d_p), np.asarray(_v_1d_p), lons, lats, fill_value)
-                    vort.loc[dict(member=imember, level=ilevel, dtime=idtime, time=itime)] = _vor
-                    shear_vort.loc[dict(member=imember, level=ilevel, dtime=idtime, time=itime)] = _shear
-                    curve_vort.loc[dict(member=imember, level=ilevel, dtime=idtime, time=itime)] = _curve
-    
-    vort = utl.quantity_to_stda_byreference('vort', vort.values * units('1/s'), u)
-    shear_vort = utl.quantity_to_stda_byreference('shear_vort', shear_vort.values * units('1/s'), u)
-    curve_vort = utl.quantity_to_stda_byreference('curve_vort', curve_vort.values * units('1/s'), u)
+    lons = u['lon'].values.astype(np.float64)
+    lats = u['lat'].values.astype(np.float64)
+    dx, dy = __vorticity_deltas(lons, lats)
 
-    return vort, shear_vort, curve_vort
+    # 前四维展开成一维，所有二维场在一次并行调用中计算，结果直接写入预先分配的数组
+    shape = u.shape
+    _u = np.ascontiguousarray(np.asarray(utl.stda_to_quantity(u)), dtype=np.float64).reshape((-1,) + shape[-2:])  # m/s
+    _v = np.ascontiguousarray(np.asarray(utl.stda_to_quantity(v)), dtype=np.float64).reshape((-1,) + shape[-2:])  # m/s
+    vor = np.full(_u.shape, np.nan, dtype=np.float64)
+    shear = np.full(_u.shape, np.nan, dtype=np.float64)
+    __vorticity(_u, _v, dx, dy, vor, shear)
 
-@njit()
-def __vorticity(u, v, lon, lat, fill_value):
-    vor = np.zeros_like(u, dtype=np.float64)
-    shear = np.zeros_like(u, dtype=np.float64)
-    curve = np.zeros_like(u, dtype=np.float64)
-    v1 = np.zeros(2)
-    v2 = np.zeros(2)
-
-    # loop over all grid points
-    for y in range(1, u.shape[0]-1):
-        for x in range(1, u.shape[1]-1):
-            # any missing values?
-            if np.isnan(u[y,x]) or np.isnan(u[y,x+1]) or np.isnan(u[y,x-1]) \
-                or np.isnan(u[y+1,x]) or np.isnan(u[y-1,x]) \
-                or np.isnan(v[y,x]) or np.isnan(v[y,x+1]) or np.isnan(v[y,x-1]) \
-                or np.isnan(v[y+1,x]) or np.isnan(v[y-1,x]):
-                vor[y,x] = np.NaN
-                shear[y,x] = np.NaN
-                curve[y,x] = np.NaN
-            
-            # distance on globe
-            dx = distance(lat[y], lat[y], lon[x+1], lon[x-1], input_in_radian=False)
-            dy = distance(lat[y-1], lat[y+1], lon[x], lon[x], input_in_radian=False)
-            vor[y,x] = (v[y,x+1]-v[y,x-1]) / dx - (u[y+1,x]-u[y-1,x]) / dy
-
-            # calculate shear-vorticity
-            # calculate the wind direction
-            wdir = np.arctan2(u[y,x], v[y,x])
-            wspd = np.sqrt(u[y,x]**2 + v[y,x]**2)
-            sin_wdir = np.sin(wdir)
-            cos_wdir = np.cos(wdir)
-
-            # calculate dot-product for four points around the reference point to the reference vector.
-            # Use the wind component parallel to the reference vector from all four points and calculate
-            # the vorticity based on this component, which results in the shear vorticity.
-            #
-            # This approach follows Berry et al. 2006.
-            # Points:
-            #    c
-            #  b r a
-            #    d
-
-            # point a
-            v1[0] = u[y,x]
-            v1[1] = v[y,x]
-            v2[0] = u[y,x+1]
-            v2[1] = v[y,x+1]
-            dp = np.dot(v1, v2) / wspd
-            v_a = dp * cos_wdir
-
-            # point b
-            v2[0] = u[y,x-1]
-            v2[1] = v[y,x-1]
-            dp = np.dot(v1, v2) / wspd
-            v_b = dp * cos_wdir
-
-            # point c
-            v2[0] = u[y+1,x]
-            v2[1] = v[y+1,x]
-            dp = np.dot(v1, v2) / wspd
-            u_c = dp * sin_wdir
-
-            # point d 
-            v2[0] = u[y-1,x]
-            v2[1] = v[y-1,x]
-            dp = np.dot(v1, v2) / wspd
-            u_d = dp * sin_wdir
-
-            # calculate the shear vorticity
-            shear[y,x] = (v_a-v_b) / dx - (u_c-u_d) / dy
-    
-    # fill values at the borders
-    vor[0,:] = np.NaN
-    vor[-1,:] = np.NaN
-    vor[:,0] = np.NaN
-    vor[:,-1] = np.NaN
-    
-    shear[0,:] = np.NaN
-    shear[-1,:] = np.NaN
-    shear[:,0] = np.NaN
-    shear[:,-1] = np.NaN
-    
-    # calculate curvature-vorticity 
-    curve = np.where(np.logical_or(np.isnan(vor), np.isnan(shear)), np.NaN, vor-shear)
+    # calculate curvature-vorticity
+    curve = vor - shear
 
     # replace fill values if something different from NaN is used
     if not np.isnan(fill_value):
-        vor = np.where(np.isnan(vor), fill_value, vor)
-        shear = np.where(np.isnan(shear), fill_value, shear)
-        curve = np.where(np.isnan(curve), fill_value, curve)
-    return vor, shear, curve
+        vor[np.isnan(vor)] = fill_value
+        shear[np.isnan(shear)] = fill_value
+        curve[np.isnan(curve)] = fill_value
+
+    vort = utl.quantity_to_stda_byreference('vort', vor.reshape(shape) * units('1/s'), u)
+    shear_vort = utl.quantity_to_stda_byreference('shear_vort', shear.reshape(shape) * units('1/s'), u)
+    curve_vort = utl.quantity_to_stda_byreference('curve_vort', curve.reshape(shape) * units('1/s'), u)
+
+    return vort, shear_vort, curve_vort
+
+@njit()
+def __vorticity_deltas(lon, lat):
+    '''
+    [中央差分的格距只与经纬度有关，提前计算一次：dx[y, x]为(x-1, x+1)两点距离，dy[y]为(y-1, y+1)两点距离]
+    '''
+    dx = np.full((lat.shape[0], lon.shape[0]), np.nan)
+    dy = np.full(lat.shape[0], np.nan)
+    for y in range(1, lat.shape[0]-1):
+        dy[y] = distance(lat[y-1], lat[y+1], lon[0], lon[0], input_in_radian=False)
+        for x in range(1, lon.shape[0]-1):
+            dx[y,x] = distance(lat[y], lat[y], lon[x+1], lon[x-1], input_in_radian=False)
+    return dx, dy
+
+@njit(parallel=True, error_model='numpy')
+def __vorticity(u, v, dx, dy, vor, shear):
+    '''
+    [u, v为(n, lat, lon)，对n个二维场并行计算，vor, shear为预先分配好的输出数组(初始值为nan，边界及缺测处保持nan)]
+    '''
+    # loop over all fields and grid points
+    for i in prange(u.shape[0]):
+        for y in range(1, u.shape[1]-1):
+            for x in range(1, u.shape[2]-1):
+                # any missing values?
+                if np.isnan(u[i,y,x]) or np.isnan(u[i,y,x+1]) or np.isnan(u[i,y,x-1]) \
+                    or np.isnan(u[i,y+1,x]) or np.isnan(u[i,y-1,x]) \
+                    or np.isnan(v[i,y,x]) or np.isnan(v[i,y,x+1]) or np.isnan(v[i,y,x-1]) \
+                    or np.isnan(v[i,y+1,x]) or np.isnan(v[i,y-1,x]):
+                    continue
+
+                vor[i,y,x] = (v[i,y,x+1]-v[i,y,x-1]) / dx[y,x] - (u[i,y+1,x]-u[i,y-1,x]) / dy[y]
+
+                # calculate shear-vorticity
+                # calculate the wind direction
+                wdir = np.arctan2(u[i,y,x], v[i,y,x])
+                wspd = np.sqrt(u[i,y,x]**2 + v[i,y,x]**2)
+                sin_wdir = np.sin(wdir)
+                cos_wdir = np.cos(wdir)
+
+                # calculate dot-product for four points around the reference point to the reference vector.
+                # Use the wind component parallel to the reference vector from all four points and calculate
+                # the vorticity based on this component, which results in the shear vorticity.
+                #
+                # This approach follows Berry et al. 2006.
+                # Points:
+                #    c
+                #  b r a
+                #    d
+
+                # point a
+                dp = (u[i,y,x] * u[i,y,x+1] + v[i,y,x] * v[i,y,x+1]) / wspd
+                v_a = dp * cos_wdir
+
+                # point b
+                dp = (u[i,y,x] * u[i,y,x-1] + v[i,y,x] * v[i,y,x-1]) / wspd
+                v_b = dp * cos_wdir
+
+                # point c
+                dp = (u[i,y,x] * u[i,y+1,x] + v[i,y,x] * v[i,y+1,x]) / wspd
+                u_c = dp * sin_wdir
+
+                # point d
+                dp = (u[i,y,x] * u[i,y-1,x] + v[i,y,x] * v[i,y-1,x]) / wspd
+                u_d = dp * sin_wdir
+
+                # calculate the shear vorticity
+                shear[i,y,x] = (v_a-v_b) / dx[y,x] - (u_c-u_d) / dy[y]
 
 @check_stda(['hgt', 'u', 'v'])
 @unifydim_stda(['hgt', 'u', 'v'])
@@ -8,17 +8,24 @@ date: 2023-5-25
 
 import os
 import json
+import time
+import threading
+import functools
+from collections import deque
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import pkg_resources
-import meteva.base as meb
+# meteva导入较慢，在用到的函数中才导入
 
 from metdig.cal.lib import utility as utl
 from metdig.cal.lib.utility import unifydim_stda, check_stda
 
 from metdig.io.lib import config as CONFIG
 
+import logging
+_log = logging.getLogger(__name__)
+
 __all__ = [
     'high_low_center',
     'vortex',
@@ -32,6 +39,9 @@ __all__ = [
     'subtropical_high',
     'south_asia_high',
     'tran_graphy_to_df',
+    'identify_batch',
+    'IdentifySession',
+    'get_identify_session',
 ]
 
 
@@ -42,15 +52,14 @@ height_oy = pkg_resources.resource_filename(pkg_name, "resources/height_oy.nc")
 
 output_dir_root = os.path.join(CONFIG.get_cache_dir(), 'cal_identify')
 
-def java_class_func(jar_path, class_name, func_name, jvm_path=None, *args):
+def _start_jvm(jar_path, jvm_path=None):
     try:
         import jpype
     except:
         raise Exception("jpype not exists, please install jpype first, such as: pip install jpype1")
-    """
-    调用jar包中class下的方法
-    :return:
-    """
+    if jpype.isJVMStarted():
+        return jpype
+
     # jar包路径的配置
     if jar_path is None or not os.path.exists(jar_path):
         raise Exception("jar not exists")
@@ -70,6 +79,15 @@ def java_class_func(jar_path, class_name, func_name, jvm_path=None, *args):
         jpype.startJVM(jvmpath, "-ea", "-Djava.class.path=%s" % jar_path)
     except Exception as e:
         pass
+    return jpype
+
+
+def java_class_func(jar_path, class_name, func_name, jvm_path=None, *args):
+    """
+    调用jar包中class下的方法
+    :return:
+    """
+    jpype = _start_jvm(jar_path, jvm_path)
 
     java_class = jpype.JClass(class_name)
     ru_param = ','.join(list(map(lambda x: json.dumps(x), args)))
@@ -81,6 +99,322 @@ def java_class_func(jar_path, class_name, func_name, jvm_path=None, *args):
     return res
 
 
+# 数据传递方式，'binary'：numpy数组直接传给jar中的识别类，编号网格直接以数组返回，不经过json和文件
+#              'json'：数据转为json字符串调用Jpype.ws，编号网格写成micaps4文件后再读取
+IDENTIFY_TRANSPORT = 'binary'
+
+# 系统类型: (jar中的识别类, 输入数据类型, 构造参数)，构造参数顺序与Jpype.ws中一致
+_OPERATIONS = {
+    'high_low_center': ('sysunit.SHighLowPressure', 'grid',
+                        lambda p: ('low', int(p['smooth_times']), p['level'], float(p['min_size']), float(p['grade_interval']))),
+    'vortex': ('sysunit.SVortex', 'wind',
+               lambda p: (p['resolution'], int(p['smooth_times']), p['level'], float(p['min_size']))),
+    'trough': ('sysunit.STrough', 'grid',
+               lambda p: (p['resolution'], int(p['smooth_times']), p['level'], float(p['min_size']))),
+    'reverse_trough': ('sysunit.STrough_reverse', 'grid',
+                       lambda p: (p['resolution'], int(p['smooth_times']), float(p['min_size']))),
+    'convergence_line': ('sysunit.SConvergenceLine', 'wind',
+                         lambda p: (p['resolution'], int(p['smooth_times']), p['level'], float(p['min_size']))),
+    'shear': ('sysunit.SShear', 'wind',
+              lambda p: (p['resolution'], int(p['smooth_times']), p['level'], float(p['min_size']))),
+    'jet': ('sysunit.SJet', 'wind',
+            lambda p: (p['resolution'], int(p['smooth_times']), p['level'], float(p['min_size']),
+                       float(p['jet_min_speed']), str(p['only_south_jet']).lower() == 'true')),
+    'subtropical_high': ('sysunit.SSubtropicalHigh', 'grid',
+                         lambda p: ('low', int(p['smooth_times']), p['level'], float(p['min_size']),
+                                    float(p['sufficient_height']), float(p['necessary_height']))),
+    'south_asia_high': ('sysunit.SSouthAsiaHigh', 'grid',
+                        lambda p: ('low', int(p['smooth_times']), p['level'], float(p['min_size']), float(p['sn_height']))),
+}
+
+# 返回编号网格的系统类型
+_IDS_CN_NAME = {
+    'high_low_center': '高低压编号',
+    'vortex': '涡旋编号',
+}
+
+
+def _grid_para(stda):
+    return {"nlon": stda['lon'].size, "nlat": stda['lat'].size,
+            "startlon": float(stda['lon'].values[0]), "startlat": float(stda['lat'].values[0]),
+            "dlon": float(stda.stda.horizontal_resolution.round(5)), "dlat": float(stda.stda.vertical_resolution.round(5))}
+
+
+def _field_values(type, stdas):
+    # 位势高度统一为gpm，风场为u、v两个场
+    if _OPERATIONS[type][1] == 'grid':
+        return [np.array(utl.stda_to_quantity(stdas[0]).to('gpm'))]
+    return [stda.values for stda in stdas]
+
+
+def _java_dat(jpype, values, nlon, nlat):
+    # jar中格点数组为dat[lon][lat]
+    return jpype.JArray.of(np.ascontiguousarray(np.reshape(values, (nlat, nlon)).T, dtype='float32'))
+
+
+class IdentifySession(object):
+    '''
+    [系统识别会话，JVM只启动一次，地形参考场height_oy.nc只读取并传给jar一次，
+    jar中的类、网格信息、时间和识别参数缓存复用，并记录最近max_timings次识别各阶段的耗时]
+
+    Example:
+        session = get_identify_session()
+        ret = high_low_center(hgt)
+        print(session.timing_summary())
+    '''
+
+    def __init__(self, jar_path=None, jvm_path=None, max_timings=1000):
+        '''
+
+        [启动JVM并加载地形参考场]
+
+        Keyword Arguments:
+            jar_path {[str]} -- [系统识别jar包路径，默认为内置的jar包] (default: {None})
+            jvm_path {[str]} -- [jvm路径，默认自动查找] (default: {None})
+            max_timings {int} -- [保留的耗时记录条数，超出后丢弃最早的记录] (default: {1000})
+        '''
+        import meteva.base as meb
+        t0 = time.perf_counter()
+        self.jpype = _start_jvm(jar_path or ws_jar_path, jvm_path)
+        self._classes = {}
+        self._grid_infos = {}
+        self._calendars = {}
+        self._args = {}
+        self.timings = deque(maxlen=max_timings)
+
+        # 地形参考场只读取一次
+        height_oy_data = meb.read_griddata_from_nc(height_oy)
+        grid_h = meb.get_grid_of_data(height_oy_data)
+        self.terrain = self._grid_data(height_oy_data.values, {"nlon": grid_h.nlon, "nlat": grid_h.nlat,
+                                                               "startlon": grid_h.slon, "startlat": grid_h.slat,
+                                                               "dlon": grid_h.dlon, "dlat": grid_h.dlat})
+        self.startup_seconds = time.perf_counter() - t0
+        _log.debug('identify session started in {:.3f}s'.format(self.startup_seconds))
+
+    def _jclass(self, name):
+        if name not in self._classes:
+            self._classes[name] = self.jpype.JClass(name)
+        return self._classes[name]
+
+    def _grid_info(self, grid):
+        key = (grid['nlon'], grid['nlat'], grid['startlon'], grid['startlat'], grid['dlon'], grid['dlat'])
+        if key not in self._grid_infos:
+            self._grid_infos[key] = self._jclass('basic.GridInfo')(*key)
+        return self._grid_infos[key]
+
+    def _calendar(self, time_str):
+        # java Calendar可变，缓存后每次返回副本
+        if time_str not in self._calendars:
+            self._calendars[time_str] = self._jclass('basic.MyMath').getCalendarFromString(time_str)
+        return self._calendars[time_str].clone()
+
+    def _operation_args(self, type, para):
+        key = (type, tuple(sorted((k, str(v)) for k, v in para.items() if k not in ('time', 'dtime'))))
+        if key not in self._args:
+            self._args[key] = _OPERATIONS[type][2](para)
+        return self._args[key]
+
+    def _grid_data(self, values, grid):
+        grid_data = self._jclass('basic.GridData')(self._grid_info(grid))
+        grid_data.dat = _java_dat(self.jpype, values, grid['nlon'], grid['nlat'])
+        return grid_data
+
+    def identify(self, type, values, grid, para):
+        '''
+
+        [识别单个平面场]
+
+        Arguments:
+            type {[str]} -- [系统类型]
+            values {[list]} -- [[hgt]或[u, v]的numpy数组]
+            grid {[dict]} -- [网格信息nlon, nlat, startlon, startlat, dlon, dlat]
+            para {[dict]} -- [识别参数，包含level, time(%Y%m%d%H), dtime]
+
+        Returns:
+            [tuple] -- [(graphy, ids)，识别不到系统返回None]
+        '''
+        import meteva.base as meb
+        class_name, data_type, _ = _OPERATIONS[type]
+        timing = {'type': type, 'level': para['level'], 'time': para['time'], 'dtime': para['dtime']}
+        t0 = time.perf_counter()
+
+        self._jclass('basic.GlobalValues').height_oy = self.terrain
+        if data_type == 'wind':
+            data = self._jclass('basic.VectorData')(self._grid_info(grid))
+            data.u.dat = _java_dat(self.jpype, values[0], grid['nlon'], grid['nlat'])
+            data.v.dat = _java_dat(self.jpype, values[1], grid['nlon'], grid['nlat'])
+        else:
+            data = self._grid_data(values[0], grid)
+        t1 = time.perf_counter()
+        timing['to_java'] = t1 - t0
+
+        try:
+            operation = self._jclass(class_name)(*self._operation_args(type, para))
+            ws_result = operation.identify(data, self._calendar(para['time']), para['dtime'])
+            str_json = str(ws_result.to_json())
+        except self.jpype.JException as e:
+            _log.info('{} identify failed: {}'.format(type, str(e)))
+            str_json = None
+        t2 = time.perf_counter()
+        timing['identify'] = t2 - t1
+
+        ret = None
+        if str_json and str_json.lower() not in ('null', 'none'):
+            graphy = json.loads(str_json)
+            ids = None
+            if type in _IDS_CN_NAME:
+                info = ws_result.ids.gridInfo
+                ids_grid = meb.grid([float(info.startlon), float(info.endlon), float(info.dlon)],
+                                    [float(info.startlat), float(info.endlat), float(info.dlat)],
+                                    gtime=[datetime.strptime(para['time'], '%Y%m%d%H')], dtime_list=[para['dtime']], level_list=[para['level']])
+                ids = meb.grid_data(ids_grid, np.asarray(ws_result.ids.dat).T.astype('float64'))
+            ret = (graphy, ids)
+        timing['from_java'] = time.perf_counter() - t2
+        timing['total'] = time.perf_counter() - t0
+        self.timings.append(timing)
+        _log.debug('identify {type} level={level} time={time} dtime={dtime}: {total:.3f}s'.format(**timing))
+        return ret
+
+    def timing_summary(self):
+        '''
+
+        [按系统类型统计最近max_timings次识别的耗时]
+
+        Returns:
+            [pd.DataFrame] -- [每种系统类型的调用次数及各阶段总耗时、平均耗时(秒)]
+        '''
+        if len(self.timings) == 0:
+            return pd.DataFrame()
+        df = pd.DataFrame(self.timings)
+        summary = df.groupby('type')[['to_java', 'identify', 'from_java', 'total']].agg(['count', 'sum', 'mean'])
+        return summary
+
+    def clear_timings(self):
+        '''[清空耗时记录]'''
+        self.timings.clear()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_identify_session():
+    '''
+
+    [获取默认的系统识别会话，第一次调用时创建]
+
+    Returns:
+        [IdentifySession] -- [系统识别会话]
+    '''
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = IdentifySession()
+        return _session
+
+
+@functools.lru_cache(maxsize=1)
+def _terrain_json():
+    # json方式下地形参考场只读取和转换一次
+    import meteva.base as meb
+    height_oy_data = meb.read_griddata_from_nc(height_oy)
+    grid_h = meb.get_grid_of_data(height_oy_data)
+    return {"h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
+            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
+            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
+            "h_data": height_oy_data.values.flatten().tolist()}
+
+
+def _identify_json(type, values, grid, para, output_dir):
+    import meteva.base as meb
+
+    para = dict(para, type=type, **grid)
+    para.update({"data": np.concatenate([np.ravel(v) for v in values]).tolist(), "output_dir_root": output_dir})
+    para.update(_terrain_json())
+    para_json = json.dumps(para)
+
+    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
+    if not str_json or str_json == "null":
+        return None
+    graphy = json.loads(str_json)
+
+    ids = None
+    if type in _IDS_CN_NAME:
+        ids = meb.read_griddata_from_micaps4(output_dir + f"/{type}/{para['level']}/id/{datetime.strptime(para['time'], '%Y%m%d%H'):%y%m%d%H}.{para['dtime']:03d}")
+    return graphy, ids
+
+
+def _identify(type, stdas, para):
+    '''
+    [识别单个平面场，stdas为[hgt]或[u, v]，para为识别参数]
+    '''
+    ref = stdas[0]
+    para = dict(para, level=int(ref.stda.level[0]), time=ref.stda.time[0].strftime("%Y%m%d%H"), dtime=int(ref.stda.dtime[0]))
+    values = _field_values(type, stdas)
+    grid = _grid_para(ref)
+
+    if IDENTIFY_TRANSPORT == 'binary':
+        ret = get_identify_session().identify(type, values, grid, para)
+    else:
+        try:
+            output_dir = os.path.join(output_dir_root, ref.attrs['data_source'], ref['member'].values[0])
+        except:
+            output_dir = os.path.join(output_dir_root, 'default')
+        ret = _identify_json(type, values, grid, para, output_dir)
+    if ret is None:
+        return None
+
+    graphy, ids = ret
+    if type not in _IDS_CN_NAME:
+        return {'graphy': graphy}
+    ids = ids.assign_coords({'level': ref.level.values})
+    ids.attrs = ref.attrs
+    ids.attrs['var_name'] = 'ids'
+    ids.attrs['var_cn_name'] = _IDS_CN_NAME[type]
+    ids.attrs['var_units'] = ''
+    return {'graphy': graphy, 'ids': ids}
+
+
+def identify_batch(type, *stdas, **para):
+    r"""批量系统识别
+    对多层次、多时次、多时效的数据逐个平面场识别，所有平面场在同一个JVM中直接传递数组，
+    不再逐个场转换json和读写文件
+
+    Parameters
+    ----------
+    type : `str`
+        系统类型，如'high_low_center', 'vortex', 'trough', 'reverse_trough', 'convergence_line',
+        'shear', 'jet', 'subtropical_high', 'south_asia_high'
+
+    stdas : `stda`
+        位势高度场hgt，或者u、v分量风场
+
+    para : optional
+        识别参数，与对应识别函数的参数一致
+
+    Returns
+    -------
+    `list`
+        每个平面场的识别结果，为在对应识别函数结果字典的基础上增加'level'、'time'、'dtime'，识别不到系统的平面场不返回
+    """
+    if type not in _OPERATIONS:
+        raise Exception('type must be one of {}'.format(list(_OPERATIONS.keys())))
+    func = globals()[type]
+    ref = stdas[0]
+
+    rets = []
+    for level in ref['level'].values:
+        for fo_time in ref.stda.time:
+            for dtime in ref.stda.dtime:
+                fields = [stda.sel(level=[level], time=[fo_time], dtime=[dtime]) for stda in stdas]
+                ret = func(*fields, **para)
+                if ret is None:
+                    continue
+                ret.update({'level': level, 'time': fo_time, 'dtime': dtime})
+                rets.append(ret)
+    return rets
+
+
 @check_stda(['hgt'])
 def high_low_center(hgt, resolution="low", smooth_times=0, min_size=100, grade_interval=5):
     r"""高低压中心识别
@@ -115,44 +449,8 @@ def high_low_center(hgt, resolution="low", smooth_times=0, min_size=100, grade_i
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, hgt.attrs['data_source'], hgt['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = utl.stda_to_quantity(hgt).to('gpm')
-    data = np.array(data)
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "high_low_center",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution, "grade_interval": grade_interval,
-            "level": int(hgt.stda.level[0]), "time": hgt.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(hgt.stda.dtime[0]),
-            "nlon": hgt['lon'].size, "nlat": hgt['lat'].size, "startlon": float(hgt['lon'].values[0]), "startlat": float(hgt['lat'].values[0]),
-            "dlon": float(hgt.stda.horizontal_resolution.round(5)), "dlat": float(hgt.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        ids = meb.read_griddata_from_micaps4(output_dir + f"/high_low_center/{int(hgt.stda.level[0])}/id/{hgt.stda.time[0]:%y%m%d%H}.{int(hgt.stda.dtime[0]):03d}")
-        ids = ids.assign_coords({'level': hgt.level.values})
-        ids.attrs = hgt.attrs
-        ids.attrs['var_name'] = 'ids'
-        ids.attrs['var_cn_name'] = '高低压编号'
-        ids.attrs['var_units'] = ''
-        return {'graphy': graphy, 'ids': ids}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution, "grade_interval": grade_interval}
+    return _identify('high_low_center', [hgt], para)
 
 
 @check_stda(['u', 'v'])
@@ -189,43 +487,8 @@ def vortex(u, v, resolution="low", smooth_times=0, min_size=100):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, u.attrs['data_source'], u['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = np.append(u.values.flatten(), v.values.flatten())
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "vortex",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution,
-            "level": int(u.stda.level[0]), "time": u.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(u.stda.dtime[0]),
-            "nlon": u['lon'].size, "nlat": u['lat'].size, "startlon": float(u['lon'].values[0]), "startlat": float(u['lat'].values[0]),
-            "dlon": float(u.stda.horizontal_resolution.round(5)), "dlat": float(u.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        ids = meb.read_griddata_from_micaps4(output_dir + f"/vortex/{int(u.stda.level[0])}/id/{u.stda.time[0]:%y%m%d%H}.{int(u.stda.dtime[0]):03d}")
-        ids = ids.assign_coords({'level': u.level.values})
-        ids.attrs = u.attrs
-        ids.attrs['var_name'] = 'ids'
-        ids.attrs['var_cn_name'] = '涡旋编号'
-        ids.attrs['var_units'] = ''
-        return {'graphy': graphy, 'ids': ids}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution}
+    return _identify('vortex', [u, v], para)
 
 def vortex_trace_from_vortex(vortexs):
     """基于涡旋，识别涡旋轨迹
@@ -236,6 +499,7 @@ def vortex_trace_from_vortex(vortexs):
     Returns:
         pd.DataFrame: ["time","dtime","id","lon","lat","ob_time","area"]
     """
+    import meteva.base as meb
 
     trace_list = []
     id = 0
@@ -328,26 +592,21 @@ def vortex_trace(u, v):
 
     vortexs = []
 
-    for fo_time in u.stda.time:
-        for dtime in u.stda.dtime:
-            ob_time = fo_time + timedelta(hours=dtime)
-            # print(fo_time, dtime, ob_time)
-            ret = vortex(u.sel(time=[fo_time],dtime=[dtime]), 
-                         v.sel(time=[fo_time],dtime=[dtime]))
-            if ret is None:
-                continue
-            graphy = ret["graphy"]
-
-            cent_list = []
-            for key in graphy["features"].keys():
-                cent = graphy["features"][key]["center"]
-                cent["time"] = fo_time
-                cent["dtime"] = dtime
-                cent["area"] = graphy["features"][key]["region"]["area"]
-                cent["ob_time"] = ob_time
-                cent_list.append(cent)
-            vortexs.extend(cent_list)
-            continue
+    for ret in identify_batch('vortex', u, v):
+        fo_time = ret['time']
+        dtime = ret['dtime']
+        ob_time = fo_time + timedelta(hours=dtime)
+        graphy = ret["graphy"]
+
+        cent_list = []
+        for key in graphy["features"].keys():
+            cent = graphy["features"][key]["center"]
+            cent["time"] = fo_time
+            cent["dtime"] = dtime
+            cent["area"] = graphy["features"][key]["region"]["area"]
+            cent["ob_time"] = ob_time
+            cent_list.append(cent)
+        vortexs.extend(cent_list)
     
     if len(vortexs) == 0:
         return
@@ -389,38 +648,8 @@ def trough(hgt, resolution="low", smooth_times=0, min_size=100):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, hgt.attrs['data_source'], hgt['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = utl.stda_to_quantity(hgt).to('gpm')
-    data = np.array(data)
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "trough",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution,
-            "level": int(hgt.stda.level[0]), "time": hgt.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(hgt.stda.dtime[0]),
-            "nlon": hgt['lon'].size, "nlat": hgt['lat'].size, "startlon": float(hgt['lon'].values[0]), "startlat": float(hgt['lat'].values[0]),
-            "dlon": float(hgt.stda.horizontal_resolution.round(5)), "dlat": float(hgt.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution}
+    return _identify('trough', [hgt], para)
 
 
 @check_stda(['hgt'])
@@ -453,37 +682,8 @@ def reverse_trough(hgt, resolution="low", smooth_times=0, min_size=100):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, hgt.attrs['data_source'], hgt['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = utl.stda_to_quantity(hgt).to('gpm')
-    data = np.array(data)
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "reverse_trough",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution,
-            "level": int(hgt.stda.level[0]), "time": hgt.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(hgt.stda.dtime[0]),
-            "nlon": hgt['lon'].size, "nlat": hgt['lat'].size, "startlon": float(hgt['lon'].values[0]), "startlat": float(hgt['lat'].values[0]),
-            "dlon": float(hgt.stda.horizontal_resolution.round(5)), "dlat": float(hgt.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution}
+    return _identify('reverse_trough', [hgt], para)
 
 
 @check_stda(['u', 'v'])
@@ -519,37 +719,8 @@ def convergence_line(u, v, resolution="low", smooth_times=0, min_size=100):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, u.attrs['data_source'], u['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = np.append(u.values.flatten(), v.values.flatten())
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "convergence_line",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution,
-            "level": int(u.stda.level[0]), "time": u.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(u.stda.dtime[0]),
-            "nlon": u['lon'].size, "nlat": u['lat'].size, "startlon": float(u['lon'].values[0]), "startlat": float(u['lat'].values[0]),
-            "dlon": float(u.stda.horizontal_resolution.round(5)), "dlat": float(u.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution}
+    return _identify('convergence_line', [u, v], para)
 
 
 @check_stda(['u', 'v'])
@@ -586,37 +757,8 @@ def shear(u, v, resolution="low", smooth_times=0, min_size=100):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, u.attrs['data_source'], u['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = np.append(u.values.flatten(), v.values.flatten())
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "shear",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution,
-            "level": int(u.stda.level[0]), "time": u.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(u.stda.dtime[0]),
-            "nlon": u['lon'].size, "nlat": u['lat'].size, "startlon": float(u['lon'].values[0]), "startlat": float(u['lat'].values[0]),
-            "dlon": float(u.stda.horizontal_resolution.round(5)), "dlat": float(u.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution}
+    return _identify('shear', [u, v], para)
 
 
 @check_stda(['u', 'v'])
@@ -661,37 +803,8 @@ def jet(u, v, resolution="low", smooth_times=0, min_size=100, jet_min_speed=12,
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, u.attrs['data_source'], u['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = np.append(u.values.flatten(), v.values.flatten())
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "jet",
-            "smooth_times": smooth_times, "min_size": min_size, "resolution": resolution, "jet_min_speed": jet_min_speed, "only_south_jet": str(only_south_jet),
-            "level": int(u.stda.level[0]), "time": u.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(u.stda.dtime[0]),
-            "nlon": u['lon'].size, "nlat": u['lat'].size, "startlon": float(u['lon'].values[0]), "startlat": float(u['lat'].values[0]),
-            "dlon": float(u.stda.horizontal_resolution.round(5)), "dlat": float(u.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "resolution": resolution, "jet_min_speed": jet_min_speed, "only_south_jet": str(only_south_jet)}
+    return _identify('jet', [u, v], para)
 
 
 @check_stda(['hgt'])
@@ -733,38 +846,8 @@ def subtropical_high(hgt, smooth_times=0, min_size=500, necessary_height=5840, s
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, hgt.attrs['data_source'], hgt['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = utl.stda_to_quantity(hgt).to('gpm')
-    data = np.array(data)
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "subtropical_high",
-            "smooth_times": smooth_times, "min_size": min_size, "necessary_height": necessary_height, "sufficient_height": sufficient_height,
-            "level": int(hgt.stda.level[0]), "time": hgt.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(hgt.stda.dtime[0]),
-            "nlon": hgt['lon'].size, "nlat": hgt['lat'].size, "startlon": float(hgt['lon'].values[0]), "startlat": float(hgt['lat'].values[0]),
-            "dlon": float(hgt.stda.horizontal_resolution.round(5)), "dlat": float(hgt.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "necessary_height": necessary_height, "sufficient_height": sufficient_height}
+    return _identify('subtropical_high', [hgt], para)
 
 
 @check_stda(['hgt'])
@@ -801,38 +884,8 @@ def south_asia_high(hgt, smooth_times=0, min_size=800, sn_height=16680):
     `dict`
         系统识别的结果，以字典形式返回
     """
-    try:
-        output_dir = os.path.join(output_dir_root, hgt.attrs['data_source'], hgt['member'].values[0])
-    except:
-        output_dir = os.path.join(output_dir_root, 'default')
-
-    data = utl.stda_to_quantity(hgt).to('gpm')
-    data = np.array(data)
-    data = data.flatten().tolist()
-    
-    height_oy_data = meb.read_griddata_from_nc(height_oy)
-    grid_h = meb.get_grid_of_data(height_oy_data)
-    h_data = height_oy_data.values.flatten().tolist()
-
-    para = {"type": "south_asia_high",
-            "smooth_times": smooth_times, "min_size": min_size, "sn_height": sn_height,
-            "level": int(hgt.stda.level[0]), "time": hgt.stda.time[0].strftime("%Y%m%d%H"), "dtime": int(hgt.stda.dtime[0]),
-            "nlon": hgt['lon'].size, "nlat": hgt['lat'].size, "startlon": float(hgt['lon'].values[0]), "startlat": float(hgt['lat'].values[0]),
-            "dlon": float(hgt.stda.horizontal_resolution.round(5)), "dlat": float(hgt.stda.vertical_resolution.round(5)),
-            "data": data, "output_dir_root": output_dir,
-            "h_nlon": grid_h.nlon, "h_nlat": grid_h.nlat,
-            "h_slon": grid_h.slon, "h_slat": grid_h.slat,
-            "h_dlon": grid_h.dlon, "h_dlat": grid_h.dlat,
-            "h_data": h_data
-            }
-    para_json = json.dumps(para)
-
-    str_json = java_class_func(ws_jar_path, "Jpype", "ws", None, para_json)
-    if str_json and str_json != "null":
-        graphy = json.loads(str_json)
-        return {'graphy': graphy}
-    else:
-        return None
+    para = {"smooth_times": smooth_times, "min_size": min_size, "sn_height": sn_height}
+    return _identify('south_asia_high', [hgt], para)
 
 
 def tran_graphy_to_df(graphy):
@@ -857,6 +910,7 @@ def tran_graphy_to_df(graphy):
         对于槽线天气和切变线等天气系统来说，轴线就是槽线和切变线的上每一个点的位置。
         对于切变线，暂时没有定义系统中心的位置和强度，因此第0个元素返回结果为None。
     """
+    import meteva.base as meb
     if graphy is None: return None,None
 
     dtime = int(graphy["dtime"])
@@ -3,8 +3,8 @@ import pandas as pd
 import xarray as xr
 from scipy.interpolate import LinearNDInterpolator
 import metdig.utl as mdgstda
+from metdig.cal.lib.trajectory import TrajectoryEngine
 from metdig.io.lib import utility as utl
-from metdig.onestep.lib.utility import mask_terrian
 import metdig
 from datetime import datetime,timedelta
 import math 
@@ -14,13 +14,14 @@ import xarray as xr
 __all__ = [
     'interpolate_3d',
     'interpolate_3d_whole_area',
+    'interpolate_3d_stencil',
     'trajectory_on_pressure_level',
 ]
 
 
 def trajectory_on_pressure_level(u,v,vvel,var_diag=None,
     s_point={'lon':[119.3,119.31],'lat':[32.4,32.41],'level':[925,900],'id':[1,2]},
-    t_s=None,t_e=None,dt=None):
+    t_s=None,t_e=None,dt=None,method='euler',backend='numpy'):
 
     #气压坐标下的空气质点追踪算法，输入垂直运动速度为气压速度
     #stda标准u 东西风 v 南北风 vvel气压垂直速度
@@ -28,75 +29,13 @@ def trajectory_on_pressure_level(u,v,vvel,var_diag=None,
     #s_points 为字典型，质点起始位置，如{'lon':[100,101.1],'lat':[30,30.1],'level':[875,875.5],'id':[1,2]}，如果用户没有给定id，则自动生成从1开始的连续数字
     #t_s 起始时间，t_e终止时间，datetime格式，如未给定，则为u的预报时间的起止时间
     #dt追踪时间步长 单位为s，如果未给定则为1800
-    if('id' not in list(s_point.keys())):
-        s_point['id']=list(range(1,len(s_point['lon'])+1))
+    #method 积分方法，euler、rk2或rk4，所有质点每步同时积分，默认为原算法使用的前向欧拉，rk2/rk4精度更高但轨迹与之不同
+    #backend 插值计算方式，numpy或numba(多线程)，质点数很多时使用numba
     if dt is None:
         dt = 1800
 
-    if(len(u['time'])>1):
-        trans_dim='time'
-    else:
-        trans_dim='dtime'
-    
-    u_trans=u.assign_coords({'fcst_time':(trans_dim,u.stda.fcst_time)}).swap_dims({trans_dim:'fcst_time'})
-    v_trans=v.assign_coords({'fcst_time':(trans_dim,v.stda.fcst_time)}).swap_dims({trans_dim:'fcst_time'})
-    vvel_trans=vvel.assign_coords({'fcst_time':(trans_dim,vvel.stda.fcst_time)}).swap_dims({trans_dim:'fcst_time'})
-    if(t_s is None):
-        if(dt > 0):
-            t_s=pd.to_datetime(u_trans.fcst_time.values[0])
-        else:
-            t_s=pd.to_datetime(u_trans.fcst_time.values[-1])
-    t_now=t_s
-    if(t_e is None):
-        if(dt > 0):
-            t_e=pd.to_datetime(u_trans.fcst_time.values[-1])
-        else:
-            t_e=pd.to_datetime(u_trans.fcst_time.values[0])
-            
-    if(var_diag is None):
-        var_diag=vvel.copy()
-    var_diag_trans=var_diag.assign_coords({'fcst_time':(trans_dim,var_diag.stda.fcst_time)}).swap_dims({trans_dim:'fcst_time'})
-    u_s=u_trans.interp({'lon':('id',s_point['lon']),'lat':('id',s_point['lat']),'level':('id',s_point['level']),'fcst_time':[t_s]}).assign_coords({'id':('id',s_point['id'])})
-    v_s=v_trans.interp({'lon':('id',s_point['lon']),'lat':('id',s_point['lat']),'level':('id',s_point['level']),'fcst_time':[t_s]}).assign_coords({'id':('id',s_point['id'])})
-    vvel_s=vvel_trans.interp({'lon':('id',s_point['lon']),'lat':('id',s_point['lat']),'level':('id',s_point['level']),'fcst_time':[t_s]}).assign_coords({'id':('id',s_point['id'])})
-    var_s=var_diag_trans.interp({'lon':('id',s_point['lon']),'lat':('id',s_point['lat']),'level':('id',s_point['level']),'fcst_time':[t_s]}).assign_coords({'id':('id',s_point['id'])})
-
-    r_earth=6371000 
-    dis2lat=180/(math.pi*r_earth) #Distance to Latitude 
-    const={'a':r_earth,'dis2lat':dis2lat} 
-
-    while ((t_now <= max((t_s,t_e))) and (t_now >= min((t_s,t_e)))):
-        # print(t_now)
-        dx=u_s*dt 
-        dlon=dx*180/(const['a']*math.sin(math.pi/2-math.radians(s_point['lat'][-1]))*math.pi) 
-        dy=v_s*dt
-        dlat=dy*const['dis2lat'] 
-        dvvel=vvel_s*dt/100 # to hPa 
-        temp=var_s.isel(fcst_time=[-1]).copy()
-        temp.coords['lon']=temp.coords['lon']+dlon.squeeze().values
-        temp.coords['lat']=temp.coords['lat']+dlat.squeeze().values
-        temp.coords['level']=temp.coords['level']+dvvel.squeeze().values
-        temp.coords['fcst_time']=[t_now]
-        u_s=u_trans.interp({'lon':('id',temp['lon'].values.flatten().tolist()),'lat':('id',temp['lat'].values.flatten().tolist()),'level':('id',temp['level'].values.flatten().tolist()),'fcst_time':[t_now]}).assign_coords({'id':('id',temp['id'].values.flatten().tolist())})
-        v_s=v_trans.interp({'lon':('id',temp['lon'].values.flatten().tolist()),'lat':('id',temp['lat'].values.flatten().tolist()),'level':('id',temp['level'].values.flatten().tolist()),'fcst_time':[t_now]}).assign_coords({'id':('id',temp['id'].values.flatten().tolist())})
-        vvel_s=vvel_trans.interp({'lon':('id',temp['lon'].values.flatten().tolist()),'lat':('id',temp['lat'].values.flatten().tolist()),'level':('id',temp['level'].values.flatten().tolist()),'fcst_time':[t_now]}).assign_coords({'id':('id',temp['id'].values.flatten().tolist())})
-        temp.values=var_diag_trans.interp({'lon':('id',temp['lon'].values.flatten().tolist()),'lat':('id',temp['lat'].values.flatten().tolist()),'level':('id',temp['level'].values.flatten().tolist()),'fcst_time':[t_now]}).assign_coords({'id':('id',temp['id'].values.flatten().tolist())})
-        var_s=xr.concat([var_s,temp],dim='fcst_time')    
-        t_now = t_now+timedelta(seconds=dt)
-
-    # modify by wzj 2024.5.24 尝试解决当输入为模式数据dtime有多个时，程序错误的bug
-    if trans_dim == 'time':
-        # time多个
-        var_stda=var_s.rename({'fcst_time':trans_dim}).squeeze().to_dataframe(var_s.member.values[0]).reset_index().drop('member',axis=1)
-    else:
-        # dtime多个
-        if 'dtime' not in var_s.dims and 'dtime' in var_s.coords:
-            var_s = var_s.drop(['dtime']) # delete 冗余维度
-        var_stda=var_s.rename({'fcst_time':trans_dim}).squeeze().to_dataframe(var_s.member.values[0]).reset_index().drop('member',axis=1)   
-        var_stda[['dtime', 'time']] = var_stda[['time', 'dtime']]
-        var_stda['dtime'] = 0
-    var_stda.attrs=var_s.attrs
-    var_stda.attrs['data_start_columns'] = 6
+    engine = TrajectoryEngine(u, v, vvel, var_diag=var_diag, backend=backend)
+    var_stda = engine.run(s_point, t_s=t_s, t_e=t_e, dt=dt, method=method)
     return var_stda
 
 if __name__ == '__main__' :
@@ -111,7 +50,7 @@ if __name__ == '__main__' :
     print(trajectoies)
 
 
-def interpolate_3d(stda, hgt, points, stda_sfc=None, psfc=None,if_split=None):
+def interpolate_3d(stda, hgt, points, stda_sfc=None, psfc=None,if_split=None,method='delaunay'):
     '''
 
     [利用位势高度，站点高度，和各层模式数据进行三维不规则点插值，获取初步订正的山地地形站点预报，
@@ -124,9 +63,15 @@ def interpolate_3d(stda, hgt, points, stda_sfc=None, psfc=None,if_split=None):
         stda_sfc {[stda]} -- [可选量,stda的对应地面量，当站点高度低于hgt中对应位置高度最小值，则直接用stda_sfc中的线性插值结果]
         psfc {[stda]} -- [当psfc<stda的等压面，则为模式地下部分，赋值nan，如果此时stda_sfc不为None,则为其线性插值结果]
         if_split  {None or int} -- [是否采用站点数据范围拆分方法加速多维插值]
+        method {str} -- [delaunay: 三维不规则点插值; stencil: 水平双线性插值后按位势高度垂直线性插值，站点数很多时使用，见interpolate_3d_stencil]
     Returns:
         [stda] -- [被插值后的站点数据,超出给定范围复制nan]
     '''
+    if method == 'stencil':
+        return interpolate_3d_stencil(stda, hgt, points, stda_sfc=stda_sfc, psfc=psfc)
+    elif method != 'delaunay':
+        raise Exception('method must be delaunay or stencil')
+
     pnt_extent=[math.floor(min(points['lon'])),math.ceil(max(points['lon'])),math.floor(min(points['lat'])),math.ceil(max(points['lat']))]
 
     if if_split is None:
@@ -134,7 +79,7 @@ def interpolate_3d(stda, hgt, points, stda_sfc=None, psfc=None,if_split=None):
     else:
         sta_lons=np.array(points['lon'])
         sta_lats=np.array(points['lat'])
-        sta_alts=np.array(points['lat'])
+        sta_alts=np.array(points['alt'])
         sta_ids=np.array(points['id'])
         stda_sta=[]
         lon_s=pnt_extent[0]
@@ -154,6 +99,68 @@ def interpolate_3d(stda, hgt, points, stda_sfc=None, psfc=None,if_split=None):
         stda_sta=pd.concat(stda_sta)
     return stda_sta
 
+def interpolate_3d_stencil(stda, hgt, points, stda_sfc=None, psfc=None, interpolator=None):
+    '''
+
+    [利用位势高度，站点高度，和各层模式数据进行站点插值，获取初步订正的山地地形站点预报。
+    每个站点的水平双线性权重及上下相邻的位势高度层次只计算一次，所有时次、成员一次性插值，适用于大量站点]
+
+    Arguments:
+        stda {[stda]} -- [被插值的要素]
+        hgt {[stda]} -- [模式位势高度]
+        points {'lon':[110],'lat':[30],'alt':[1000],'id':[1]} -- [{被插值站点的经度，维度，高度}]
+        stda_sfc {[stda]} -- [可选量,stda的对应地面量，当站点高度低于hgt中对应位置高度最小值，或插值结果为nan时，直接用stda_sfc中的线性插值结果]
+        psfc {[stda]} -- [当psfc<stda的等压面，则为模式地下部分，赋值nan，如果此时stda_sfc不为None,则为其线性插值结果]
+        interpolator {[StationInterpolator3D]} -- [相同hgt、站点的插值权重，多个要素插值时传入可以复用，不传则根据hgt计算]
+    Returns:
+        [stda] -- [被插值后的站点数据,超出给定范围复制nan]
+    '''
+    stda = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+    if(psfc is not None):
+        from metdig.onestep.lib.utility import mask_terrian  # 避免import metdig.cal时导入onestep/graphics
+        stda = mask_terrian(psfc, stda).transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+    nsta=len(points['lon'])
+    if('id' not in points.keys()):
+        ids=np.arange(0,nsta)
+    else:
+        ids=np.asarray(points['id'])
+
+    if interpolator is None:
+        hgt = hgt.sel(member=stda['member'].values, level=stda['level'].values, time=stda['time'].values, dtime=stda['dtime'].values)
+        interpolator = mdgstda.StationInterpolator3D(hgt, points['lon'], points['lat'], points['alt'])
+    elif not interpolator.match(stda):
+        raise Exception('interpolate_3d_stencil: stda is not consistent with the hgt used by the interpolator')
+    elif (interpolator.alt.size != nsta or not np.allclose(interpolator.horizontal.lon, np.asarray(points['lon'], dtype='float64')) or
+          not np.allclose(interpolator.horizontal.lat, np.asarray(points['lat'], dtype='float64')) or
+          not np.allclose(interpolator.alt, np.asarray(points['alt'], dtype='float64'))):
+        raise Exception('interpolate_3d_stencil: points are not consistent with the stations used by the interpolator')
+    data = interpolator.interp_values(stda.values) # (member, time, dtime, points)
+
+    if (stda_sfc is not None):
+        sfc_interpolator = mdgstda.get_station_interpolator(stda_sfc['lon'].values, stda_sfc['lat'].values, points['lon'], points['lat'])
+        sfc_data = sfc_interpolator.interp(stda_sfc).isel(level=0)
+        sfc_data = sfc_data.reindex(member=stda['member'].values, time=stda['time'].values, dtime=stda['dtime'].values)
+        sfc_data = sfc_data.transpose('member', 'time', 'dtime', 'points').values
+        data = np.where(interpolator.below_ground | np.isnan(data), sfc_data, data)
+
+    # 按time, dtime, 站点顺序展开
+    ntime=stda.time.size
+    ndtime=stda.dtime.size
+    stda_sta = pd.DataFrame({
+        'level': np.tile(np.asarray(points['alt']), ntime*ndtime),
+        'time': np.repeat(stda['time'].values, ndtime*nsta),
+        'dtime': np.tile(np.repeat(stda['dtime'].values, nsta), ntime),
+        'id': np.tile(ids, ntime*ndtime),
+        'lon': np.tile(np.asarray(points['lon']), ntime*ndtime),
+        'lat': np.tile(np.asarray(points['lat']), ntime*ndtime),
+    })
+    data = data.transpose(1, 2, 3, 0).reshape(-1, stda.member.size)
+    stda_sta = pd.concat([stda_sta, pd.DataFrame(data, columns=list(stda.member.values))], axis=1)
+    stda_attrs = mdgstda.get_stda_attrs(var_name=stda.attrs['var_name'])
+    stda_sta.attrs=stda_attrs
+    stda_sta.attrs['data_start_columns']=6
+    return stda_sta
+
 def interpolate_3d_whole_area(stda, hgt, points, stda_sfc=None, psfc=None):
     '''
 
@@ -178,6 +185,7 @@ def interpolate_3d_whole_area(stda, hgt, points, stda_sfc=None, psfc=None):
     sta_df=[]
 
     if(psfc is not None):
+        from metdig.onestep.lib.utility import mask_terrian  # 避免import metdig.cal时导入onestep/graphics
         stda = mask_terrian(psfc, stda) 
     if('id' not in points.keys()):
         ids=np.arange(0,nsta)
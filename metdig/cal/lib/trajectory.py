@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+'''
+气压坐标下的质点追踪计算：
+u/v/vvel/诊断量在(时间, 层次, 纬度, 经度)上叠成一个数组只构建一次插值器，
+所有质点每个积分步向量化更新，轨迹写入预先分配的数组。
+'''
+
+import itertools
+
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+
+__all__ = [
+    'RegularGridInterpolator',
+    'TrajectoryEngine',
+]
+
+_R_EARTH = 6371000
+_DIS2LAT = 180 / (np.pi * _R_EARTH)  # Distance to Latitude
+
+
+def _ascending(axis, values, iaxis):
+    '''
+    [坐标降序时翻转坐标及对应数据维，保证所有坐标升序]
+    '''
+    axis = np.array(axis, dtype=np.float64)
+    if axis.size > 1 and axis[0] > axis[-1]:
+        axis = axis[::-1].copy()
+        values = np.flip(values, axis=iaxis)
+    return axis, values
+
+
+def _locate(axis, x):
+    '''
+    [一维升序坐标上的插值下标及权重，返回(i0, w1, valid)，坐标只有一个点时只有x等于该点才有效]
+    '''
+    n = axis.size
+    if n == 1:
+        return np.zeros(x.shape, dtype=np.int64), np.zeros(x.shape), x == axis[0]
+    i0 = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, n - 2)
+    w1 = (x - axis[i0]) / (axis[i0 + 1] - axis[i0])
+    valid = (x >= axis[0]) & (x <= axis[-1])
+    return i0, w1, valid
+
+
+@njit(parallel=True)
+def _interp_numba(t_axis, p_axis, y_axis, x_axis, values, t, p, y, x, out):
+    '''
+    [numba并行版本的四维线性插值，out为预先分配的(npoints, nvar)数组]
+    '''
+    axes = (t_axis, p_axis, y_axis, x_axis)
+    for k in prange(t.shape[0]):
+        pos = (t[k], p[k], y[k], x[k])
+        i0 = np.zeros(4, dtype=np.int64)
+        w1 = np.zeros(4)
+        valid = True
+        for d in range(4):
+            axis = axes[d]
+            n = axis.shape[0]
+            if np.isnan(pos[d]) or pos[d] < axis[0] or pos[d] > axis[n - 1]:
+                valid = False
+                break
+            if n > 1:
+                i = np.searchsorted(axis, pos[d], side='right') - 1
+                i = min(max(i, 0), n - 2)
+                i0[d] = i
+                w1[d] = (pos[d] - axis[i]) / (axis[i + 1] - axis[i])
+        if not valid:
+            out[k, :] = np.nan
+            continue
+        out[k, :] = 0
+        idx = np.zeros(4, dtype=np.int64)
+        for corner in range(16):
+            w = 1.0
+            for d in range(4):
+                if (corner >> d) & 1:
+                    w *= w1[d]
+                    idx[d] = i0[d] + 1
+                else:
+                    w *= 1.0 - w1[d]
+                    idx[d] = i0[d]
+            if w == 0:
+                continue
+            out[k, :] += w * values[idx[0], idx[1], idx[2], idx[3], :]
+
+
+class RegularGridInterpolator(object):
+    '''
+    [(时间, 层次, 纬度, 经度)规则网格上的四维线性插值器，多个要素叠在最后一维一次插值，
+    超出网格范围的点为nan]
+    '''
+
+    def __init__(self, t_axis, p_axis, y_axis, x_axis, values, backend='numpy'):
+        '''
+
+        [构建插值器]
+
+        Arguments:
+            t_axis {[ndarray]} -- [时间坐标，单位秒]
+            p_axis {[ndarray]} -- [层次坐标]
+            y_axis {[ndarray]} -- [纬度坐标]
+            x_axis {[ndarray]} -- [经度坐标]
+            values {[ndarray]} -- [形状为(time, level, lat, lon, nvar)]
+
+        Keyword Arguments:
+            backend {str} -- [numpy or numba] (default: {'numpy'})
+        '''
+        if backend not in ('numpy', 'numba'):
+            raise Exception('backend must be numpy or numba')
+        self.backend = backend
+        values = np.asarray(values, dtype=np.float64)
+        axes = []
+        for iaxis, axis in enumerate((t_axis, p_axis, y_axis, x_axis)):
+            axis, values = _ascending(axis, values, iaxis)
+            axes.append(axis)
+        self.axes = tuple(axes)
+        self.values = np.ascontiguousarray(values)
+
+    def __call__(self, t, p, y, x):
+        '''
+
+        [插值]
+
+        Arguments:
+            t {[ndarray]} -- [时间，单位秒]
+            p {[ndarray]} -- [层次]
+            y {[ndarray]} -- [纬度]
+            x {[ndarray]} -- [经度]
+
+        Returns:
+            [ndarray] -- [形状为(npoints, nvar)]
+        '''
+        pos = [np.ascontiguousarray(np.broadcast_to(np.asarray(a, dtype=np.float64), np.shape(x))).ravel()
+               for a in (t, p, y, x)]
+        if self.backend == 'numba':
+            out = np.empty((pos[0].size, self.values.shape[-1]))
+            _interp_numba(*self.axes, self.values, *pos, out)
+            return out
+
+        located = [_locate(axis, a) for axis, a in zip(self.axes, pos)]
+        out = np.zeros((pos[0].size, self.values.shape[-1]))
+        for corner in itertools.product((0, 1), repeat=4):
+            w = np.ones(pos[0].size)
+            idx = []
+            for (i0, w1, _), c in zip(located, corner):
+                w = w * (w1 if c else 1.0 - w1)
+                idx.append(i0 + c)
+            mask = w != 0  # 权重为0的格点不参与计算，避免缺测值传播
+            if mask.any():
+                out[mask] += w[mask, np.newaxis] * self.values[tuple(i[mask] for i in idx)]
+        valid = np.logical_and.reduce([v for _, _, v in located])
+        out[~valid] = np.nan
+        return out
+
+
+class TrajectoryEngine(object):
+    '''
+    [气压坐标下的质点追踪，所有质点每步同时用RK2/RK4(或euler)积分，垂直运动速度为气压速度]
+
+    Example:
+        engine = TrajectoryEngine(u, v, vvel, var_diag=spfh)
+        df = engine.run({'lon': [100, 101], 'lat': [30, 30], 'level': [850, 850], 'id': [1, 2]}, dt=1800)
+    '''
+
+    def __init__(self, u, v, vvel, var_diag=None, backend='numpy'):
+        '''
+
+        [读取u/v/vvel/var_diag的第一个成员，构建插值器]
+
+        Arguments:
+            u {[stda]} -- [东西风]
+            v {[stda]} -- [南北风]
+            vvel {[stda]} -- [气压垂直速度]
+
+        Keyword Arguments:
+            var_diag {[stda]} -- [沿轨迹输出的诊断量，不传则为vvel] (default: {None})
+            backend {str} -- [插值计算方式，numpy or numba] (default: {'numpy'})
+        '''
+        if var_diag is None:
+            var_diag = vvel
+        # 多个time为分析场序列，否则为同一起报时间的多个预报时效
+        self.trans_dim = 'time' if u['time'].size > 1 else 'dtime'
+        other_dim = 'dtime' if self.trans_dim == 'time' else 'time'
+
+        self.fcst_time = pd.to_datetime(u.stda.fcst_time.values)
+        self.t0 = self.fcst_time[0]
+        t_axis = (self.fcst_time - self.t0).total_seconds().values
+
+        def _values(stda, to_units):
+            stda = stda.isel(member=0).isel({other_dim: 0}).transpose(self.trans_dim, 'level', 'lat', 'lon')
+            quantity = stda.stda.quantity
+            if to_units is not None:
+                quantity = quantity.to(to_units)
+            return np.asarray(quantity.magnitude, dtype=np.float64)
+
+        values = np.stack([_values(u, 'm/s'), _values(v, 'm/s'), _values(vvel, 'hPa/s'), _values(var_diag, None)],
+                          axis=-1)
+        self.interpolator = RegularGridInterpolator(t_axis, u['level'].values, u['lat'].values, u['lon'].values,
+                                                    values, backend=backend)
+        self.member = u['member'].values[0]
+        self.attrs = dict(var_diag.attrs)
+
+    def _tendency(self, t, lon, lat, level):
+        '''
+        [质点位置变化率(dlon/dt, dlat/dt, dlevel/dt)及诊断量]
+        '''
+        uvwd = self.interpolator(t, level, lat, lon)
+        dlon = uvwd[:, 0] * 180 / (_R_EARTH * np.cos(np.deg2rad(lat)) * np.pi)
+        dlat = uvwd[:, 1] * _DIS2LAT
+        dlevel = uvwd[:, 2]
+        return dlon, dlat, dlevel, uvwd[:, 3]
+
+    def integrate(self, lon, lat, level, t_s, dt, nsteps, method='euler'):
+        '''
+
+        [积分nsteps步]
+
+        Arguments:
+            lon {[ndarray]} -- [质点起始经度]
+            lat {[ndarray]} -- [质点起始纬度]
+            level {[ndarray]} -- [质点起始层次(hPa)]
+            t_s {[datetime]} -- [起始时间]
+            dt {[number]} -- [时间步长，单位秒，负数为后向追踪]
+            nsteps {[int]} -- [积分步数]
+
+        Keyword Arguments:
+            method {str} -- [积分方法，euler or rk2 or rk4，默认为原算法使用的前向欧拉，rk2/rk4精度更高但轨迹与之不同，需要时显式指定] (default: {'euler'})
+
+        Returns:
+            [ndarray] -- [经度，形状为(nsteps+1, npoints)]
+            [ndarray] -- [纬度，形状为(nsteps+1, npoints)]
+            [ndarray] -- [层次，形状为(nsteps+1, npoints)]
+            [ndarray] -- [诊断量，形状为(nsteps+1, npoints)]
+        '''
+        if method not in ('euler', 'rk2', 'rk4'):
+            raise Exception('method must be euler or rk2 or rk4')
+        npoints = np.size(lon)
+        traj = np.full((4, nsteps + 1, npoints), np.nan)
+        traj[0, 0] = lon
+        traj[1, 0] = lat
+        traj[2, 0] = level
+
+        t = (pd.to_datetime(t_s) - self.t0).total_seconds()
+        k1 = self._tendency(t, traj[0, 0], traj[1, 0], traj[2, 0])
+        traj[3, 0] = k1[3]
+        for istep in range(nsteps):
+            x = traj[:3, istep]
+            if method == 'euler':
+                incr = [k1[i] * dt for i in range(3)]
+            elif method == 'rk2':
+                # Heun: 预估步终点处的速度与起点速度平均
+                k2 = self._tendency(t + dt, *(x[i] + k1[i] * dt for i in range(3)))
+                incr = [(k1[i] + k2[i]) * 0.5 * dt for i in range(3)]
+            else:
+                k2 = self._tendency(t + dt / 2, *(x[i] + k1[i] * dt / 2 for i in range(3)))
+                k3 = self._tendency(t + dt / 2, *(x[i] + k2[i] * dt / 2 for i in range(3)))
+                k4 = self._tendency(t + dt, *(x[i] + k3[i] * dt for i in range(3)))
+                incr = [(k1[i] + 2 * k2[i] + 2 * k3[i] + k4[i]) * dt / 6 for i in range(3)]
+            for i in range(3):
+                traj[i, istep + 1] = x[i] + incr[i]
+            t = t + dt
+            # 终点的速度即下一步的起点速度，同时得到终点的诊断量
+            k1 = self._tendency(t, traj[0, istep + 1], traj[1, istep + 1], traj[2, istep + 1])
+            traj[3, istep + 1] = k1[3]
+        return traj[0], traj[1], traj[2], traj[3]
+
+    def run(self, s_point, t_s=None, t_e=None, dt=1800, method='euler'):
+        '''
+
+        [质点追踪]
+
+        Arguments:
+            s_point {[dict]} -- [质点起始位置，如{'lon':[100,101.1],'lat':[30,30.1],'level':[875,875.5],'id':[1,2]}，没有id则从1开始编号]
+
+        Keyword Arguments:
+            t_s {[datetime]} -- [起始时间，不传则为数据的起始时间(后向追踪为终止时间)] (default: {None})
+            t_e {[datetime]} -- [终止时间，不传则为数据的终止时间(后向追踪为起始时间)] (default: {None})
+            dt {number} -- [时间步长，单位秒，负数为后向追踪] (default: {1800})
+            method {str} -- [积分方法，euler or rk2 or rk4，默认为原算法使用的前向欧拉，rk2/rk4精度更高但轨迹与之不同，需要时显式指定] (default: {'euler'})
+
+        Returns:
+            [DataFrame] -- [站点stda格式的轨迹，列为id, dtime, time, lon, lat, level, 成员名(诊断量)]
+        '''
+        if t_s is None:
+            t_s = self.fcst_time[0] if dt > 0 else self.fcst_time[-1]
+        if t_e is None:
+            t_e = self.fcst_time[-1] if dt > 0 else self.fcst_time[0]
+        t_s = pd.to_datetime(t_s)
+        nsteps = max(int(np.floor((pd.to_datetime(t_e) - t_s).total_seconds() / dt + 1e-6)), 0)
+
+        lon = np.asarray(s_point['lon'], dtype=np.float64)
+        ids = s_point['id'] if 'id' in s_point.keys() else list(range(1, lon.size + 1))
+        lon, lat, level, var = self.integrate(lon, s_point['lat'], s_point['level'], t_s, dt, nsteps, method=method)
+
+        # 按质点、时间顺序展开
+        times = t_s + pd.to_timedelta(np.arange(nsteps + 1) * dt, unit='s')
+        df = pd.DataFrame({
+            'id': np.repeat(np.asarray(ids), nsteps + 1),
+            'dtime': 0,
+            'time': np.tile(times.values, lon.shape[1]),
+            'lon': lon.T.ravel(),
+            'lat': lat.T.ravel(),
+            'level': level.T.ravel(),
+            self.member: var.T.ravel(),
+        })
+        df.attrs = self.attrs
+        df.attrs['data_start_columns'] = 6
+        return df
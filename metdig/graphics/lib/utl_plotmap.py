@@ -4,6 +4,7 @@ import sys
 import pkg_resources
 import os
 import math
+import functools
 import numpy as np
 import pandas as pd
 
@@ -23,6 +24,9 @@ from matplotlib.path import Path
 from matplotlib.patches import PathPatch
 from shapely.geometry import Polygon as ShapelyPolygon
 from shapely.geometry import Point as ShapelyPoint
+import shapely.geometry
+from matplotlib.collections import PathCollection
+import cartopy.mpl.path as cpath
 from  metdig.graphics.lib.utility import kwargs_wrapper
 
 pkg_name = 'metdig.graphics'
@@ -403,6 +407,70 @@ def forcast_info(ax, x=0.1 ,y=0.99 ,info=None ,transform=None , size=12, va='top
                     ha='left', bbox=dict(facecolor='#FFFFFFCC', edgecolor='black', pad=3.0),zorder=20,**kwargs):
     ax.text(x, y, info, transform=ax.transAxes, size=size, va=va, ha=ha, bbox=bbox,zorder=zorder) 
 
+# shapefile图层名
+_SHP_NAMES = {
+    'world':'worldmap',
+    'nation': "NationalBorder",
+    'province': "Province",
+    # 'county': "County",  # 无资源，暂时注释
+    'river': "hyd1_4l",
+    'river_high': "hyd2_4l",
+    'coastline': 'ne_10m_coastline'}
+
+
+@functools.lru_cache(maxsize=None)
+def _shp_geometries(name):
+    '''
+    [读取shapefile几何，每个图层只读取一次]
+    '''
+    shpfile = pkg_resources.resource_filename(pkg_name, "resources/shapefile/" + _SHP_NAMES[name] + ".shp")
+    return tuple(Reader(shpfile).geometries())
+
+
+@functools.lru_cache(maxsize=64)
+def _basemap_paths(name, projection, crs, clip_extent=None, boundary_only=False):
+    '''
+    [底图图层模板：按(图层, 投影, 数据投影, 裁剪范围)缓存裁剪并投影后的matplotlib Path，
+    之后的绘图直接使用，不再重复读取shapefile及投影。
+    boundary_only为True时(不填充)面转换为边界线再裁剪，避免裁剪在区域边缘产生多余的边]
+    '''
+    geoms = _shp_geometries(name)
+    if boundary_only:
+        geoms = [g.boundary if g.geom_type in ('Polygon', 'MultiPolygon') else g for g in geoms]
+    if clip_extent is not None:
+        box = shapely.geometry.box(clip_extent[0], clip_extent[2], clip_extent[1], clip_extent[3])
+        geoms = [g.intersection(box) for g in geoms if g.intersects(box)]
+
+    paths = []
+    for geom in geoms:
+        if geom.is_empty:
+            continue
+        if projection != crs:
+            geom = projection.project_geometry(geom, crs)
+        paths.append(cpath.shapely_to_path(geom))
+    return paths
+
+
+def _basemap_clip_extent(ax, crs, facecolor):
+    '''
+    [等经纬度投影时按当前绘图区域(四周各扩大20%)裁剪，只裁剪不填充的图层，其余情况不裁剪]
+    '''
+    if not (isinstance(ax.projection, ccrs.PlateCarree) and isinstance(crs, ccrs.PlateCarree) and ax.projection == crs):
+        return None
+    if facecolor not in ('none', None):
+        return None
+    x0, x1, y0, y1 = ax.get_extent(crs)
+    dx, dy = (x1 - x0) * 0.2 + 1, (y1 - y0) * 0.2 + 1
+    return (round(x0 - dx, 2), round(x1 + dx, 2), round(max(y0 - dy, -90), 2), round(min(y1 + dy, 90), 2))
+
+
+def clear_basemap_cache():
+    '''[清空底图图层模板缓存]'''
+    _shp_geometries.cache_clear()
+    _basemap_paths.cache_clear()
+    _read_city.cache_clear()
+
+
 @kwargs_wrapper
 def add_china_map_2cartopy_public(ax, name='province', facecolor='none',
                                   edgecolor='c', lw=2,crs=ccrs.PlateCarree(), **kwargs):
@@ -415,24 +483,14 @@ def add_china_map_2cartopy_public(ax, name='province', facecolor='none',
     :param lw: line width.
     :return: None
     """
-
-    # map name
-    names = {
-            'world':'worldmap',
-            'nation': "NationalBorder", 
-             'province': "Province",
-            #  'county': "County",  # 无资源，暂时注释
-             'river': "hyd1_4l",
-             'river_high': "hyd2_4l",
-             'coastline': 'ne_10m_coastline'}
-
-    # get shape filename
-    shpfile = pkg_resources.resource_filename(pkg_name, "resources/shapefile/" + names[name] + ".shp")
+    # 使用缓存的已投影图层
+    clip_extent = _basemap_clip_extent(ax, crs, facecolor)
+    paths = _basemap_paths(name, ax.projection, crs, clip_extent=clip_extent, boundary_only=clip_extent is not None)
 
     # add map
-    ax.add_geometries(
-        Reader(shpfile).geometries(), 
-        facecolor=facecolor, edgecolor=edgecolor, lw=lw,crs=crs, **kwargs)
+    collection = PathCollection(paths, facecolor=facecolor, edgecolor=edgecolor, lw=lw, transform=ax.transData, **kwargs)
+    ax.add_collection(collection, autolim=False)
+    return collection
 
 
 def adjust_map_ratio(ax, map_extent=None, datacrs=None):
@@ -520,6 +578,14 @@ def add_cartopy_background(ax, name='RD'):
     ax.background_img(name=name, resolution='high')
 
 
+@functools.lru_cache(maxsize=None)
+def _read_city(fpath):
+    '''
+    [城市表只读取一次]
+    '''
+    return pd.read_csv(pkg_resources.resource_filename(pkg_name, fpath), encoding='gbk', comment='#')
+
+
 def add_city_on_map(ax, map_extent=None, size=7, small_city=False, zorder=10,city_type='provincial_capital',city_slt=None, **kwargs):
     """
     :param ax: `matplotlib.figure`, The `figure` instance used for plotting
@@ -544,7 +610,7 @@ def add_city_on_map(ax, map_extent=None, size=7, small_city=False, zorder=10,cit
     except KeyError:
         raise ValueError('can not find the file city_province.000 in the resources')
 
-    city = pd.read_csv(pkg_resources.resource_filename(pkg_name, fpath), encoding='gbk', comment='#')
+    city = _read_city(fpath)
 
     lon = city['lon'].values
     lat = city['lat'].values
@@ -670,7 +736,7 @@ def add_city_values_on_map(ax, data, map_extent=None, size=13, zorder=10, cmap=N
     except KeyError:
         raise ValueError('can not find the file city_province.csv in the resources')
 
-    city = pd.read_csv(pkg_resources.resource_filename(pkg_name, fpath), encoding='gbk', comment='#')
+    city = _read_city(fpath)
 
     lon = city['lon'].values
     lat = city['lat'].values
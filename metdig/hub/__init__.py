@@ -2,4 +2,5 @@ from .basic_anl import *
 from .compare import *
 from .evolution import *
 from .ver_vs_anl import *
-from .stability import *
\ No newline at end of file
+from .stability import *
+from .timelapse import *
@@ -147,6 +147,79 @@ def save_animation(img_bufs, output_dir, gif_name, fps=2, is_clean_plt=True):
     return gif_path
 
 
+class _GifStreamWriter(object):
+    '''
+    [逐帧写入的gif，每帧单独量化为256色并带局部调色板，写完即释放，内存占用与帧数无关]
+    '''
+
+    def __init__(self, uri, fps=2, loop=0):
+        self.fp = open(uri, 'wb') if isinstance(uri, str) else uri
+        self.is_close_fp = isinstance(uri, str)
+        self.duration = int(1000 / fps)
+        self.loop = loop
+        self.nframes = 0
+
+    def append_data(self, img):
+        from PIL import Image as PILImage
+        from PIL import GifImagePlugin
+
+        img = np.asarray(img)
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = img[..., :3]
+        frame = PILImage.fromarray(np.ascontiguousarray(img, dtype='uint8')).convert('RGB')
+        frame = frame.quantize(colors=256, method=PILImage.Quantize.MEDIANCUT)
+        if self.nframes == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+            for block in header:
+                self.fp.write(block)
+        for block in GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True):
+            self.fp.write(block)
+        self.nframes += 1
+
+    def close(self):
+        if self.fp is None:
+            return
+        if self.nframes > 0:
+            self.fp.write(b';')  # gif结束符
+        if self.is_close_fp:
+            self.fp.close()
+        self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_animation_writer(uri, fps=2):
+    '''
+
+    [获取逐帧写入的动画writer，根据扩展名选择gif或mp4，writer.append_data(img)每次写入一帧]
+
+    Arguments:
+        uri {[str or file-like]} -- [输出文件路径，文件对象时只支持gif]
+
+    Keyword Arguments:
+        fps {number} -- [动画速度] (default: {2})
+
+    Returns:
+        [writer] -- [带append_data和close方法的writer]
+    '''
+    ext = os.path.splitext(uri)[1].lower() if isinstance(uri, str) else '.gif'
+    if ext == '.gif':
+        return _GifStreamWriter(uri, fps=fps, loop=0)
+    elif ext in ('.mp4', '.mov', '.avi', '.mkv'):
+        try:
+            import imageio_ffmpeg
+        except ImportError:
+            raise Exception('write {} requires imageio-ffmpeg, please install imageio-ffmpeg first!'.format(ext))
+        # ffmpeg通过管道逐帧编码
+        return imageio.get_writer(uri, format='FFMPEG', mode='I', fps=fps)
+    else:
+        raise Exception('animation format must be gif or mp4, not {}'.format(ext))
+
+
 def save_tab(img_bufs, output_dir, png_name, tab_size=(30, 18),tab_dist=None, is_clean_plt=True):
     '''
     保存成tab，多图叠加
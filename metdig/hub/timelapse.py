@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+'''
+流式动画：逐帧读取、绘制、编码，读取下一帧数据与当前帧绘制并行。
+所有帧共用同一个画板，地图底图等静态图层只绘制一次，每帧只替换数据图层和时间说明，
+绘制完的帧直接写入gif/mp4，内存占用与动画帧数无关。
+'''
+import os
+import collections
+from concurrent import futures
+from io import BytesIO
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from metdig.graphics.draw_compose import horizontal_compose
+from metdig.graphics.contourf_method import cref_contourf
+from metdig.graphics.pcolormesh_method import ir_pcolormesh
+from metdig.graphics.lib import utl_plotmap
+from metdig.hub.lib.utility import get_animation_writer
+from metdig.onestep.lib.utility import get_map_area
+
+import logging
+_log = logging.getLogger(__name__)
+
+__all__ = [
+    'timelapse',
+    'radar_timelapse',
+    'satellite_timelapse',
+]
+
+
+def _prefetch(read_func, read_args_all, prefetch=4, max_workers=4):
+    '''
+    [按顺序返回(read_args, data)，最多提前读取prefetch帧，读取失败的帧data为None]
+    '''
+    def _read(read_args):
+        try:
+            return read_func(**read_args)
+        except Exception as e:
+            _log.info(str(e))
+            return None
+
+    read_args_iter = iter(read_args_all)
+    pending = collections.deque()
+    with futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executer:
+        for read_args in read_args_iter:
+            pending.append((read_args, executer.submit(_read, read_args)))
+            if len(pending) >= max(1, prefetch):
+                break
+        while pending:
+            read_args, task = pending.popleft()
+            # 取出一帧后补充提交一帧，保证排队中的帧数不超过prefetch
+            for next_args in read_args_iter:
+                pending.append((next_args, executer.submit(_read, next_args)))
+                break
+            yield read_args, task.result()
+
+
+def _fig_to_rgb(canvas, crop=None):
+    canvas.draw()
+    img = np.asarray(canvas.buffer_rgba())
+    if crop is not None:
+        img = img[crop]
+    return img[..., :3].copy()
+
+
+def _get_crop(fig, canvas, pad=0.1):
+    '''
+    [与bbox_inches='tight'一致，根据第一帧计算裁剪范围，之后所有帧使用相同的裁剪范围保证帧大小一致]
+    '''
+    canvas.draw()
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad)
+    width, height = canvas.get_width_height()
+    dpi = fig.dpi
+    x0, x1 = max(0, int(bbox.x0 * dpi)), min(width, int(np.ceil(bbox.x1 * dpi)))
+    y0, y1 = max(0, int(height - bbox.y1 * dpi)), min(height, int(np.ceil(height - bbox.y0 * dpi)))
+    return (slice(y0, y1), slice(x0, x1))
+
+
+def timelapse(read_func=None, read_args_all=[], draw_func=None, info_func=None,
+              title='', map_extent=(60, 145, 15, 55), output_dir=None, anim_name='timelapse.gif',
+              fps=2, prefetch=4, max_workers=4, dpi=100, is_clean_plt=True, **pallete_kwargs):
+    '''
+
+    [流式动画，逐帧读取绘制并写入gif/mp4]
+
+    Keyword Arguments:
+        read_func {[function]} -- [读取函数，如cassandra.get_radar_mosaic] (default: {None})
+        read_args_all {list} -- [每帧的读取参数字典] (default: {[]})
+        draw_func {[function]} -- [每帧的绘图函数draw_func(ax, data, add_colorbar)，只有第一帧add_colorbar为True] (default: {None})
+        info_func {[function]} -- [每帧的说明信息info_func(data)，返回字符串] (default: {None})
+        title {str} -- [标题] (default: {''})
+        map_extent {tuple} -- [绘图区域] (default: {(60, 145, 15, 55)})
+        output_dir {[str]} -- [输出目录，为None时gif写入内存] (default: {None})
+        anim_name {str} -- [动画文件名，扩展名为.gif或.mp4] (default: {'timelapse.gif'})
+        fps {number} -- [动画速度] (default: {2})
+        prefetch {number} -- [最多提前读取的帧数] (default: {4})
+        max_workers {number} -- [读取线程数] (default: {4})
+        dpi {number} -- [分辨率] (default: {100})
+        is_clean_plt {bool} -- [是否关闭画板，为False时在notebook中显示gif] (default: {True})
+
+    Returns:
+        [str or BytesIO] -- [动画文件路径，output_dir为None时返回gif内容]
+    '''
+    if output_dir:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        anim_path = os.path.join(output_dir, anim_name)
+    else:
+        if os.path.splitext(anim_name)[1].lower() != '.gif':
+            raise Exception('output_dir is None, only gif can be written to memory')
+        anim_path = BytesIO()
+
+    # 静态图层（底图、标题、标签）只绘制一次
+    obj = horizontal_compose(title=title, description='', png_name=anim_name, map_extent=map_extent,
+                             is_overwrite=True, kwargs=pallete_kwargs)
+    fig, ax = obj.fig, obj.ax
+    fig.set_dpi(dpi)
+    canvas = FigureCanvasAgg(fig)
+    static_artists = set(ax.get_children())
+    static_axes = None
+    crop = None
+
+    nframes = 0
+    writer = get_animation_writer(anim_path, fps=fps)
+    try:
+        for read_args, data in _prefetch(read_func, read_args_all, prefetch=prefetch, max_workers=max_workers):
+            if data is None:
+                _log.info('timelapse: skip frame {}'.format(read_args))
+                continue
+            try:
+                draw_func(ax, data, add_colorbar=static_axes is None)
+                if info_func is not None:
+                    utl_plotmap.forcast_info(ax, x=0.01, y=0.99, info=info_func(data), transform=ax.transAxes)
+                if crop is None:
+                    crop = _get_crop(fig, canvas)
+                writer.append_data(_fig_to_rgb(canvas, crop))
+                nframes += 1
+            except Exception as e:
+                _log.info('timelapse: draw frame {} failed: {}'.format(read_args, str(e)))
+            finally:
+                # 第一帧绘制后的colorbar等附加axes作为静态图层保留
+                if static_axes is None:
+                    static_axes = set(fig.axes)
+                for artist in set(ax.get_children()) - static_artists:
+                    artist.remove()
+                for _ax in set(fig.axes) - static_axes:
+                    _ax.remove()
+    finally:
+        writer.close()
+        plt.close(fig)
+
+    if nframes == 0:
+        raise Exception('timelapse: can not get any frame!')
+    _log.info('timelapse: {} frames'.format(nframes))
+
+    if is_clean_plt == False:
+        from IPython.display import Image, display
+        if isinstance(anim_path, BytesIO):
+            display(Image(data=anim_path.getvalue()))
+        elif anim_path.lower().endswith('.gif'):
+            display(Image(filename=anim_path))
+
+    return anim_path
+
+
+def radar_timelapse(obs_times=None, area='全国', output_dir=None, anim_name=None,
+                    fps=2, prefetch=4, max_workers=4, dpi=100, is_clean_plt=True,
+                    ref_contourf_kwargs={}, **pallete_kwargs):
+    '''
+
+    [天气雷达组合反射率流式动画]
+
+    Keyword Arguments:
+        obs_times {[list]} -- [观测时间列表,datetime] (default: {None})
+        area {str} -- [区域] (default: {'全国'})
+        output_dir {[str]} -- [输出目录] (default: {None})
+        anim_name {[str]} -- [动画文件名，扩展名为.gif或.mp4，不传按时间生成gif文件名] (default: {None})
+        fps {number} -- [动画速度] (default: {2})
+        prefetch {number} -- [最多提前读取的帧数] (default: {4})
+        max_workers {number} -- [读取线程数] (default: {4})
+
+    Returns:
+        [str or BytesIO] -- [动画文件路径，output_dir为None时返回gif内容]
+    '''
+    from metdig.io.cassandra import get_radar_mosaic
+
+    map_extent = get_map_area(area)
+    obs_times = sorted(obs_times)
+    if anim_name is None:
+        anim_name = '天气雷达组合反射率_{:%Y%m%d%H%M}_{:%Y%m%d%H%M}.gif'.format(obs_times[0], obs_times[-1])
+
+    read_args_all = [{'obs_time': obs_time, 'data_name': 'achn', 'var_name': 'cref', 'extent': map_extent}
+                     for obs_time in obs_times]
+
+    def _draw(ax, cref, add_colorbar=True):
+        cref_contourf(ax, cref, add_colorbar=add_colorbar, kwargs=ref_contourf_kwargs)
+
+    def _info(cref):
+        return '观测时间: {0:%m}月{0:%d}日{0:%H}时{0:%M}分（BJT）\nwww.nmc.cn'.format(cref.stda.time[0])
+
+    return timelapse(read_func=get_radar_mosaic, read_args_all=read_args_all, draw_func=_draw, info_func=_info,
+                     title='天气雷达组合反射率观测', map_extent=map_extent, output_dir=output_dir, anim_name=anim_name,
+                     fps=fps, prefetch=prefetch, max_workers=max_workers, dpi=dpi, is_clean_plt=is_clean_plt,
+                     **pallete_kwargs)
+
+
+def satellite_timelapse(obs_times=None, data_name='fy4bl1', var_name='tbb', channel=12, area='全国',
+                        output_dir=None, anim_name=None, fps=2, prefetch=4, max_workers=4, dpi=100,
+                        is_clean_plt=True, ir_pcolormesh_kwargs={}, **pallete_kwargs):
+    '''
+
+    [卫星云图流式动画]
+
+    Keyword Arguments:
+        obs_times {[list]} -- [观测时间列表,datetime] (default: {None})
+        data_name {str} -- [卫星数据名] (default: {'fy4bl1'})
+        var_name {str} -- [要素名] (default: {'tbb'})
+        channel {number} -- [通道号，9为水汽，12为红外] (default: {12})
+        area {str} -- [区域] (default: {'全国'})
+        output_dir {[str]} -- [输出目录] (default: {None})
+        anim_name {[str]} -- [动画文件名，扩展名为.gif或.mp4，不传按时间生成gif文件名] (default: {None})
+        fps {number} -- [动画速度] (default: {2})
+        prefetch {number} -- [最多提前读取的帧数] (default: {4})
+        max_workers {number} -- [读取线程数] (default: {4})
+
+    Returns:
+        [str or BytesIO] -- [动画文件路径，output_dir为None时返回gif内容]
+    '''
+    from metdig.io.cassandra import get_fy_awx
+
+    map_extent = get_map_area(area)
+    obs_times = sorted(obs_times)
+    if channel == 9:
+        ir_name = '水汽(6.25微米)'
+        ir_cmap = 'met/wv_enhancement_r'
+        levels = np.arange(159.3, 299.7)
+    else:
+        ir_name = '红外(10.8微米)'
+        ir_cmap = 'met/ir_enhancement1'
+        levels = np.arange(121.6, 336.2)
+    if anim_name is None:
+        anim_name = '{}卫星观测{}_{:%Y%m%d%H%M}_{:%Y%m%d%H%M}.gif'.format(data_name, ir_name, obs_times[0], obs_times[-1])
+
+    read_args_all = [{'obs_time': obs_time, 'data_name': data_name, 'var_name': var_name, 'channel': channel,
+                      'extent': map_extent} for obs_time in obs_times]
+
+    def _draw(ax, ir, add_colorbar=True):
+        ir_pcolormesh(ax, ir, cmap=ir_cmap, levels=levels, add_colorbar=add_colorbar, kwargs=ir_pcolormesh_kwargs)
+
+    def _info(ir):
+        return '卫星观测时间: {0:%Y}年{0:%m}月{0:%d}日{0:%H}时{0:%M}分'.format(ir.stda.time[0])
+
+    return timelapse(read_func=get_fy_awx, read_args_all=read_args_all, draw_func=_draw, info_func=_info,
+                     title='[{}] {}观测'.format(data_name, ir_name), map_extent=map_extent, output_dir=output_dir,
+                     anim_name=anim_name, fps=fps, prefetch=prefetch, max_workers=max_workers, dpi=dpi,
+                     is_clean_plt=is_clean_plt, **pallete_kwargs)
@@ -1,22 +1,37 @@
 # -*- coding: utf-8 -*
 
-from . import cassandra
-from . import cimiss
-from . import cmadaas
-from . import era5_manual_download
-from . import cmadass_manual_download
-from . import era5
-from . import nmc_micaps_helper
-from . import nmc_cmadass_helper
-from . import thredds
-from . import custom
+import importlib
 
+from . import request_planner
+
+from .request_planner import RequestPlanner
 
 from metdig.io.lib import config
+from metdig.io.lib import lazy_reader
+from metdig.io.lib.memory_cache import enable_memory_cache, disable_memory_cache, clear_memory_cache, memory_cache_info
+from metdig.io.lib.field_cache import enable_field_cache, disable_field_cache, clear_field_cache, field_cache_info
 
 import logging
 _log = logging.getLogger(__name__)
 
+# 各数据源模块在第一次使用时才导入（同时才会导入对应的nmc_met_io读取模块），如metdig.io.cassandra
+_submodules = ['cassandra', 'cimiss', 'cmadaas', 'era5_manual_download', 'cmadass_manual_download', 'era5',
+               'nmc_micaps_helper', 'nmc_cmadass_helper', 'thredds', 'custom']
+
+
+def _backend(name):
+    return importlib.import_module('.' + name, __name__)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return _backend(name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _submodules)
+
 
 def config_init(CMADaaS_DNS=None, CMADaaS_PORT=None, CMADaaS_USER_ID=None, CMADaaS_PASSWORD=None, CMADaaS_serviceNodeId=None,
                 MICAPS_GDS_IP=None, MICAPS_GDS_PORT=None,
@@ -61,19 +76,25 @@ def get_model_grid(data_source,  throwexp=True, **kwargs):
         [stda] -- [description]
     '''
     try:
+        # 已在当前请求计划(RequestPlanner)中读取过的数据直接返回
+        hit, data = request_planner.lookup(data_source, kwargs)
+        if hit:
+            if data is None:
+                raise Exception('Can not get data from request plan! data_source={} {}'.format(data_source, kwargs))
+            return data
         if data_source == 'cassandra':
-            return cassandra.get_model_grid(**kwargs)
+            return _backend('cassandra').get_model_grid(**kwargs)
         elif data_source == 'cds':
             # era5 不存在fhour和data_name参数
             kwargs.pop('fhour')
             kwargs.pop('data_name')
-            return era5.get_model_grid(**kwargs)
+            return _backend('era5').get_model_grid(**kwargs)
         elif data_source == 'cmadaas':
-            return cmadaas.get_model_grid(**kwargs)
+            return _backend('cmadaas').get_model_grid(**kwargs)
         elif data_source == 'thredds':
-            return thredds.get_model_grid(**kwargs)
+            return _backend('thredds').get_model_grid(**kwargs)
         elif data_source == 'custom':
-            return custom.get_model_grid(**kwargs)
+            return _backend('custom').get_model_grid(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -85,7 +106,7 @@ def get_model_grid(data_source,  throwexp=True, **kwargs):
     return None
 
 
-def get_model_grids(data_source, throwexp=True, **kwargs):
+def get_model_grids(data_source, throwexp=True, max_workers=1, **kwargs):
     '''
 
     [读取单层多时次模式网格数据]
@@ -94,26 +115,27 @@ def get_model_grids(data_source, throwexp=True, **kwargs):
         data_source {[str]} -- [可选择填写如下数据源: cassandra, cmadaas, era5, thredds)]
         **kwargs {[type]} -- [调用读取函数的kwargs]
         throwexp {bool} -- [是否抛出异常，（注意谨慎设置为False，不会抛出任何异常，无法定位为何出错）] (default: {True})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取，目前仅cassandra数据源支持] (default: {1})
 
     Returns:
         [stda] -- [description]
     '''
     try:
         if data_source == 'cassandra':
-            return cassandra.get_model_grids(**kwargs)
+            return _backend('cassandra').get_model_grids(max_workers=max_workers, **kwargs)
         elif data_source == 'cds':
             # era5 不存在fhour和data_name参数，era5的init_times等效于其它的init_time+fhour
             if 'init_time' in kwargs:
                 kwargs['init_times'] = kwargs['init_time']
             kwargs.pop('fhours')
             kwargs.pop('data_name')
-            return era5.get_model_grids(**kwargs)
+            return _backend('era5').get_model_grids(**kwargs)
         elif data_source == 'cmadaas':
-            return cmadaas.get_model_grids(**kwargs)
+            return _backend('cmadaas').get_model_grids(**kwargs)
         elif data_source == 'thredds':
-            return thredds.get_model_grids(**kwargs)
+            return _backend('thredds').get_model_grids(**kwargs)
         elif data_source == 'custom':
-            return custom.get_model_grids(**kwargs)
+            return _backend('custom').get_model_grids(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -140,18 +162,18 @@ def get_model_3D_grid(data_source, throwexp=True, **kwargs):
     '''
     try:
         if data_source == 'cassandra':
-            return cassandra.get_model_3D_grid(**kwargs)
+            return _backend('cassandra').get_model_3D_grid(**kwargs)
         elif data_source == 'cds':
             # era5 不存在fhour和data_name参数
             kwargs.pop('fhour')
             kwargs.pop('data_name')
-            return era5.get_model_3D_grid(**kwargs)
+            return _backend('era5').get_model_3D_grid(**kwargs)
         elif data_source == 'cmadaas':
-            return cmadaas.get_model_3D_grid(**kwargs)
+            return _backend('cmadaas').get_model_3D_grid(**kwargs)
         elif data_source == 'thredds':
-            return thredds.get_model_3D_grid(**kwargs)
+            return _backend('thredds').get_model_3D_grid(**kwargs)
         elif data_source == 'custom':
-            return custom.get_model_3D_grid(**kwargs)
+            return _backend('custom').get_model_3D_grid(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -163,7 +185,7 @@ def get_model_3D_grid(data_source, throwexp=True, **kwargs):
     return None
 
 
-def get_model_3D_grids(data_source, throwexp=True, **kwargs):
+def get_model_3D_grids(data_source, throwexp=True, max_workers=1, lazy=False, **kwargs):
     '''
 
     [读取多层多时次模式网格数据]
@@ -172,28 +194,35 @@ def get_model_3D_grids(data_source, throwexp=True, **kwargs):
         data_source {[str]} -- [可选择填写如下数据源: cassandra, cmadaas, era5, thredds)]
         **kwargs {[type]} -- [调用读取函数的kwargs]
         throwexp {bool} -- [是否抛出异常，（注意谨慎设置为False，不会抛出任何异常，无法定位为何出错）] (default: {True})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取，目前仅cassandra数据源支持] (default: {1})
+        lazy {bool} -- [是否延迟读取，True时返回dask数组的stda，每个(fhour, level)场为一个chunk，计算时才读取，需要安装dask，目前仅cassandra/cmadaas/custom数据源支持] (default: {False})
 
     Returns:
         [stda] -- [description]
     '''
     try:
+        if lazy:
+            if data_source not in ['cassandra', 'cmadaas', 'custom']:
+                raise Exception('lazy=True does not support data_source={}!'.format(data_source))
+            return lazy_reader.lazy_model_3D_grids(_backend(data_source).get_model_grid, **kwargs)
+
         if data_source == 'cassandra':
-            return cassandra.get_model_3D_grids(**kwargs)
+            return _backend('cassandra').get_model_3D_grids(max_workers=max_workers, **kwargs)
         elif data_source == 'cds':
             # era5 不存在fhour和data_name参数，era5的init_times等效于其它的init_time+fhour
             if 'init_time' in kwargs:
                 kwargs['init_times'] = kwargs['init_time']
             kwargs.pop('fhours')
             kwargs.pop('data_name')
-            return era5.get_model_3D_grids(**kwargs)
+            return _backend('era5').get_model_3D_grids(**kwargs)
         elif data_source == 'cmadaas':
-            return cmadaas.get_model_3D_grids(**kwargs)
+            return _backend('cmadaas').get_model_3D_grids(**kwargs)
         elif data_source == 'thredds':
             if 'init_time' in kwargs:
                 kwargs['init_times'] = kwargs['init_time']
-            return thredds.get_model_3D_grids(**kwargs)
+            return _backend('thredds').get_model_3D_grids(**kwargs)
         elif data_source == 'custom':
-            return custom.get_model_3D_grids(**kwargs)
+            return _backend('custom').get_model_3D_grids(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -220,19 +249,19 @@ def get_model_points(data_source, throwexp=True, **kwargs):
     '''
     try:
         if data_source == 'cassandra':
-            return cassandra.get_model_points(**kwargs)
+            return _backend('cassandra').get_model_points(**kwargs)
         elif data_source == 'cmadaas':
-            return cmadaas.get_model_points(**kwargs)
+            return _backend('cmadaas').get_model_points(**kwargs)
         elif data_source == 'cds':
             # era5 不存在fhour和data_name参数
             kwargs.pop('fhours')
             kwargs.pop('data_name')
-            return era5.get_model_points(**kwargs)
+            return _backend('era5').get_model_points(**kwargs)
         elif data_source == 'thredds':
             kwargs.pop('fhours')
-            return thredds.get_model_points(**kwargs)
+            return _backend('thredds').get_model_points(**kwargs)
         elif data_source == 'custom':
-            return custom.get_model_points(**kwargs)
+            return _backend('custom').get_model_points(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -259,11 +288,11 @@ def get_obs_stations(data_source, throwexp=True, **kwargs):
     '''
     try:
         if data_source == 'cassandra':
-            return cassandra.get_obs_stations(**kwargs)
+            return _backend('cassandra').get_obs_stations(**kwargs)
         elif data_source == 'cmadaas':
             kwargs.pop('level','')
             kwargs.pop('is_save_other_info','')
-            return cmadaas.get_obs_stations(**kwargs)
+            return _backend('cmadaas').get_obs_stations(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -289,11 +318,11 @@ def get_obs_stations_multitime(data_source, throwexp=True, **kwargs):
     '''
     try:
         if data_source == 'cassandra':
-            return cassandra.get_obs_stations_multitime(**kwargs)
+            return _backend('cassandra').get_obs_stations_multitime(**kwargs)
         elif data_source == 'cmadaas':
             # kwargs.pop('level') #不知何用 20220414
             # kwargs.pop('is_save_other_info') #不知何用 20220414
-            return cmadaas.get_obs_stations_multitime(**kwargs)
+            return _backend('cmadaas').get_obs_stations_multitime(**kwargs)
         else:
             raise Exception('data_source={} error!'.format(data_source))
     except Exception as e:
@@ -19,6 +19,9 @@ import metdig.io.nmc_micaps_helper as nmc_micaps_helper
 
 from metdig.io.lib import cassandra_model_cfg, cassandra_obs_cfg, cassandra_sate_cfg, cassandra_radar_cfg
 from metdig.io.lib import utility as utl
+from metdig.io.lib import fetch_engine
+from metdig.io.lib import memory_cache
+from metdig.io.lib import field_cache
 
 import metdig.utl as mdgstda
 
@@ -26,6 +29,7 @@ import logging
 _log = logging.getLogger(__name__)
 
 
+@memory_cache.cached('cassandra')
 def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, level=None,
                    extent=None, x_percent=0, y_percent=0,**kwargs):
     '''
@@ -68,7 +72,10 @@ def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, le
     except Exception as e:
         raise Exception(str(e))
     filename = utl.model_filename(init_time, fhour)
-    data = nmc_micaps_io.get_model_grid(cassandra_dir, filename=filename,**kwargs)  # ['number', 'time', 'level', 'lat', 'lon'] 注意（nmc_micaps_io返回的维度不统一）
+    # ['number', 'time', 'level', 'lat', 'lon'] 注意（nmc_micaps_io返回的维度不统一）
+    # 开启field_cache时，解码后的场从本地memmap缓存读取并在缓存上按extent裁剪
+    data = field_cache.read_field(nmc_micaps_io.get_model_grid, cassandra_dir, filename,
+                                  extent=extent, x_percent=x_percent, y_percent=y_percent, **kwargs)
     # 此处建议修改为warnning
     if data is None:
         raise Exception('Can not get data from cassandra! {}{}'.format(cassandra_dir, filename))
@@ -115,7 +122,7 @@ def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, le
 
 
 def get_model_grids(init_time=None, fhours=None, data_name=None, var_name=None, level=None,
-                    extent=None, x_percent=0, y_percent=0,**kwargs):
+                    extent=None, x_percent=0, y_percent=0, max_workers=1, timeout=None, retries=0, **kwargs):
     '''
 
     [读取单层多时次模式网格数据]
@@ -129,20 +136,20 @@ def get_model_grids(init_time=None, fhours=None, data_name=None, var_name=None,
         extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取] (default: {1})
+        timeout {[number]} -- [单次读取超时时间（秒），None代表不超时] (default: {None})
+        retries {int} -- [单次读取失败后的重试次数] (default: {0})
 
     Returns:
         [stda] -- [stda格式数据]
     '''
     fhours = utl.parm_tolist(fhours)
 
-    stda_data = []
-    for fhour in fhours:
-        try:  # 待斟酌
-            data = get_model_grid(init_time, fhour, data_name, var_name, level, extent=extent, x_percent=x_percent, y_percent=y_percent,**kwargs)
-        except:  # 待斟酌
-            continue
-        if data is not None and data.size > 0:
-            stda_data.append(data)
+    tasks = [dict(init_time=init_time, fhour=fhour, data_name=data_name, var_name=var_name, level=level,
+                  extent=extent, x_percent=x_percent, y_percent=y_percent, **kwargs) for fhour in fhours]
+    datas = fetch_engine.fetch_concurrent(get_model_grid, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
+
+    stda_data = [data for data in datas if data is not None and data.size > 0]
     if stda_data:
         return xr.concat(stda_data, dim='dtime')
     else:
@@ -150,7 +157,7 @@ def get_model_grids(init_time=None, fhours=None, data_name=None, var_name=None,
 
 
 def get_model_3D_grid(init_time=None, fhour=None, data_name=None, var_name=None, levels=None,
-                      extent=None, x_percent=0, y_percent=0,**kwargs):
+                      extent=None, x_percent=0, y_percent=0, max_workers=1, timeout=None, retries=0, **kwargs):
     '''
 
     [读取多层单时次模式网格数据]
@@ -164,27 +171,27 @@ def get_model_3D_grid(init_time=None, fhour=None, data_name=None, var_name=None,
         extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取] (default: {1})
+        timeout {[number]} -- [单次读取超时时间（秒），None代表不超时] (default: {None})
+        retries {int} -- [单次读取失败后的重试次数] (default: {0})
 
     Returns:
         [stda] -- [stda格式数据]
     '''
     levels = utl.parm_tolist(levels)
 
-    stda_data = []
-    for level in levels:
-        try:
-            data = get_model_grid(init_time, fhour, data_name, var_name, level, extent=extent, x_percent=x_percent, y_percent=y_percent,**kwargs)
-            if data is not None and data.size > 0:
-                stda_data.append(data)
-        except Exception as e:
-            _log.info(str(e))
+    tasks = [dict(init_time=init_time, fhour=fhour, data_name=data_name, var_name=var_name, level=level,
+                  extent=extent, x_percent=x_percent, y_percent=y_percent, **kwargs) for level in levels]
+    datas = fetch_engine.fetch_concurrent(get_model_grid, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
+
+    stda_data = [data for data in datas if data is not None and data.size > 0]
     if stda_data:
         return xr.concat(stda_data, dim='level')
     return None
 
 
 def get_model_3D_grids(init_time=None, fhours=None, data_name=None, var_name=None, levels=None,
-                       extent=None, x_percent=0, y_percent=0,**kwargs):
+                       extent=None, x_percent=0, y_percent=0, max_workers=1, timeout=None, retries=0, **kwargs):
     '''
 
     [读取多层多时次模式网格数据]
@@ -198,6 +205,9 @@ def get_model_3D_grids(init_time=None, fhours=None, data_name=None, var_name=Non
         extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取] (default: {1})
+        timeout {[number]} -- [单次读取超时时间（秒），None代表不超时] (default: {None})
+        retries {int} -- [单次读取失败后的重试次数] (default: {0})
 
     Returns:
         [stda] -- [stda格式数据]
@@ -205,18 +215,18 @@ def get_model_3D_grids(init_time=None, fhours=None, data_name=None, var_name=Non
     fhours = utl.parm_tolist(fhours)
     levels = utl.parm_tolist(levels)
 
-    stda_data = []
+    # 所有时效*层次一次性提交，结果按照fhour/level顺序返回
+    tasks = []
     for fhour in fhours:
-        temp_data = []
         for level in levels:
-            try:
-                data = get_model_grid(init_time, fhour, data_name, var_name, level, extent=extent, x_percent=x_percent, y_percent=y_percent,**kwargs)
-                if data is not None and data.size > 0:
-                    temp_data.append(data)
-            except Exception as e:
-                # 若需要,请修改为warning
-                _log.info(str(e))
-                continue
+            tasks.append(dict(init_time=init_time, fhour=fhour, data_name=data_name, var_name=var_name, level=level,
+                              extent=extent, x_percent=x_percent, y_percent=y_percent, **kwargs))
+    datas = fetch_engine.fetch_concurrent(get_model_grid, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
+
+    stda_data = []
+    for i in range(len(fhours)):
+        temp_data = datas[i * len(levels): (i + 1) * len(levels)]
+        temp_data = [data for data in temp_data if data is not None and data.size > 0]
         if temp_data:
             temp_data = xr.concat(temp_data, dim='level')
             stda_data.append(temp_data)
@@ -252,27 +262,8 @@ def get_model_points(init_time=None, fhours=None, data_name=None, var_name=None,
     return None
 
 
-def get_obs_stations(obs_time=None, data_name=None, var_name=None, level=None, id_selected=None,
-                     extent=None, x_percent=0, y_percent=0, is_save_other_info=False):
-    '''
-
-    [获取单层单时次观测站点数据]
-
-    Keyword Arguments:
-        obs_time {[datetime]} -- [观测时间]
-        data_name {[str]} -- [观测类型]
-        var_name {[str]} -- [要素名]
-        level {[int]} -- [层次，如果是地面观测站则不传，如果是探空层则传层次]
-        id_selected {[list or item]} -- [站号，站号列表或单站] (default: {None})
-        extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
-        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
-        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
-        is_save_other_info {bool} -- [是否保存从nmc_met_io中读取到的其它信息] (default: {False})
-
-    Returns:
-        [stda] -- [stda格式数据]
-    '''
-    # 从配置中获取相关信息
+def _get_obs_cfg(data_name=None, var_name=None, level=None):
+    # 从配置中获取相关信息，返回(可以直接使用的目录, 带日期格式的文件名, 数据单位)
     try:
         cassandra_path = cassandra_obs_cfg().obs_cassandra_dir(data_name=data_name, var_name=var_name)  # cassandra数据路径
         cassandra_units = cassandra_obs_cfg().obs_cassandra_units(data_name=data_name, var_name=var_name)  # cassandra数据单位
@@ -282,6 +273,11 @@ def get_obs_stations(obs_time=None, data_name=None, var_name=None, level=None, i
     cassandra_path = utl.cfgpath_format_todatestr(cassandra_path, level=level)  # 带日期格式的路径
     cassandra_dir = os.path.dirname(cassandra_path) + '/'  # 可以直接使用的目录
     filename = os.path.basename(cassandra_path)  # 带日期格式的文件名
+    return cassandra_dir, filename, cassandra_units
+
+
+def _get_obs_data(obs_time=None, cassandra_dir=None, filename=None, id_selected=None, extent=None, x_percent=0, y_percent=0):
+    # 读取单时次站点文件，完成区域裁剪、站点选择及列名转换，返回以站号为索引的DataFrame
     filename = datetime.datetime.strftime(obs_time, filename)
 
     # ['ID', 'lon', 'lat', 'time', ......] ('ID', 'i4'), ('lon', 'f4'), ('lat', 'f4'), ('numb', 'i2')]
@@ -305,6 +301,33 @@ def get_obs_stations(obs_time=None, data_name=None, var_name=None, level=None, i
 
     # 数据列转换成stda标准的名称
     data = utl.obs_rename_colname(data)
+    return data
+
+
+def get_obs_stations(obs_time=None, data_name=None, var_name=None, level=None, id_selected=None,
+                     extent=None, x_percent=0, y_percent=0, is_save_other_info=False):
+    '''
+
+    [获取单层单时次观测站点数据]
+
+    Keyword Arguments:
+        obs_time {[datetime]} -- [观测时间]
+        data_name {[str]} -- [观测类型]
+        var_name {[str]} -- [要素名]
+        level {[int]} -- [层次，如果是地面观测站则不传，如果是探空层则传层次]
+        id_selected {[list or item]} -- [站号，站号列表或单站] (default: {None})
+        extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
+        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        is_save_other_info {bool} -- [是否保存从nmc_met_io中读取到的其它信息] (default: {False})
+
+    Returns:
+        [stda] -- [stda格式数据]
+    '''
+    cassandra_dir, filename, cassandra_units = _get_obs_cfg(data_name=data_name, var_name=var_name, level=level)
+
+    data = _get_obs_data(obs_time=obs_time, cassandra_dir=cassandra_dir, filename=filename, id_selected=id_selected,
+                         extent=extent, x_percent=x_percent, y_percent=y_percent)
 
     # 层次初始化，如果为地面层次，初始化为0
     if level:
@@ -329,10 +352,11 @@ def get_obs_stations(obs_time=None, data_name=None, var_name=None, level=None, i
     )
 
 def get_obs_stations_multitime(obs_times=None, data_name=None, var_name=None, id_selected=None,
-                               extent=None, x_percent=0, y_percent=0, is_save_other_info=False):
+                               extent=None, x_percent=0, y_percent=0, is_save_other_info=False,
+                               level=None, max_workers=8, timeout=None, retries=0):
     '''
 
-    [获取单层多时次观测站点数据]
+    [获取单层多时次观测站点数据，各时次并发读取，所有时次的站点按列拼接后一次性转换成stda]
 
     Keyword Arguments:
         obs_times {[list or time]} -- [观测时间列表]
@@ -342,32 +366,43 @@ def get_obs_stations_multitime(obs_times=None, data_name=None, var_name=None, id
         extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        is_save_other_info {bool} -- [是否保存从nmc_met_io中读取到的其它信息，某时次缺少的信息列为nan] (default: {False})
+        level {[int]} -- [层次，如果是地面观测站则不传，如果是探空层则传层次] (default: {None})
+        max_workers {int} -- [并发读取的最大线程数，1代表串行读取] (default: {8})
+        timeout {[number]} -- [单次读取超时时间（秒），None代表不超时] (default: {None})
+        retries {int} -- [单次读取失败后的重试次数] (default: {0})
 
     Returns:
-        [stda] -- [stda格式数据]
+        [stda] -- [stda格式数据，所有时次都读取失败返回None]
     '''
     obs_times = utl.parm_tolist(obs_times)
 
-    datas = []
-    attrs = {}
-    for obs_time in obs_times:
-        try:
-            data = get_obs_stations(obs_time, data_name, var_name, id_selected=id_selected, extent=extent,
-                                    x_percent=x_percent, y_percent=y_percent, is_save_other_info=is_save_other_info)
+    # 配置只解析一次
+    cassandra_dir, filename, cassandra_units = _get_obs_cfg(data_name=data_name, var_name=var_name, level=level)
 
-            if data is not None and len(data) > 0:
-                attrs = data.attrs
-                datas.append(data)
+    tasks = [dict(obs_time=obs_time, cassandra_dir=cassandra_dir, filename=filename, id_selected=id_selected,
+                  extent=extent, x_percent=x_percent, y_percent=y_percent) for obs_time in obs_times]
+    datas = fetch_engine.fetch_concurrent(_get_obs_data, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
+    datas = [data for data in datas if data is not None and len(data) > 0]
+    if not datas:
+        return None
 
-        except Exception as e:
-            _log.info(str(e))
+    # 所有时次按列拼接，站号为索引列
+    datas = [data if 'ID' in data.columns else data.rename_axis('ID').reset_index() for data in datas]
+    other_names = []
+    if is_save_other_info:
+        for data in datas:
+            other_names += [c for c in data.columns if c not in ['lon', 'lat', 'ID', 'time', var_name] and c not in other_names]
+    columns = utl.obs_concat_columns(datas, ['ID', 'lon', 'lat', 'time', var_name] + other_names)
 
-    if datas:
-        df = pd.concat(datas, ignore_index=True)
-        df.attrs = attrs
-        return df
+    levels = np.full((len(columns['ID'])), level if level else 0)
 
-    return None
+    # 转成stda
+    return mdgstda.numpy_to_stastda(
+        columns[var_name], [data_name], levels, columns['time'], 0, columns['ID'], columns['lat'], columns['lon'],
+        np_input_units=cassandra_units, var_name=var_name, other_input={name: columns[name] for name in other_names},
+        data_source='cassandra', data_name=data_name
+    )
 
 if __name__ == '__main__':
     init_time = datetime.datetime(2024,8,4,12)
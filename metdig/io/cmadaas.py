@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import threading
+from concurrent import futures
 
 import datetime
 import xarray as xr
@@ -12,6 +14,8 @@ import metdig.io.nmc_cmadass_helper as nmc_cmadass_helper
 
 from metdig.io.lib import cmadaas_model_cfg, cmadaas_obs_cfg
 from metdig.io.lib import utility as utl
+from metdig.io.lib import fetch_engine
+from metdig.io.lib import memory_cache
 
 
 import metdig.utl as mdgstda
@@ -19,9 +23,72 @@ import metdig.utl as mdgstda
 import logging
 _log = logging.getLogger(__name__)
 
+# 同一个cmadaas服务器的最大并发连接数（所有线程共享）
+MAX_CONNECTIONS_PER_HOST = 8
+_host_semaphores = {}
+_host_lock = threading.Lock()
 
+
+def _host_semaphore():
+    try:
+        host = nmc_cmadaas_io.CONFIG.CONFIG['CMADaaS']['DNS']
+    except Exception:
+        host = 'default'
+    with _host_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+        return _host_semaphores[host]
+
+
+def _get_ens_member(**kwargs):
+    with _host_semaphore():
+        return nmc_cmadass_helper.cmadaas_ens_model_grid(**kwargs)
+
+
+def _get_ens_members(members, max_workers=8, **kwargs):
+    '''
+    并发读取集合预报成员，按成员顺序写入预先分配的数组，返回(按number拼接后的数据, 缺失的成员列表)
+    缺失的成员保留为nan，number坐标始终为全部成员，调用方通过缺失的成员列表记录attrs['missing_members']
+    '''
+    template = None
+    values = None
+    got = np.zeros(len(members), dtype=bool)
+
+    with futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(members)))) as executor:
+        tasks = {executor.submit(_get_ens_member, fcst_member=m, **kwargs): i for i, m in enumerate(members)}
+        for task in futures.as_completed(tasks):
+            i = tasks[task]
+            try:
+                tmp = task.result()
+            except Exception as e:
+                _log.info('cmadaas ens member {} failed: {}'.format(members[i], str(e)))
+                continue
+            if tmp is None:
+                continue
+            var = list(tmp.data_vars)[0]
+            if template is None:
+                template = tmp
+                values = np.full((len(members),) + tmp[var].shape[1:], np.nan, dtype=tmp[var].dtype)
+            elif tmp[var].shape[1:] != values.shape[1:]:
+                _log.info('cmadaas ens member {} shape {} is not consistent'.format(members[i], tmp[var].shape))
+                continue
+            values[i] = tmp[var].values[0]
+            got[i] = True
+
+    missing = [m for i, m in enumerate(members) if not got[i]]
+    if template is None:
+        return None, missing
+
+    var = list(template.data_vars)[0]
+    coords = {k: v for k, v in template.coords.items() if k != 'number'}
+    coords['number'] = members  # 缺失的成员为nan，不拷贝数组
+    data = xr.Dataset({var: (template[var].dims, values, template[var].attrs)}, coords=coords, attrs=template.attrs)
+    return data, missing
+
+
+@memory_cache.cached('cmadaas')
 def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, level=None,
-                   extent=None, x_percent=0, y_percent=0,cache_clear=True,dim_round=4,**kwargs):
+                   extent=None, x_percent=0, y_percent=0,cache_clear=True,dim_round=4,ens_max_workers=8,**kwargs):
     '''
 
     [读取单层单时次模式网格数据]
@@ -36,6 +103,7 @@ def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, le
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
         dim_round {number} 坐标保留几位小数
+        ens_max_workers {int} -- [集合预报并发读取成员的最大线程数，同时受MAX_CONNECTIONS_PER_HOST限制] (default: {8})
     Returns:
         [stda] -- [stda格式数据]
     '''
@@ -81,15 +149,13 @@ def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, le
         #针对大数据云平台中的集合成员数据
         ms = cmadaas_prod_type.split('_')[-1].split('-')[0]
         me = cmadaas_prod_type.split('_')[-1].split('-')[1]
-        data = []
-        for i in range(int(ms), int(me) + 1, 1):
-            tmp = nmc_cmadass_helper.cmadaas_ens_model_grid(data_code=cmadaas_data_code,
-                                                init_time=timestr, valid_time=fhour, level_type=cmadaas_level_type,#limit=limit, #暂时去除limit参数，因为nmc_met_io的缓存数据不能判断空间范围，导致重复读取数据
-                                                fcst_level=cmadaas_level, fcst_ele=cmadaas_var_name, fcst_member=i,cache_clear=cache_clear,**kwargs) # ['time', 'level', 'lat', 'lon'] 注意（nmc_micaps_io返回的维度不统一）
-            
-            if tmp is not None:
-                data.append(tmp)
-        data = xr.concat(data, dim='number')
+        # 并发读取所有成员
+        data, missing_members = _get_ens_members(list(range(int(ms), int(me) + 1, 1)), max_workers=ens_max_workers,
+                                                 data_code=cmadaas_data_code,
+                                                 init_time=timestr, valid_time=fhour, level_type=cmadaas_level_type,#limit=limit, #暂时去除limit参数，因为nmc_met_io的缓存数据不能判断空间范围，导致重复读取数据
+                                                 fcst_level=cmadaas_level, fcst_ele=cmadaas_var_name, cache_clear=cache_clear,**kwargs) # ['time', 'level', 'lat', 'lon'] 注意（nmc_micaps_io返回的维度不统一）
+        if missing_members:
+            _log.info('cmadaas ens missing members: {}'.format(missing_members))
     else:
         raise Exception('cmadaas_prod_type error!')
 
@@ -122,6 +188,9 @@ def get_model_grid(init_time=None, fhour=None, data_name=None, var_name=None, le
                                          member=member, level=[cmadaas_level], time=[init_time], dtime=[fhour],
                                          var_name=var_name, np_input_units=cmadaas_units,
                                          data_source='cmadaas', level_type=level_type)
+    if cmadaas_prod_type.startswith('ens'):
+        # 记录缺失的集合成员，逗号分隔
+        stda_data.attrs['missing_members'] = ','.join([data_name + '-' + str(m) for m in missing_members])
     return stda_data
 
     '''
@@ -305,44 +374,23 @@ def get_model_points(init_time=None, fhours=None, data_name=None, var_name=None,
     return None
 
 
-def get_obs_stations(obs_time=None, data_name=None, var_name=None, id_selected=None,
-                     extent=None, x_percent=0, y_percent=0):
-    '''
+# 支持按时间段(getSurfEleByTimeRange)检索的数据代码前缀
+_TIME_RANGE_DATA_CODES = ('SURF_',)
 
-    [获取单层单时次观测站点数据]
-
-    Keyword Arguments:
-        obs_time {[datetime]} -- [观测时间]
-        data_name {[str]} -- [观测类型]
-        var_name {[str]} -- [要素名]
-        id_selected {[list or item]} -- [站号，站号列表或单站] (default: {None})
-        extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
-        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
-        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
 
-    Returns:
-        [stda] -- [stda格式数据]
-    '''
-    # 从配置中获取相关信息
+def _get_obs_cfg(data_name=None, var_name=None):
+    # 从配置中获取相关信息，返回(cmadaas_data_code, cmadaas_var_name, cmadass_units)
     try:
         cmadaas_data_code = cmadaas_obs_cfg().obs_cmadaas_data_code(data_name=data_name, var_name=var_name)
         cmadass_units = cmadaas_obs_cfg().obs_cmadaas_units(data_name=data_name, var_name=var_name)  # cmadass数据单位
         cmadaas_var_name = cmadaas_obs_cfg().obs_cmadaas_var_name(data_name=data_name, var_name=var_name)
-        stda_attrs = mdgstda.get_stda_attrs(data_source='cmadaas', data_name=data_name, var_name=var_name)  # stda属性获取
         _log.debug('cmadaas_data_code={}, cmadaas_var_name={} '.format(cmadaas_data_code, cmadaas_var_name))
     except Exception as e:
         raise Exception(str(e))
+    return cmadaas_data_code, cmadaas_var_name, cmadass_units
 
-    # 读取数据
-    timestr = '{:%Y%m%d%H%M%S}'.format(obs_time - datetime.timedelta(hours=8))  # cmadaas数据都是世界时，需要转换为北京时
-    data = nmc_cmadaas_io.cmadaas_obs_by_time(timestr, data_code=cmadaas_data_code,
-                                              elements="Station_Id_C,Station_Id_d,lat,lon,Datetime," + cmadaas_var_name)
-    data['Datetime']=obs_time # cmadaas数据都是世界时，需要转换为北京时
-
-    if data is None:
-        raise Exception('Can not get data from cmadaas! cmadaas_data_code={}, cmadaas_var_name={}, obs_time={}'.format(
-            cmadaas_data_code, cmadaas_var_name, timestr))
 
+def _obs_select(data, id_selected=None, extent=None, x_percent=0, y_percent=0):
     data = data.set_index('Station_Id_C')  # 设置ID列为索引列
     # print(data.index.dtype)
     # print(data)
@@ -352,7 +400,57 @@ def get_obs_stations(obs_time=None, data_name=None, var_name=None, id_selected=N
 
     # 站点选择
     data = utl.sta_select_id(data, id_selected)
+    return data
+
+
+def _get_obs_data(obs_time=None, cmadaas_data_code=None, cmadaas_var_name=None,
+                  id_selected=None, extent=None, x_percent=0, y_percent=0):
+    # 读取单时次站点数据，完成区域裁剪及站点选择
+    timestr = '{:%Y%m%d%H%M%S}'.format(obs_time - datetime.timedelta(hours=8))  # cmadaas数据都是世界时，需要转换为北京时
+    with _host_semaphore():
+        data = nmc_cmadaas_io.cmadaas_obs_by_time(timestr, data_code=cmadaas_data_code,
+                                                  elements="Station_Id_C,Station_Id_d,lat,lon,Datetime," + cmadaas_var_name)
+    if data is None:
+        raise Exception('Can not get data from cmadaas! cmadaas_data_code={}, cmadaas_var_name={}, obs_time={}'.format(
+            cmadaas_data_code, cmadaas_var_name, timestr))
+    data['Datetime'] = obs_time  # cmadaas数据都是世界时，需要转换为北京时
+
+    return _obs_select(data, id_selected=id_selected, extent=extent, x_percent=x_percent, y_percent=y_percent)
 
+
+def _get_obs_data_by_time_range(obs_times=None, cmadaas_data_code=None, cmadaas_var_name=None,
+                                id_selected=None, extent=None, x_percent=0, y_percent=0):
+    # 一次时间段检索读取obs_times(升序)之间的所有记录，只保留obs_times中的时次
+    timerange = '[{:%Y%m%d%H%M%S},{:%Y%m%d%H%M%S}]'.format(obs_times[0] - datetime.timedelta(hours=8),
+                                                         obs_times[-1] - datetime.timedelta(hours=8))
+    with _host_semaphore():
+        data = nmc_cmadaas_io.cmadaas_obs_by_time_range(timerange, data_code=cmadaas_data_code,
+                                                        elements="Station_Id_C,Station_Id_d,lat,lon,Datetime," + cmadaas_var_name)
+    if data is None:
+        raise Exception('Can not get data from cmadaas! cmadaas_data_code={}, cmadaas_var_name={}, time_range={}'.format(
+            cmadaas_data_code, cmadaas_var_name, timerange))
+
+    data['Datetime'] = pd.to_datetime(data['Datetime']) + datetime.timedelta(hours=8)  # cmadaas数据都是世界时，需要转换为北京时
+    data = data[data['Datetime'].isin(pd.to_datetime(obs_times))]
+
+    return _obs_select(data, id_selected=id_selected, extent=extent, x_percent=x_percent, y_percent=y_percent)
+
+
+def _time_range_batches(obs_times, max_times):
+    # 升序时间按照等间隔连续段切分，每段不超过max_times个时次，每段可以用一次时间段检索读取
+    batches = []
+    for obs_time in obs_times:
+        if batches:
+            batch = batches[-1]
+            step_ok = len(batch) < 2 or obs_time - batch[-1] == batch[1] - batch[0]
+            if len(batch) < max_times and step_ok:
+                batch.append(obs_time)
+                continue
+        batches.append([obs_time])
+    return batches
+
+
+def _obs_to_stastda(data, data_name, var_name, cmadaas_var_name, cmadass_units):
     # 层次初始化，这边先假定全是地面层次，初始化为0
     levels = np.full((len(data)), 0)
 
@@ -364,6 +462,34 @@ def get_obs_stations(obs_time=None, data_name=None, var_name=None, id_selected=N
         np_input_units=cmadass_units, var_name=var_name, other_input={},
         data_source='cmadaas', data_name=data_name
     )
+
+
+def get_obs_stations(obs_time=None, data_name=None, var_name=None, id_selected=None,
+                     extent=None, x_percent=0, y_percent=0):
+    '''
+
+    [获取单层单时次观测站点数据]
+
+    Keyword Arguments:
+        obs_time {[datetime]} -- [观测时间]
+        data_name {[str]} -- [观测类型]
+        var_name {[str]} -- [要素名]
+        id_selected {[list or item]} -- [站号，站号列表或单站] (default: {None})
+        extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
+        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+
+    Returns:
+        [stda] -- [stda格式数据]
+    '''
+    # 从配置中获取相关信息
+    cmadaas_data_code, cmadaas_var_name, cmadass_units = _get_obs_cfg(data_name=data_name, var_name=var_name)
+
+    # 读取数据
+    data = _get_obs_data(obs_time=obs_time, cmadaas_data_code=cmadaas_data_code, cmadaas_var_name=cmadaas_var_name,
+                         id_selected=id_selected, extent=extent, x_percent=x_percent, y_percent=y_percent)
+
+    return _obs_to_stastda(data, data_name, var_name, cmadaas_var_name, cmadass_units)
 if __name__=='__main__':
     import datetime
     obs_time=datetime.datetime(2022,11,5,8)
@@ -372,10 +498,12 @@ if __name__=='__main__':
     print(rain)
 
 def get_obs_stations_multitime(obs_times=None, data_name=None, var_name=None, id_selected=None,
-                               extent=None, x_percent=0, y_percent=0, ):
+                               extent=None, x_percent=0, y_percent=0, max_workers=8, use_time_range=True,
+                               time_range_max_times=24, timeout=None, retries=0):
     '''
 
-    [获取单层多时次观测站点数据]
+    [获取单层多时次观测站点数据，数据代码支持时按等间隔连续时间段检索，否则逐时次检索，各检索并发执行，
+    所有时次的站点按列拼接后一次性转换成stda]
 
     Keyword Arguments:
         obs_times {[list]} -- [观测时间列表]
@@ -385,28 +513,47 @@ def get_obs_stations_multitime(obs_times=None, data_name=None, var_name=None, id
         extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
         x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
         y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        max_workers {int} -- [并发检索的最大线程数，同时受MAX_CONNECTIONS_PER_HOST限制] (default: {8})
+        use_time_range {bool} -- [数据代码支持时是否使用时间段检索，时间段检索失败的时次会改为逐时次检索] (default: {True})
+        time_range_max_times {int} -- [一次时间段检索最多包含的时次数] (default: {24})
+        timeout {[number]} -- [单次检索超时时间（秒），None代表不超时] (default: {None})
+        retries {int} -- [单次检索失败后的重试次数] (default: {0})
 
     Returns:
-        [stda] -- [stda格式数据]
+        [stda] -- [stda格式数据，所有时次都读取失败返回None]
     '''
-    obs_times = utl.parm_tolist(obs_times)
+    obs_times = sorted(set(utl.parm_tolist(obs_times)))
+
+    # 配置只解析一次
+    cmadaas_data_code, cmadaas_var_name, cmadass_units = _get_obs_cfg(data_name=data_name, var_name=var_name)
+    select_kwargs = dict(cmadaas_data_code=cmadaas_data_code, cmadaas_var_name=cmadaas_var_name,
+                         id_selected=id_selected, extent=extent, x_percent=x_percent, y_percent=y_percent)
 
     datas = []
-    attrs = {}
-    for obs_time in obs_times:
-        try:
-            data = get_obs_stations(obs_time, data_name, var_name=var_name,
-                                    id_selected=id_selected, extent=extent, x_percent=x_percent, y_percent=y_percent)
-            if data is not None and len(data) > 0:
-                attrs = data.attrs
+    single_times = obs_times
+    if use_time_range and str(cmadaas_data_code).startswith(_TIME_RANGE_DATA_CODES):
+        batches = [batch for batch in _time_range_batches(obs_times, max(1, time_range_max_times)) if len(batch) > 1]
+        tasks = [dict(obs_times=batch, **select_kwargs) for batch in batches]
+        results = fetch_engine.fetch_concurrent(_get_obs_data_by_time_range, tasks, max_workers=max_workers,
+                                                timeout=timeout, retries=retries)
+        done = set()
+        for batch, data in zip(batches, results):
+            if data is not None:
                 datas.append(data)
-        except Exception as e:
-            _log.info(str(e))
+                done.update(batch)
+        single_times = [obs_time for obs_time in obs_times if obs_time not in done]
 
-    if datas:
-        df = pd.concat(datas, ignore_index=True)
-        df.attrs = attrs
-        return df
+    tasks = [dict(obs_time=obs_time, **select_kwargs) for obs_time in single_times]
+    datas += fetch_engine.fetch_concurrent(_get_obs_data, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
 
-    return None
+    datas = [data for data in datas if data is not None and len(data) > 0]
+    if not datas:
+        return None
+
+    # 所有时次按列拼接，列顺序与单时次一致(第一列为站号)
+    columns = list(datas[0].columns)
+    data = pd.DataFrame(utl.obs_concat_columns(datas, columns), columns=columns, copy=False)
+    data = data.sort_values('Datetime', kind='stable', ignore_index=True)
+
+    return _obs_to_stastda(data, data_name, var_name, cmadaas_var_name, cmadass_units)
 
@@ -10,6 +10,8 @@ import pandas as pd
 
 from metdig.io.lib import config as CONFIG
 from metdig.io.lib import utility as utl
+from metdig.io.lib import memory_cache
+from metdig.io.lib import stda_store
 
 import metdig.utl as mdgstda
 
@@ -18,7 +20,7 @@ import logging
 _log = logging.getLogger(__name__)
 
 
-def split_stda_to_cache_sfc(stda, var_name, data_name='custom', var_units='', is_overwrite=True, **attrs_kwargs):
+def split_stda_to_cache_sfc(stda, var_name, data_name='custom', var_units='', is_overwrite=True, use_store=False, **attrs_kwargs):
     '''
 
     [拆分自定义地面stda至metdig缓存目录]
@@ -29,11 +31,16 @@ def split_stda_to_cache_sfc(stda, var_name, data_name='custom', var_units='', is
         data_name {[str]} -- [模式名]
         var_units {[str]} -- [数据对应的单位。默认不给定单位即传进来的stda数据为标准格式，自动赋予stda标准单位属性。如给定单位则进行单位转换]
         is_overwrite {[bool]} -- [是否重写，默认重写覆盖]
+        use_store {[bool]} -- [是否写入合并缓存（一个要素一个文件），默认逐场写入单独的文件]
     '''
     if stda.level.size > 1:
         raise Exception('stda error: the length of the level dimension must be 1!')
 
     stda.name = var_name
+    if use_store:
+        _split_stda_to_store(stda, var_name, data_name, var_units, is_overwrite, **attrs_kwargs)
+        return
+
     for time in stda.time.values:
         for dtime in stda.dtime.values:
             cachefile = os.path.join(CONFIG.get_cache_dir(),
@@ -62,7 +69,7 @@ def split_stda_to_cache_sfc(stda, var_name, data_name='custom', var_units='', is
             data.to_netcdf(cachefile)
 
 
-def split_stda_to_cache_psl(stda, var_name, data_name='custom', var_units='', is_overwrite=True, **attrs_kwargs):
+def split_stda_to_cache_psl(stda, var_name, data_name='custom', var_units='', is_overwrite=True, use_store=False, **attrs_kwargs):
     '''
 
     [拆分自定义高空stda至metdig缓存目录]
@@ -73,8 +80,13 @@ def split_stda_to_cache_psl(stda, var_name, data_name='custom', var_units='', is
         data_name {[str]} -- [模式名]
         var_units {[str]} -- [数据对应的单位。默认不给定单位即传进来的stda数据为标准格式，自动赋予stda标准单位属性。如给定单位则进行单位转换]
         is_overwrite {[bool]} -- [是否重写，默认重写覆盖]
+        use_store {[bool]} -- [是否写入合并缓存（一个要素一个文件），默认逐场写入单独的文件]
     '''
     stda.name = var_name
+    if use_store:
+        _split_stda_to_store(stda, var_name, data_name, var_units, is_overwrite, **attrs_kwargs)
+        return
+
     for level in stda.level.values:
 
         for time in stda.time.values:
@@ -105,6 +117,23 @@ def split_stda_to_cache_psl(stda, var_name, data_name='custom', var_units='', is
                 data.to_netcdf(cachefile)
 
 
+def _split_stda_to_store(stda, var_name, data_name, var_units, is_overwrite, **attrs_kwargs):
+    # 写入合并缓存，每个场为一个chunk
+    data = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon').copy()
+
+    # 单位及属性
+    stda_attrs = mdgstda.get_stda_attrs(var_name=var_name, **attrs_kwargs)
+    if var_units:
+        data.values, data_units = mdgstda.numpy_units_to_stda(data.values, var_units, stda_attrs['var_units']) # 单位转换
+        stda_attrs['var_units'] = data_units
+    data.attrs = stda_attrs
+
+    store = stda_store.StdaStore(stda_store.get_custom_store_file(data_name, var_name))
+    _log.info(f'save to {store.path}')
+    store.append(data, is_overwrite=is_overwrite)
+
+
+@memory_cache.cached('custom')
 def get_model_grid(init_time=None, fhour=None, data_name='custom', var_name=None, level=None,
                    extent=None, x_percent=0, y_percent=0):
     '''
@@ -132,6 +161,12 @@ def get_model_grid(init_time=None, fhour=None, data_name='custom', var_name=None
                                  f'CUSTOM_DATA/{data_name}/{var_name}/{init_time:%Y%m%d%H%M%S}.{fhour:03d}.nc')
 
     if not os.path.exists(cachefile):
+        # 逐场文件不存在时从合并缓存中读取
+        store = stda_store.StdaStore(stda_store.get_custom_store_file(data_name, var_name))
+        store_levels = [level] if level else None  # 地面层合并缓存中仅有一个层次
+        if store.exists() and store.contains(levels=store_levels, times=[init_time], dtimes=[fhour]):
+            return store.read(levels=store_levels, times=[init_time], dtimes=[fhour],
+                              extent=extent, x_percent=x_percent, y_percent=y_percent)
         raise Exception(f'Can not get data from {cachefile}')
 
     data = xr.load_dataarray(cachefile)
@@ -233,6 +268,15 @@ def get_model_3D_grids(init_time=None, fhours=None, data_name='custom', var_name
     fhours = utl.parm_tolist(fhours)
     levels = utl.parm_tolist(levels)
 
+    # 合并缓存包含所有请求的场时按数据块一次读取，否则逐场读取(逐场文件不存在的场仍从合并缓存中读取)
+    store = stda_store.StdaStore(stda_store.get_custom_store_file(data_name, var_name))
+    store_levels = levels if all(levels) else None  # 地面层合并缓存中仅有一个层次
+    if store.exists() and store.contains(levels=store_levels, times=[init_time], dtimes=fhours):
+        data = store.read(levels=store_levels, times=[init_time], dtimes=fhours,
+                          extent=extent, x_percent=x_percent, y_percent=y_percent)
+        if data is not None and data.size > 0:
+            return data
+
     stda_data = []
     for fhour in fhours:
         temp_data = []
@@ -16,6 +16,9 @@ import metdig.utl as mdgstda
 from metdig.io.lib import utility as utl
 from metdig.io.lib import era5_cfg
 from metdig.io.lib import config as CONFIG
+from metdig.io.lib import memory_cache
+from metdig.io.lib import stda_store
+from metdig.io.lib import era5_cache_index
 
 from metdig.io import era5_manual_download
 
@@ -131,14 +134,9 @@ def era5anycache(var_name, levels, era5_utctime, extent):
     """   
     _levels = utl.parm_tolist(levels)
 
-    for level in _levels:
-        if level is None:
-            cache_file = CONFIG.get_era5cache_file(era5_utctime, var_name, extent, level=None, find_area=True)
-        else:
-            cache_file = CONFIG.get_era5cache_file(era5_utctime, var_name, extent, level=level, find_area=True)
-        if not os.path.exists(cache_file):
-            return False
-    return True
+    era5_dir = os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA')
+    cached = era5_cache_index.cached_times(era5_dir, var_name, extent, _levels, utc_start=era5_utctime, utc_end=era5_utctime)
+    return len(cached) > 0
 
 def era5_needdownedymdh_bytimes(era5_bjtimes, var_name, levels=None, extent=None, isjudgecache=True):
     """获取某个要素，需要下载的年月日时列表（会根据本地缓存目录中已经存在的数据进行判断）
@@ -156,11 +154,19 @@ def era5_needdownedymdh_bytimes(era5_bjtimes, var_name, levels=None, extent=None
     months = []
     days = []
     hours = []
+
+    if isjudgecache == True and len(era5_bjtimes) > 0:
+        # 从缓存索引中一次查询时间段内已有缓存的时次
+        era5_dir = os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA')
+        cached = era5_cache_index.cached_times(era5_dir, var_name, extent, utl.parm_tolist(levels),
+                                               utc_start=min(era5_bjtimes) - datetime.timedelta(hours=8),
+                                               utc_end=max(era5_bjtimes) - datetime.timedelta(hours=8))
+
     for era5_bjtime in era5_bjtimes:
         era5_utctime = era5_bjtime - datetime.timedelta(hours=8)  # 世界时
 
         if isjudgecache == True:
-            if era5anycache(var_name, levels, era5_utctime, extent) == False:
+            if datetime.datetime(era5_utctime.year, era5_utctime.month, era5_utctime.day, era5_utctime.hour, era5_utctime.minute) not in cached:
                 years.append(era5_utctime.year)
                 months.append(era5_utctime.month)
                 days.append(era5_utctime.day)
@@ -180,13 +186,10 @@ def era5_needdownedymdh_bytimes(era5_bjtimes, var_name, levels=None, extent=None
     return years, months, days, hours
 
 
-def _era5download(era5_bjtimes, var_name, levels, extent, x_percent, y_percent):
+def _download_extent(extent, x_percent=0, y_percent=0):
     '''
-    调用手动下载部分批量下载单个要素，自动拆分到缓存目录下，参数为北京时
+    数据下载及缓存的区域：预先扩大xy percent后按整数经纬度外扩
     '''
-    _era5_bjtimes = utl.parm_tolist(era5_bjtimes)
-    _levels = utl.parm_tolist(levels)
-
     if extent:
         # 数据预先扩大xy percent
         delt_x = (extent[1] - extent[0]) * x_percent
@@ -201,8 +204,18 @@ def _era5download(era5_bjtimes, var_name, levels, extent, x_percent, y_percent):
         )
     else:
         extent = [50, 160, 0, 70]  # 数据下载默认范围
+    return extent
 
 
+def _era5download(era5_bjtimes, var_name, levels, extent, x_percent, y_percent):
+    '''
+    调用手动下载部分批量下载单个要素，自动拆分到缓存目录下，参数为北京时
+    '''
+    _era5_bjtimes = utl.parm_tolist(era5_bjtimes)
+    _levels = utl.parm_tolist(levels)
+
+    extent = _download_extent(extent, x_percent, y_percent)
+
     # 获取本次需要下载的年月日参数
     # 根据实际本地已有的数据再下载
     years, months, days, hours = era5_needdownedymdh_bytimes(_era5_bjtimes, var_name, _levels, extent) # 返回的年月日时为世界时
@@ -220,6 +233,7 @@ def _era5download(era5_bjtimes, var_name, levels, extent, x_percent, y_percent):
                                                [var_name], extent=extent, download_dir=None, is_overwrite=True,
                                                years=years, months=months, days=days, hour=hours)
 
+@memory_cache.cached('cds', cropable=False)  # 下载范围按整数经纬度外扩，不能从更大范围中裁剪
 def get_model_grid(init_time=None, var_name=None, level=None, extent=None, x_percent=0, y_percent=0, force_local=False, **kwargs):
     '''
 
@@ -238,20 +252,7 @@ def get_model_grid(init_time=None, var_name=None, level=None, extent=None, x_per
     '''
 
     init_time_utc = init_time - datetime.timedelta(hours=8)  # 世界时
-    if extent:
-        # 数据预先扩大xy percent
-        delt_x = (extent[1] - extent[0]) * x_percent
-        delt_y = (extent[3] - extent[2]) * y_percent
-        extent = (extent[0] - delt_x, extent[1] + delt_x, extent[2] - delt_y, extent[3] + delt_y)
-        extent = (math.floor(extent[0]), math.ceil(extent[1]), math.floor(extent[2]), math.ceil(extent[3]))
-        extent = (
-            extent[0] if extent[0] >= -180 else -180,
-            extent[1] if extent[1] <= 180 else 180,
-            extent[2] if extent[2] >= -90 else -90,
-            extent[3] if extent[3] <= 90 else 90,
-        )
-    else:
-        extent = [50, 160, 0, 70]  # 数据下载默认范围
+    extent = _download_extent(extent, x_percent, y_percent)
 
     # 从配置中获取相关信息
     try:
@@ -283,7 +284,12 @@ def get_model_grid(init_time=None, var_name=None, level=None, extent=None, x_per
     '''
 
     # 此处读到的dataset应该只有一个数据集，维度=[time=1,latitude,longitude]，因为下载的时候均是单层次下载
-    data = xr.open_dataset(cache_file)
+    try:
+        data = xr.open_dataset(cache_file)
+    except Exception as e:
+        # 缓存文件已被删除或损坏，从索引中删除，下次读取时重新下载
+        era5_cache_index.remove_file(os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA'), cache_file)
+        raise Exception('{} open failed: {}'.format(cache_file, str(e)))
     for var in list(data.data_vars):
         if 'latitude' in data[var].dims and 'longitude' in data[var].dims:
             data = data[var]
@@ -391,6 +397,31 @@ def get_model_3D_grid(init_time=None, var_name=None, levels=None, extent=None, x
     return None
 
 
+def _read_store(init_times, var_name, levels, extent, x_percent, y_percent):
+    '''
+    从era5合并缓存中读取，合并缓存中不包含全部请求的时次和层次时返回None
+    '''
+    extent = _download_extent(extent, x_percent, y_percent)
+    store_file = stda_store.find_era5_store_file(var_name, extent)
+    if store_file is None:
+        return None
+
+    try:
+        store_levels = []
+        for level in levels:
+            level_type = 'high' if level else 'surface'
+            store_levels.append(era5_cfg().era5_level(var_name=var_name, level_type=level_type, level=level))
+    except Exception as e:
+        _log.info(str(e))
+        return None
+
+    store = stda_store.StdaStore(store_file)
+    if not store.contains(levels=store_levels, times=init_times, dtimes=[0]):
+        return None
+    # 此处不传xpercent，extent已经扩大范围
+    return store.read(levels=store_levels, times=init_times, dtimes=[0], extent=extent)
+
+
 def get_model_3D_grids(init_times=None, var_name=None, levels=None, extent=None, x_percent=0, y_percent=0, force_local=False, **kwargs):
     '''
 
@@ -407,6 +438,11 @@ def get_model_3D_grids(init_times=None, var_name=None, levels=None, extent=None,
     Returns:
         [stda] -- [stda格式数据]
     '''
+    # 合并缓存中已有全部数据时按数据块一次读取
+    store_data = _read_store(utl.parm_tolist(init_times), var_name, utl.parm_tolist(levels), extent, x_percent, y_percent)
+    if store_data is not None:
+        return store_data
+
     if force_local == False:
         _era5download(init_times, var_name, levels, extent, x_percent, y_percent) # 调用手动下载模块批量下载
 
@@ -4,6 +4,9 @@ import datetime
 import os
 import sys
 import math
+import json
+import queue
+import threading
 from concurrent import futures
 
 import cdsapi
@@ -19,6 +22,7 @@ import metdig.utl as mdgstda
 
 from metdig.io.lib import config as CONFIG
 from metdig.io.lib import era5_cfg
+from metdig.io.lib import era5_cache_index
 
 import logging
 # logging.basicConfig(format='', level=logging.INFO)  # 此处加这一句代表忽略下属_log作用，直接将_log输出到命令行，测试用
@@ -35,12 +39,14 @@ def _era5_download_hourly_pressure_levels(
         pressure_level=[200, 500, 700, 850, 925],
         variable='geopotential',
         extent=[50, 160, 0, 70],
-        is_overwrite=True):
+        is_overwrite=True,
+        client_factory=None):
     '''
     下载基本方法，一次下载要素多个时次多个层次到一个文件中
     参数时间均是世界时
     variable为era5下载要素名
     is_overwrite==True时会重复下载，覆盖已经存在的数据
+    client_factory为返回cds客户端的函数，默认为cdsapi.Client，可替换为本地模拟客户端
     '''
     # https://cds.climate.copernicus.eu/cdsapp#!/dataset/reanalysis-era5-pressure-levels?tab=form
     if os.path.exists(savefile) and is_overwrite == False:#未考虑hour 和 level 需要改进
@@ -57,7 +63,7 @@ def _era5_download_hourly_pressure_levels(
     else:
         data_code='reanalysis-era5-pressure-levels-preliminary-back-extension'
 
-    c = cdsapi.Client(quiet=True)
+    c = client_factory() if client_factory else cdsapi.Client(quiet=True)
 
     c.retrieve(
         # 'reanalysis-era5-pressure-levels',
@@ -74,7 +80,8 @@ def _era5_download_hourly_pressure_levels(
             'time': list(map(lambda x: '{:02d}:00'.format(x), hour)),
             'area': [extent[3], extent[0], extent[2], extent[1]],
         },
-        savefile)
+        savefile + '.part')
+    os.replace(savefile + '.part', savefile)  # 下载完成后再改名，避免中断后留下不完整的文件
 
 
 def _era5_download_hourly_single_levels(
@@ -85,10 +92,12 @@ def _era5_download_hourly_single_levels(
         hour=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23],
         variable='10m_u_component_of_wind',
         extent=[50, 160, 0, 70],
-        is_overwrite=True):
+        is_overwrite=True,
+        client_factory=None):
     '''
     下载基本方法，一次下载要素多个时次到一个文件中，参数时间均是世界时
     is_overwrite==True时会重复下载，覆盖已经存在的数据
+    client_factory为返回cds客户端的函数，默认为cdsapi.Client，可替换为本地模拟客户端
     '''
     # https://cds.climate.copernicus.eu/cdsapp#!/dataset/reanalysis-era5-single-levels?tab=overview
     if os.path.exists(savefile) and is_overwrite == False:
@@ -100,7 +109,7 @@ def _era5_download_hourly_single_levels(
     if not os.path.exists(os.path.dirname(savefile)):
         os.makedirs(os.path.dirname(savefile))
 
-    c = cdsapi.Client(quiet=True)
+    c = client_factory() if client_factory else cdsapi.Client(quiet=True)
 
     if(year[0] > 1978):
         data_code='reanalysis-era5-single-levels'
@@ -119,7 +128,8 @@ def _era5_download_hourly_single_levels(
             'time': list(map(lambda x: '{:02d}:00'.format(x), hour)),
             'area': [extent[3], extent[0], extent[2], extent[1]],
         },
-        savefile)
+        savefile + '.part')
+    os.replace(savefile + '.part', savefile)  # 下载完成后再改名，避免中断后留下不完整的文件
 
 
 def _get_ymd(dt_start, dt_end):
@@ -157,8 +167,9 @@ def _check_cache(var_name, era5_utctime, extent, levels=None):
     return True
 
 
-def _split_psl(savefile, var_name, extent, pressure_level):
-    # 拆分下载的psl数据到cache目录下
+def _split_psl(savefile, var_name, extent, pressure_level, update_index=True):
+    # 拆分下载的psl数据到cache目录下，返回拆分后的缓存文件记录(utc_time, var_name, level, extent, cachefile)
+    index_records = []
     if os.path.exists(savefile):
         data = xr.open_dataset(savefile)
         for var in list(data.data_vars):
@@ -200,14 +211,22 @@ def _split_psl(savefile, var_name, extent, pressure_level):
                     _log.info('{} 拆分...'.format(cachefile))
                     if not os.path.exists(os.path.dirname(cachefile)):
                         os.makedirs(os.path.dirname(cachefile))
+                    # 先写临时文件再改名，避免中断后留下不完整的缓存文件
                     if _lvltg:
-                        data.sel(time=dt_utc, level=lv).to_netcdf(cachefile)
+                        data.sel(time=dt_utc, level=lv).to_netcdf(cachefile + '.tmp')
                     else:
-                        data.sel(time=dt_utc).to_netcdf(cachefile)
-
-
-def _split_sfc(savefile, var_name, extent):
-    # 拆分下载的sfc数据到cache目录下
+                        data.sel(time=dt_utc).to_netcdf(cachefile + '.tmp')
+                    os.replace(cachefile + '.tmp', cachefile)
+                index_records.append((dt_utc, var_name, lv, extent, cachefile))
+        # 更新缓存索引
+        if update_index:
+            era5_cache_index.add_files(os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA'), index_records)
+    return index_records
+
+
+def _split_sfc(savefile, var_name, extent, update_index=True):
+    # 拆分下载的sfc数据到cache目录下，返回拆分后的缓存文件记录(utc_time, var_name, level, extent, cachefile)
+    index_records = []
     if os.path.exists(savefile):
         data = xr.open_dataset(savefile)
         for var in list(data.data_vars):
@@ -238,7 +257,13 @@ def _split_sfc(savefile, var_name, extent):
                 _log.info('{} 拆分...'.format(cachefile))
                 if not os.path.exists(os.path.dirname(cachefile)):
                     os.makedirs(os.path.dirname(cachefile))
-                data.sel(time=dt_utc).to_netcdf(cachefile)
+                data.sel(time=dt_utc).to_netcdf(cachefile + '.tmp')
+                os.replace(cachefile + '.tmp', cachefile)
+            index_records.append((dt_utc, var_name, None, extent, cachefile))
+        # 更新缓存索引
+        if update_index:
+            era5_cache_index.add_files(os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA'), index_records)
+    return index_records
 
 
 def _era5_psl_download(dt_start=None, dt_end=None, var_names=['hgt', 'u', 'v', 'vvel', 'rh', 'tmp', 'pv', 'div','spfh'],
@@ -303,11 +328,163 @@ def _era5_sfc_download(dt_start=None, dt_end=None, var_names=['u10m','u100m', 'v
         # 将下载后的数据拆分到cache目录下
         _split_sfc(savefile, var_name, extent)
         
+class _Manifest(object):
+    '''
+    流水线下载的断点记录，json文件，键为任务名，值为任务状态：downloaded(已下载) / split(已拆分) / done(已写入缓存索引) / failed
+    '''
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+        self._status = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r') as f:
+                    self._status = json.load(f)
+            except Exception as e:
+                _log.info('{} 读取失败，重新下载: {}'.format(manifest_file, str(e)))
+
+    def get(self, key):
+        with self._lock:
+            return self._status.get(key, None)
+
+    def set(self, key, status):
+        with self._lock:
+            self._status[key] = status
+            if not os.path.exists(os.path.dirname(self.manifest_file)):
+                os.makedirs(os.path.dirname(self.manifest_file))
+            with open(self.manifest_file + '.tmp', 'w') as f:
+                json.dump(self._status, f, indent=1)
+            os.replace(self.manifest_file + '.tmp', self.manifest_file)
+
+
+def _pipeline_jobs(level_type, dt_start, dt_end, var_names, pressure_level, hour, extent, savedir):
+    # 按要素按月拆分下载任务，参数时间均是世界时
+    jobs = []
+    for var_name in var_names:
+        dt = datetime.datetime(dt_start.year, dt_start.month, 1)
+        while dt <= dt_end:
+            next_month = datetime.datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1)
+            month_start = max(dt, datetime.datetime(dt_start.year, dt_start.month, dt_start.day))
+            month_end = min(next_month - datetime.timedelta(days=1), dt_end)
+            years, months, days = _get_ymd(month_start, month_end)
+            savefile = os.path.join(savedir, '{}_{:%Y%m%d}_{:%Y%m%d}_{}_{}_{}_{}.nc'.format(
+                var_name, month_start, month_end, extent[0], extent[1], extent[2], extent[3]))
+            key = '{}|{}|{:%Y%m%d}_{:%Y%m%d}|{}|{}|{}'.format(
+                level_type, var_name, month_start, month_end,
+                ','.join(map(str, hour)), ','.join(map(str, pressure_level)) if level_type == 'high' else '',
+                '_'.join(map(str, extent)))
+            jobs.append(dict(key=key, var_name=var_name, savefile=savefile, years=years, months=months, days=days))
+            dt = next_month
+    return jobs
+
+
+def _era5_pipeline_download(level_type, dt_start, dt_end, var_names, pressure_level=None, hour=np.arange(0, 24, 1).tolist(),
+                            extent=[50, 160, 0, 70], download_dir=None, max_pool=2, split_workers=1, queue_size=4,
+                            manifest_file=None, is_overwrite=True, client_factory=None):
+    '''
+    流水线下载：下载、拆分、写入缓存索引三个阶段并发执行，阶段之间为有界队列，任务状态记录在manifest文件中，中断后重新运行时跳过已完成的任务
+    参数时间是世界时，按要素按月拆分成多个下载任务
+    is_overwrite仅对manifest中没有记录的任务生效，已下载的任务直接拆分
+    返回各状态的任务数
+    '''
+    savedir = download_dir if download_dir else os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA/manual_download')
+    manifest = _Manifest(manifest_file if manifest_file else os.path.join(savedir, 'era5_manifest.json'))
+    era5_dir = os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA')
+    jobs = _pipeline_jobs(level_type, dt_start, dt_end, var_names, pressure_level, hour, extent, savedir)
+
+    download_queue = queue.Queue()
+    split_queue = queue.Queue(maxsize=queue_size)
+    index_queue = queue.Queue(maxsize=queue_size)
+    for job in jobs:
+        status = manifest.get(job['key'])
+        if status == 'done':
+            continue
+        # 已下载未完成的任务不再重复下载
+        skip_download = status in ('downloaded', 'split') and os.path.exists(job['savefile'])
+        download_queue.put(dict(job, skip_download=skip_download))
+
+    def _download_worker():
+        while True:
+            try:
+                job = download_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if not job['skip_download']:
+                    if level_type == 'high':
+                        era5_var = era5_cfg().era5_variable(var_name=job['var_name'], level_type='high')
+                        _era5_download_hourly_pressure_levels(savefile=job['savefile'], year=job['years'], month=job['months'], day=job['days'],
+                                                              hour=hour, pressure_level=pressure_level, variable=era5_var, extent=extent,
+                                                              is_overwrite=is_overwrite, client_factory=client_factory)
+                    else:
+                        era5_var = era5_cfg().era5_variable(var_name=job['var_name'], level_type='surface')
+                        _era5_download_hourly_single_levels(savefile=job['savefile'], year=job['years'], month=job['months'], day=job['days'],
+                                                            hour=hour, variable=era5_var, extent=extent,
+                                                            is_overwrite=is_overwrite, client_factory=client_factory)
+                    manifest.set(job['key'], 'downloaded')
+            except Exception as e:
+                _log.info('{} 下载失败: {}'.format(job['savefile'], str(e)))
+                manifest.set(job['key'], 'failed')
+                continue
+            split_queue.put(job)  # 队列满时等待，限制已下载未拆分的文件数
+
+    def _split_worker():
+        while True:
+            job = split_queue.get()
+            if job is None:
+                return
+            try:
+                if level_type == 'high':
+                    records = _split_psl(job['savefile'], job['var_name'], extent, pressure_level, update_index=False)
+                else:
+                    records = _split_sfc(job['savefile'], job['var_name'], extent, update_index=False)
+                manifest.set(job['key'], 'split')
+            except Exception as e:
+                _log.info('{} 拆分失败: {}'.format(job['savefile'], str(e)))
+                manifest.set(job['key'], 'failed')
+                continue
+            index_queue.put((job, records))
+
+    def _index_worker():
+        while True:
+            item = index_queue.get()
+            if item is None:
+                return
+            job, records = item
+            try:
+                era5_cache_index.add_files(era5_dir, records)
+                manifest.set(job['key'], 'done')
+            except Exception as e:
+                _log.info('{} 写入缓存索引失败: {}'.format(job['savefile'], str(e)))
+                manifest.set(job['key'], 'failed')
+
+    with futures.ThreadPoolExecutor(max_workers=max_pool + split_workers + 1) as executor:
+        indexer = executor.submit(_index_worker)
+        splitters = [executor.submit(_split_worker) for _ in range(split_workers)]
+        downloaders = [executor.submit(_download_worker) for _ in range(max_pool)]
+
+        futures.wait(downloaders, return_when=futures.ALL_COMPLETED)
+        for _ in splitters:
+            split_queue.put(None)
+        futures.wait(splitters, return_when=futures.ALL_COMPLETED)
+        index_queue.put(None)
+        futures.wait([indexer], return_when=futures.ALL_COMPLETED)
+
+    result = {}
+    for job in jobs:
+        status = manifest.get(job['key'])
+        result[status] = result.get(status, 0) + 1
+    _log.info('era5 pipeline download: {}'.format(result))
+    return result
+
+
 def era5_psl_download_usepool(dt_start=None, dt_end=None, var_names=['hgt', 'u', 'v', 'vvel', 'rh', 'tmp', 'pv', 'div','spfh','vort'],
                               pressure_level=[200,225,250,300,350,400,450,500,550,600,650,700,
                               750,775,800,825,850,875,900,925,950,975,1000],
                               hour=np.arange(0,24,1).tolist(),
-                              extent=[50, 160, 0, 70], download_dir=None, max_pool=2, is_overwrite=True):
+                              extent=[50, 160, 0, 70], download_dir=None, max_pool=2, is_overwrite=True,
+                              pipeline=False, split_workers=1, queue_size=4, manifest_file=None, client_factory=None):
     """采用多线程下载era5数据（注意：参数均为北京时，下载时按照世界时下载，然后按照世界时自动拆分到cache目录下）
 
     Args:
@@ -320,9 +497,22 @@ def era5_psl_download_usepool(dt_start=None, dt_end=None, var_names=['hgt', 'u',
         download_dir (str, optional): 下载目录. Defaults to None.
         max_pool (int, optional): 最大线程数. Defaults to 2.
         is_overwrite (bool, optional): 是否重复下载，默认重复下载（该参数仅用于检查下载的数据，不检查拆分后的数据）. Defaults to True.
+        pipeline (bool, optional): 是否采用流水线下载（按要素按月拆分任务，下载/拆分/写入缓存索引并发执行，中断后可断点续传）. Defaults to False.
+        split_workers (int, optional): 流水线下载时拆分线程数. Defaults to 1.
+        queue_size (int, optional): 流水线下载时阶段之间队列的最大长度. Defaults to 4.
+        manifest_file (str, optional): 流水线下载时断点记录文件，默认为下载目录下的era5_manifest.json. Defaults to None.
+        client_factory (function, optional): 返回cds客户端的函数，默认为cdsapi.Client. Defaults to None.
+
+    Returns:
+        dict: 流水线下载时返回各状态的任务数
     """         
     _hour = sorted([(datetime.datetime(1980, 1, 1, h) - datetime.timedelta(hours=8)).hour for h in hour]) # 北京时转成世界时
 
+    if pipeline:
+        return _era5_pipeline_download('high', dt_start - datetime.timedelta(days=1), dt_end + datetime.timedelta(days=1), # 多下一天
+                                       var_names, pressure_level, _hour, extent, download_dir, max_pool, split_workers, queue_size,
+                                       manifest_file, is_overwrite, client_factory)
+
     with futures.ThreadPoolExecutor(max_workers=max_pool) as executor:
         tasks = []
         for var_name in var_names:
@@ -333,7 +523,8 @@ def era5_psl_download_usepool(dt_start=None, dt_end=None, var_names=['hgt', 'u',
 
 def era5_sfc_download_usepool(dt_start=None, dt_end=None, var_names=['u10m','u100m', 'v10m','v100m', 'psfc', 'tcwv', 'prmsl','t2m','td2m','rain01','cape','cin','k_idx'],
                               hour=np.arange(0,24,1).tolist(),
-                              extent=[50, 160, 0, 70], download_dir=None, max_pool=2, is_overwrite = True):
+                              extent=[50, 160, 0, 70], download_dir=None, max_pool=2, is_overwrite = True,
+                              pipeline=False, split_workers=1, queue_size=4, manifest_file=None, client_factory=None):
     """采用多线程下载era5数据（注意：参数均为北京时，下载时按照世界时下载，然后按照世界时自动拆分到cache目录下）
 
     Args:
@@ -345,9 +536,22 @@ def era5_sfc_download_usepool(dt_start=None, dt_end=None, var_names=['u10m','u10
         download_dir (str, optional): 下载目录. Defaults to None.
         max_pool (int, optional): 最大线程数. Defaults to 2.
         is_overwrite (bool, optional): 是否重复下载，默认重复下载（该参数仅用于检查下载的数据，不检查拆分后的数据）. Defaults to True.
+        pipeline (bool, optional): 是否采用流水线下载（按要素按月拆分任务，下载/拆分/写入缓存索引并发执行，中断后可断点续传）. Defaults to False.
+        split_workers (int, optional): 流水线下载时拆分线程数. Defaults to 1.
+        queue_size (int, optional): 流水线下载时阶段之间队列的最大长度. Defaults to 4.
+        manifest_file (str, optional): 流水线下载时断点记录文件，默认为下载目录下的era5_manifest.json. Defaults to None.
+        client_factory (function, optional): 返回cds客户端的函数，默认为cdsapi.Client. Defaults to None.
+
+    Returns:
+        dict: 流水线下载时返回各状态的任务数
     """    
     _hour = sorted([(datetime.datetime(1980, 1, 1, h) - datetime.timedelta(hours=8)).hour for h in hour]) # 北京时转成世界时
 
+    if pipeline:
+        return _era5_pipeline_download('surface', dt_start - datetime.timedelta(days=1), dt_end + datetime.timedelta(days=1), # 多下一天
+                                       var_names, None, _hour, extent, download_dir, max_pool, split_workers, queue_size,
+                                       manifest_file, is_overwrite, client_factory)
+
     with futures.ThreadPoolExecutor(max_workers=max_pool) as executor:
         tasks = []
         for var_name in var_names:
@@ -1,12 +1,28 @@
-from .package_config.cassandra_model_cfg import cassandra_model_cfg
-from .package_config.cassandra_obs_cfg import cassandra_obs_cfg
-from .package_config.cassandra_radar_cfg import cassandra_radar_cfg
-from .package_config.cassandra_sate_cfg import cassandra_sate_cfg
+import importlib
 
+# 配置类在第一次使用时才导入，如from metdig.io.lib import cassandra_model_cfg
+_cfg_classes = [
+    'cassandra_model_cfg',
+    'cassandra_obs_cfg',
+    'cassandra_radar_cfg',
+    'cassandra_sate_cfg',
 
-# from .package_config.cmadaas_datacode_cfg import cmadaas_datacode_cfg # 不对外使用
-from .package_config.cmadaas_model_cfg import cmadaas_model_cfg
-from .package_config.cmadaas_obs_cfg import cmadaas_obs_cfg
+    # 'cmadaas_datacode_cfg', # 不对外使用
+    'cmadaas_model_cfg',
+    'cmadaas_obs_cfg',
 
-from .package_config.era5_cfg import era5_cfg
-from .package_config.thredds_model_cfg import thredds_model_cfg
\ No newline at end of file
+    'era5_cfg',
+    'thredds_model_cfg',
+]
+
+
+def __getattr__(name):
+    if name in _cfg_classes:
+        cfg_class = getattr(importlib.import_module('.package_config.' + name, __name__), name)
+        globals()[name] = cfg_class
+        return cfg_class
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _cfg_classes)
@@ -12,8 +12,8 @@ import datetime
 import shutil
 import configparser
 from pathlib import Path
-import fnmatch
-import re
+
+from metdig.io.lib import era5_cache_index
 
 import logging
 _log = logging.getLogger(__name__)
@@ -98,26 +98,25 @@ def get_era5cache_file(init_time, var_name, extent, level=None, find_area=True):
         warn_msg = '当前ERA5_DATA缓存目录为：{}， 请用户自行注意磁盘使用空间，必要时请手动清理或更改缓存目录！'.format(cache_dir)
         _log.info(warn_msg)
 
+    era5_dir = cache_dir
+
     if level:
         cache_dir = cache_dir / '{:%Y%m%d%H%M}/hourly/{}/{}'.format(init_time, var_name, level)
     else:
         cache_dir = cache_dir / '{:%Y%m%d%H%M}/hourly/{}'.format(init_time, var_name)
 
-    # search match area file
     cache_file = cache_dir / '{:%Y%m%d%H%M}_{}_{}_{}_{}.nc'.format(init_time, extent[0], extent[1], extent[2], extent[3])
 
-    if find_area and os.path.exists(cache_dir):
-        filefmt = '{:%Y%m%d%H%M}_*.nc'.format(init_time)
-        fnames = fnmatch.filter(os.listdir(cache_dir), filefmt)
-        if fnames:
-            for name in fnames:
-                # such as name = '202007250800_28_180_-7_77.nc', file_extent = ['202007250800', '28', '180', '-7', '77']
-                file_extent = re.findall(r"\-?\d+\.?\d*", os.path.splitext(name)[0])
-                if len(file_extent) == 5:
-                    file_extent = float(file_extent[1]), float(file_extent[2]), float(file_extent[3]), float(file_extent[4])
-                    if file_extent[0] <= extent[0] and file_extent[1] >= extent[1] and file_extent[2] <= extent[2] and file_extent[3] >= extent[3]:
-                        cache_file = cache_dir / name
-                        break
+    # search match area file from cache index
+    if find_area:
+        while True:
+            index_file = era5_cache_index.find_file(era5_dir, init_time, var_name, extent, level=level)
+            if index_file is None:
+                break
+            if os.path.exists(index_file):
+                cache_file = Path(index_file)
+                break
+            era5_cache_index.remove_file(era5_dir, index_file)  # 缓存文件已被删除，继续查找其它覆盖区域的缓存文件
 
     return cache_file
 
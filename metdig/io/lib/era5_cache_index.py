@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+era5缓存索引：ERA5_DATA目录下拆分后的缓存文件记录在SQLite数据库(ERA5_DATA/cache_index.db)中，
+按照(世界时, 要素, 层次)查找覆盖请求区域的最小缓存文件，替代每次查找时的目录遍历和文件名匹配。
+
+索引由era5_manual_download._split_psl/_split_sfc维护，第一次使用时自动扫描一次已有缓存目录建立索引，
+手动拷贝或删除缓存文件后可以调用rebuild_index重建。
+
+'''
+
+import os
+import re
+import sqlite3
+import threading
+import datetime
+
+import logging
+_log = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_initialized = set()  # 已经建立过索引的数据库
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    utc_time INTEGER NOT NULL,
+    var_name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    e0 REAL NOT NULL,
+    e1 REAL NOT NULL,
+    e2 REAL NOT NULL,
+    e3 REAL NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (var_name, utc_time, level, e0, e1, e2, e3)
+)
+'''
+
+
+def _db_file(era5_dir):
+    return os.path.join(str(era5_dir), 'cache_index.db')
+
+
+def _time_key(utc_time):
+    # 世界时转为YYYYmmddHHMM整数，方便区间查询
+    return int('{:%Y%m%d%H%M}'.format(utc_time))
+
+
+def _level_key(level):
+    # 地面层统一为0
+    return int(level) if level else 0
+
+
+def _connect(era5_dir):
+    db_file = _db_file(era5_dir)
+    if not os.path.exists(str(era5_dir)):
+        os.makedirs(str(era5_dir))
+    is_new = not os.path.exists(db_file)
+    conn = sqlite3.connect(db_file, timeout=60)
+    if db_file not in _initialized:
+        conn.execute(_SCHEMA)
+        conn.commit()
+        _initialized.add(db_file)
+        if is_new:
+            _scan(era5_dir, conn)
+    return conn
+
+
+def _scan(era5_dir, conn):
+    # 扫描ERA5_DATA/{utc:%Y%m%d%H%M}/hourly/{var_name}[/{level}]/{utc:%Y%m%d%H%M}_{e0}_{e1}_{e2}_{e3}.nc
+    rows = []
+    for time_entry in os.scandir(str(era5_dir)):
+        hourly_dir = os.path.join(time_entry.path, 'hourly')
+        if not time_entry.is_dir() or not os.path.isdir(hourly_dir):
+            continue
+        for var_entry in os.scandir(hourly_dir):
+            if not var_entry.is_dir():
+                continue
+            for entry in os.scandir(var_entry.path):
+                if entry.is_dir():
+                    for sub in os.scandir(entry.path):
+                        row = _parse_cache_file(sub.path, var_entry.name, entry.name)
+                        if row:
+                            rows.append(row)
+                else:
+                    row = _parse_cache_file(entry.path, var_entry.name, None)
+                    if row:
+                        rows.append(row)
+    conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    _log.info('era5 cache index: {} files indexed'.format(len(rows)))
+
+
+def _parse_cache_file(path, var_name, level):
+    # such as name = '202007250800_28_180_-7_77.nc', file_extent = ['202007250800', '28', '180', '-7', '77']
+    name = os.path.basename(path)
+    if not name.endswith('.nc'):
+        return None
+    file_extent = re.findall(r"\-?\d+\.?\d*", os.path.splitext(name)[0])
+    if len(file_extent) != 5 or len(file_extent[0]) != 12:
+        return None
+    try:
+        level = _level_key(int(level) if level is not None else None)
+    except ValueError:
+        return None
+    return (int(file_extent[0]), var_name, level,
+            float(file_extent[1]), float(file_extent[2]), float(file_extent[3]), float(file_extent[4]), path)
+
+
+def add_files(era5_dir, records):
+    '''
+
+    [将缓存文件加入索引]
+
+    Arguments:
+        era5_dir {[str]} -- [ERA5_DATA缓存目录]
+        records {[list]} -- [(utc_time, var_name, level, extent, path)列表]
+    '''
+    rows = [(_time_key(utc_time), var_name, _level_key(level),
+             float(extent[0]), float(extent[1]), float(extent[2]), float(extent[3]), str(path))
+            for utc_time, var_name, level, extent, path in records]
+    if not rows:
+        return
+    with _lock:
+        conn = _connect(era5_dir)
+        try:
+            conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def remove_file(era5_dir, path):
+    '''[从索引中删除缓存文件，用于缓存文件已经不存在的情况]'''
+    with _lock:
+        conn = _connect(era5_dir)
+        try:
+            conn.execute('DELETE FROM files WHERE path = ?', (str(path),))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def find_file(era5_dir, utc_time, var_name, extent, level=None):
+    '''
+
+    [查找覆盖extent的面积最小的缓存文件，不存在返回None]
+
+    Arguments:
+        era5_dir {[str]} -- [ERA5_DATA缓存目录]
+        utc_time {[datetime]} -- [世界时]
+        var_name {[str]} -- [stda要素名]
+        extent {[tuple]} -- [数据区域]
+
+    Keyword Arguments:
+        level {[int]} -- [层次，不传代表地面层] (default: {None})
+
+    Returns:
+        [str] -- [缓存文件路径]
+    '''
+    with _lock:
+        conn = _connect(era5_dir)
+        try:
+            row = conn.execute(
+                'SELECT path FROM files WHERE var_name = ? AND utc_time = ? AND level = ? '
+                'AND e0 <= ? AND e1 >= ? AND e2 <= ? AND e3 >= ? '
+                'ORDER BY (e1 - e0) * (e3 - e2) LIMIT 1',
+                (var_name, _time_key(utc_time), _level_key(level), extent[0], extent[1], extent[2], extent[3])).fetchone()
+        finally:
+            conn.close()
+    return row[0] if row else None
+
+
+def cached_times(era5_dir, var_name, extent, levels=None, utc_start=None, utc_end=None):
+    '''
+
+    [查询时间段内所有请求层次都有覆盖extent的缓存文件的世界时，一次查询代替逐时次逐层次查找。
+    只查询索引，不检查文件是否存在，已删除文件的索引在读取时(config.get_era5cache_file、era5.get_model_grid)清理，或调用rebuild_index重建]
+
+    Arguments:
+        era5_dir {[str]} -- [ERA5_DATA缓存目录]
+        var_name {[str]} -- [stda要素名]
+        extent {[tuple]} -- [数据区域]
+
+    Keyword Arguments:
+        levels {[list]} -- [层次列表，不传代表地面层] (default: {None})
+        utc_start {[datetime]} -- [开始世界时] (default: {None})
+        utc_end {[datetime]} -- [结束世界时] (default: {None})
+
+    Returns:
+        [set] -- [datetime集合]
+    '''
+    levels = levels if isinstance(levels, (list, tuple)) else [levels]
+    level_keys = sorted(set(_level_key(level) for level in levels))
+    sql = ('SELECT utc_time, COUNT(DISTINCT level) FROM files WHERE var_name = ? '
+           'AND e0 <= ? AND e1 >= ? AND e2 <= ? AND e3 >= ? '
+           'AND level IN ({}) '.format(','.join('?' * len(level_keys))))
+    parms = [var_name, extent[0], extent[1], extent[2], extent[3]] + level_keys
+    if utc_start is not None:
+        sql += 'AND utc_time >= ? '
+        parms.append(_time_key(utc_start))
+    if utc_end is not None:
+        sql += 'AND utc_time <= ? '
+        parms.append(_time_key(utc_end))
+    sql += 'GROUP BY utc_time'
+
+    with _lock:
+        conn = _connect(era5_dir)
+        try:
+            rows = conn.execute(sql, parms).fetchall()
+        finally:
+            conn.close()
+    return set(datetime.datetime.strptime(str(t), '%Y%m%d%H%M') for t, n in rows if n == len(level_keys))
+
+
+def rebuild_index(era5_dir):
+    '''[清空并重新扫描ERA5_DATA目录建立索引]'''
+    with _lock:
+        conn = _connect(era5_dir)
+        try:
+            conn.execute('DELETE FROM files')
+            conn.commit()
+            _scan(era5_dir, conn)
+        finally:
+            conn.close()
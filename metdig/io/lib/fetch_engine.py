@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+并发读取引擎：对多个(时效、层次、要素)的读取请求限制同时进行的数量并发执行，支持单次请求超时、整体超时及失败重试，结果按请求顺序返回
+
+'''
+
+import math
+import time
+import threading
+from collections import deque
+from concurrent import futures
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+class _FetchTask(object):
+    def __init__(self, idx, kwargs):
+        self.idx = idx
+        self.kwargs = kwargs
+        self.attempt = 0
+        self.start = None  # 本次尝试提交(启动线程)的时间
+
+
+def _call_with_retry(func, kwargs, retries=0, retry_interval=1):
+    # 串行模式下的重试
+    for attempt in range(retries + 1):
+        try:
+            return func(**kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                raise e
+            _log.debug('retry {}/{}: {}'.format(attempt + 1, retries, str(e)))
+            time.sleep(retry_interval)
+
+
+def _submit_attempt(func, kwargs):
+    # 每次尝试使用独立的守护线程执行，超时被放弃的线程不占用其它请求的线程，也不阻塞解释器退出
+    future = futures.Future()
+
+    def _target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(**kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=_target, name='metdig-fetch', daemon=True).start()
+    return future
+
+
+def fetch_concurrent(func, kwargs_list, max_workers=1, timeout=None, retries=0, retry_interval=1, total_timeout=None):
+    '''
+
+    [并发调用func读取数据，返回结果顺序与kwargs_list一致，读取失败（异常、超时、重试后仍失败）的位置为None]
+
+    Arguments:
+        func {[function]} -- [读取函数，如cassandra.get_model_grid]
+        kwargs_list {[list]} -- [每一次读取调用func的kwargs列表]
+
+    Keyword Arguments:
+        max_workers {int} -- [同时进行的请求数，为1且不设置timeout时在当前线程中串行读取] (default: {1})
+        timeout {[number]} -- [单次请求超时时间（秒），从该次请求提交时计时，超时的请求被放弃并腾出位置给其它请求，None代表不超时] (default: {None})
+        retries {int} -- [单次请求失败（异常或超时）后的重试次数] (default: {0})
+        retry_interval {number} -- [串行模式下重试前等待时间（秒）] (default: {1})
+        total_timeout {[number]} -- [整体超时时间（秒），到期后尚未完成和尚未开始的请求均放弃，
+                                     None时如设置了timeout则为所有请求逐个超时的最长时间，否则不限制] (default: {None})
+
+    Returns:
+        [list] -- [与kwargs_list一一对应的读取结果]
+    '''
+    results = [None] * len(kwargs_list)
+    if len(kwargs_list) == 0:
+        return results
+
+    # 串行读取，与原先逐个读取的方式完全一致
+    if (max_workers is None or max_workers <= 1) and timeout is None and total_timeout is None:
+        for idx, kwargs in enumerate(kwargs_list):
+            try:
+                results[idx] = _call_with_retry(func, kwargs, retries=retries, retry_interval=retry_interval)
+            except Exception as e:
+                _log.info(str(e))
+        return results
+
+    max_workers = max(1, max_workers or 1)
+    if total_timeout is None and timeout is not None:
+        total_timeout = timeout * (retries + 1) * int(math.ceil(len(kwargs_list) / float(max_workers)))
+    deadline = None if total_timeout is None else time.time() + total_timeout
+
+    queued = deque(_FetchTask(idx, kwargs) for idx, kwargs in enumerate(kwargs_list))
+    running = {}
+
+    def _retry_or_fail(task, e):
+        if task.attempt < retries:
+            task.attempt += 1
+            _log.debug('retry {}/{}: {}'.format(task.attempt, retries, str(e)))
+            queued.append(task)
+        else:
+            _log.info(str(e))
+
+    poll = None if timeout is None and total_timeout is None else min(1.0, min(t for t in (timeout, total_timeout) if t is not None) / 4.0)
+    while queued or running:
+        while queued and len(running) < max_workers:
+            task = queued.popleft()
+            task.start = time.time()
+            running[_submit_attempt(func, task.kwargs)] = task
+
+        done, _ = futures.wait(list(running.keys()), timeout=poll, return_when=futures.FIRST_COMPLETED)
+        for f in done:
+            task = running.pop(f)
+            try:
+                results[task.idx] = f.result()
+            except Exception as e:
+                _retry_or_fail(task, e)
+
+        now = time.time()
+        if timeout is not None:
+            for f, task in list(running.items()):
+                if now - task.start > timeout:
+                    # 正在运行的线程无法被中断，此处放弃该请求的结果
+                    running.pop(f)
+                    _retry_or_fail(task, Exception('fetch timeout({}s): {}'.format(timeout, task.kwargs)))
+
+        if deadline is not None and now > deadline and (queued or running):
+            for task in list(running.values()) + list(queued):
+                _log.info('fetch total timeout({}s): {}'.format(total_timeout, task.kwargs))
+            queued.clear()
+            running.clear()
+
+    return results
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+解码后网格场的本地磁盘缓存（默认关闭，需要调用enable_field_cache开启）
+
+nmc_met_io.get_model_grid每次命中自身缓存时仍需要重新反序列化整个场，这里将解码后的xarray.Dataset按
+(数据目录, 文件名, 解码参数)保存为小端序原始数组文件(.bin)加JSON头文件(.json)，命中时通过np.memmap读取，
+按extent裁剪时只是memmap上的切片，不需要读入或拷贝整个场。
+
+缓存目录下的SQLite索引(index.db)记录已缓存的场，contains/cached_files不需要访问远程服务即可判断数据是否存在。
+缓存总字节数超过max_bytes时按最近访问时间淘汰最久未使用的场。
+
+Example:
+    import metdig
+    metdig.io.enable_field_cache(max_bytes=20 * 1024 ** 3)
+    ...
+    print(metdig.io.field_cache_info())
+
+'''
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+import xarray as xr
+
+from metdig.io.lib import config as CONFIG
+
+import logging
+_log = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_state = {'enabled': False, 'cache_dir': None, 'max_bytes': 10 * 1024 ** 3, 'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+_initialized = set()  # 已经建表的数据库
+
+# 只控制nmc_met_io自身缓存行为、不影响解码结果的参数，不参与缓存key
+_NON_DECODING_KWARGS = ('cache', 'cache_clear')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fields (
+    key TEXT PRIMARY KEY,
+    data_dir TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    options TEXT NOT NULL DEFAULT '',
+    accessed REAL NOT NULL DEFAULT 0
+)
+'''
+
+
+def _default_cache_dir():
+    return os.path.join(str(CONFIG.get_cache_dir()), 'FIELD_CACHE')
+
+
+def _field_options(kwargs):
+    # 解码参数(varname、levattrs、scale_off等)序列化为字符串，不同解码参数的同一文件分别缓存
+    options = {k: v for k, v in kwargs.items() if k not in _NON_DECODING_KWARGS}
+    if not options:
+        return ''
+    return json.dumps(_jsonable(options), sort_keys=True)
+
+
+def _field_key(data_dir, filename, options=''):
+    key = '{}|{}'.format(str(data_dir).strip('/'), filename)
+    if options:
+        key += '|' + options
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _field_files(cache_dir, key):
+    # 按key前两位分目录，避免单个目录下文件过多
+    path = os.path.join(cache_dir, key[:2], key)
+    return path + '.json', path + '.bin'
+
+
+def _connect(cache_dir):
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    db_file = os.path.join(cache_dir, 'index.db')
+    conn = sqlite3.connect(db_file, timeout=60)
+    if db_file not in _initialized:
+        conn.execute(_SCHEMA)
+        # 兼容旧版本建立的索引
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(fields)')]
+        if 'options' not in columns:
+            conn.execute("ALTER TABLE fields ADD COLUMN options TEXT NOT NULL DEFAULT ''")
+        if 'accessed' not in columns:
+            conn.execute('ALTER TABLE fields ADD COLUMN accessed REAL NOT NULL DEFAULT 0')
+            conn.execute('UPDATE fields SET accessed = created')
+        conn.commit()
+        _initialized.add(db_file)
+    return conn
+
+
+def _jsonable(value):
+    # 属性值转换为可以写入json的类型
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        return _jsonable(value.item())
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def _encode_coord(coord):
+    values = np.asarray(coord.values)
+    if values.dtype.kind in 'mM':
+        encoded = values.astype('int64').tolist()  # 时间坐标按整数保存
+    else:
+        encoded = _jsonable(values)
+    return {'dims': list(coord.dims), 'dtype': values.dtype.str, 'values': encoded, 'attrs': _jsonable(dict(coord.attrs))}
+
+
+def _decode_coord(item):
+    dtype = np.dtype(item['dtype'])
+    if dtype.kind in 'mM':
+        values = np.array(item['values'], dtype='int64').view(dtype)
+    elif dtype.kind == 'O':
+        values = np.array(item['values'], dtype=object)
+    else:
+        values = np.array(item['values'], dtype=dtype)
+    return (item['dims'], values, item['attrs'])
+
+
+def _crop_index(values, low, high):
+    # 闭区间[low, high]的下标，连续时返回切片（memmap上零拷贝）
+    idx = np.nonzero((values >= low) & (values <= high))[0]
+    if idx.size > 0 and idx[-1] - idx[0] + 1 == idx.size:
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    return idx
+
+
+def _remove_fields(conn, cache_dir, keys):
+    for key in keys:
+        for f in _field_files(cache_dir, key):
+            if os.path.exists(f):
+                os.remove(f)
+    conn.executemany('DELETE FROM fields WHERE key = ?', [(key,) for key in keys])
+
+
+def _evict(conn, cache_dir, keep_key=None):
+    # 总字节数超过max_bytes时按accessed从旧到新淘汰，keep_key为刚写入的场
+    total = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM fields').fetchone()[0]
+    if total <= _state['max_bytes']:
+        return
+    keys = []
+    for key, nbytes in conn.execute('SELECT key, nbytes FROM fields ORDER BY accessed'):
+        if total <= _state['max_bytes']:
+            break
+        if key == keep_key:
+            continue
+        keys.append(key)
+        total -= nbytes
+    _remove_fields(conn, cache_dir, keys)
+    _state['evictions'] += len(keys)
+
+
+def enable_field_cache(cache_dir=None, max_bytes=10 * 1024 ** 3):
+    '''
+
+    [开启解码网格场磁盘缓存]
+
+    Keyword Arguments:
+        cache_dir {[str]} -- [缓存目录，不传则为metdig缓存目录下的FIELD_CACHE] (default: {None})
+        max_bytes {int} -- [缓存最大字节数，超过时淘汰最久未访问的场] (default: {10 * 1024 ** 3})
+    '''
+    with _lock:
+        _state['cache_dir'] = str(cache_dir) if cache_dir else _default_cache_dir()
+        _state['max_bytes'] = max_bytes
+        _state['enabled'] = True
+        if os.path.exists(os.path.join(_state['cache_dir'], 'index.db')):
+            conn = _connect(_state['cache_dir'])
+            try:
+                _evict(conn, _state['cache_dir'])
+                conn.commit()
+            finally:
+                conn.close()
+    _log.info('field cache enabled, cache_dir={}, max_bytes={}'.format(_state['cache_dir'], max_bytes))
+
+
+def disable_field_cache():
+    '''[关闭解码网格场磁盘缓存，已缓存的文件保留]'''
+    _state['enabled'] = False
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def field_cache_info():
+    '''[缓存状态，包括缓存目录、已缓存场个数及字节数、hits/misses/writes/evictions计数]'''
+    with _lock:
+        info = dict(_state)
+    cache_dir = info['cache_dir'] or _default_cache_dir()
+    info['cache_dir'] = cache_dir
+    info['fields'], info['nbytes'] = 0, 0
+    if os.path.exists(os.path.join(cache_dir, 'index.db')):
+        conn = _connect(cache_dir)
+        try:
+            info['fields'], info['nbytes'] = conn.execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM fields').fetchone()
+        finally:
+            conn.close()
+    return info
+
+
+def clear_field_cache(before=None):
+    '''
+
+    [删除缓存的场]
+
+    Keyword Arguments:
+        before {[number]} -- [只删除写入时间早于该时间戳(time.time())的场，None代表全部删除] (default: {None})
+    '''
+    cache_dir = _state['cache_dir'] or _default_cache_dir()
+    with _lock:
+        conn = _connect(cache_dir)
+        try:
+            if before is None:
+                keys = [row[0] for row in conn.execute('SELECT key FROM fields')]
+            else:
+                keys = [row[0] for row in conn.execute('SELECT key FROM fields WHERE created < ?', (before,))]
+            _remove_fields(conn, cache_dir, keys)
+            conn.commit()
+        finally:
+            conn.close()
+        _state['hits'] = _state['misses'] = _state['writes'] = _state['evictions'] = 0
+
+
+def contains(data_dir, filename, cache_dir=None, **kwargs):
+    '''[场是否已按kwargs中的解码参数缓存，只查询本地索引]'''
+    cache_dir = cache_dir or _state['cache_dir'] or _default_cache_dir()
+    if not os.path.exists(os.path.join(cache_dir, 'index.db')):
+        return False
+    conn = _connect(cache_dir)
+    try:
+        row = conn.execute('SELECT 1 FROM fields WHERE key = ?', (_field_key(data_dir, filename, _field_options(kwargs)),)).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def cached_files(data_dir, cache_dir=None):
+    '''[数据目录下已缓存的文件名列表，只查询本地索引]'''
+    cache_dir = cache_dir or _state['cache_dir'] or _default_cache_dir()
+    if not os.path.exists(os.path.join(cache_dir, 'index.db')):
+        return []
+    conn = _connect(cache_dir)
+    try:
+        rows = conn.execute('SELECT DISTINCT filename FROM fields WHERE data_dir = ? ORDER BY filename',
+                            (str(data_dir).strip('/'),)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def put(data_dir, filename, data, cache_dir=None, options=''):
+    '''
+
+    [保存解码后的场，数据变量依次写入.bin（小端序、C顺序），坐标及属性写入.json]
+
+    Arguments:
+        data_dir {[str]} -- [数据目录]
+        filename {[str]} -- [文件名]
+        data {[xarray.Dataset]} -- [解码后的数据]
+
+    Keyword Arguments:
+        options {str} -- [_field_options序列化的解码参数] (default: {''})
+    '''
+    cache_dir = cache_dir or _state['cache_dir'] or _default_cache_dir()
+    key = _field_key(data_dir, filename, options)
+    header_file, bin_file = _field_files(cache_dir, key)
+    os.makedirs(os.path.dirname(header_file), exist_ok=True)
+
+    header = {'version': 1, 'data_dir': str(data_dir), 'filename': filename, 'attrs': _jsonable(dict(data.attrs)),
+              'coords': {name: _encode_coord(coord) for name, coord in data.coords.items()}, 'data_vars': {}}
+
+    # 先写临时文件再重命名，避免并发读取到写了一半的文件
+    tmp_suffix = '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+    offset = 0
+    with open(bin_file + tmp_suffix, 'wb') as f:
+        for name, var in data.data_vars.items():
+            values = np.ascontiguousarray(var.values)
+            values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+            f.write(values.tobytes())
+            header['data_vars'][name] = {'dims': list(var.dims), 'dtype': values.dtype.str, 'shape': list(values.shape),
+                                         'offset': offset, 'attrs': _jsonable(dict(var.attrs))}
+            offset += values.nbytes
+    with open(header_file + tmp_suffix, 'w') as f:
+        json.dump(header, f)
+    os.replace(bin_file + tmp_suffix, bin_file)
+    os.replace(header_file + tmp_suffix, header_file)
+
+    with _lock:
+        conn = _connect(cache_dir)
+        try:
+            now = time.time()
+            conn.execute('INSERT OR REPLACE INTO fields (key, data_dir, filename, nbytes, created, options, accessed) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', (key, str(data_dir).strip('/'), filename, offset, now, options, now))
+            _evict(conn, cache_dir, keep_key=key)
+            conn.commit()
+        finally:
+            conn.close()
+        _state['writes'] += 1
+
+
+def get(data_dir, filename, extent=None, x_percent=0, y_percent=0, cache_dir=None, options=''):
+    '''
+
+    [读取缓存的场，数据变量为np.memmap（写时复制），未缓存返回None]
+
+    Arguments:
+        data_dir {[str]} -- [数据目录]
+        filename {[str]} -- [文件名]
+
+    Keyword Arguments:
+        extent {[tuple]} -- [裁剪区域，与utility.area_cut的闭区间一致，裁剪在memmap上完成] (default: {None})
+        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        options {str} -- [_field_options序列化的解码参数] (default: {''})
+
+    Returns:
+        [xarray.Dataset] -- [与写入时结构一致的数据]
+    '''
+    cache_dir = cache_dir or _state['cache_dir'] or _default_cache_dir()
+    key = _field_key(data_dir, filename, options)
+    header_file, bin_file = _field_files(cache_dir, key)
+    try:
+        with open(header_file, 'r') as f:
+            header = json.load(f)
+    except (IOError, ValueError):
+        with _lock:
+            _state['misses'] += 1
+        return None
+
+    coords = {name: _decode_coord(item) for name, item in header['coords'].items()}
+
+    # 经纬度裁剪下标
+    index = {}
+    if extent is not None:
+        delt_x = (extent[1] - extent[0]) * x_percent
+        delt_y = (extent[3] - extent[2]) * y_percent
+        if 'lon' in coords:
+            index['lon'] = _crop_index(coords['lon'][1], extent[0] - delt_x, extent[1] + delt_x)
+        if 'lat' in coords:
+            index['lat'] = _crop_index(coords['lat'][1], extent[2] - delt_y, extent[3] + delt_y)
+        for name, (dims, values, attrs) in coords.items():
+            if len(dims) == 1 and dims[0] in index:
+                coords[name] = (dims, values[index[dims[0]]], attrs)
+
+    data_vars = {}
+    for name, item in header['data_vars'].items():
+        values = np.memmap(bin_file, dtype=np.dtype(item['dtype']), mode='c', offset=item['offset'], shape=tuple(item['shape']))
+        # 依次在各维度上裁剪，切片为memmap的视图，不拷贝数据
+        for axis, dim in enumerate(item['dims']):
+            if dim in index:
+                values = values[(slice(None),) * axis + (index[dim],)]
+        data_vars[name] = (item['dims'], values, item['attrs'])
+
+    with _lock:
+        _state['hits'] += 1
+        # 记录访问时间，供按LRU淘汰
+        conn = _connect(cache_dir)
+        try:
+            conn.execute('UPDATE fields SET accessed = ? WHERE key = ?', (time.time(), key))
+            conn.commit()
+        finally:
+            conn.close()
+    return xr.Dataset(data_vars, coords=coords, attrs=header['attrs'])
+
+
+def read_field(reader, data_dir, filename, extent=None, x_percent=0, y_percent=0, **kwargs):
+    '''
+
+    [通过缓存读取解码后的场，缓存关闭或kwargs中cache=False时直接调用reader，
+     kwargs中的解码参数(varname、levattrs、scale_off等)作为缓存key的一部分]
+
+    Arguments:
+        reader {[function]} -- [解码读取函数，如nmc_micaps_io.get_model_grid(data_dir, filename=filename, **kwargs)]
+        data_dir {[str]} -- [数据目录]
+        filename {[str]} -- [文件名]
+
+    Keyword Arguments:
+        extent {[tuple]} -- [命中缓存时在memmap上按该范围裁剪，未命中时返回完整的场] (default: {None})
+        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+
+    Returns:
+        [xarray.Dataset] -- [解码后的数据，读取失败返回None]
+    '''
+    if not _state['enabled'] or kwargs.get('cache', True) is False:
+        return reader(data_dir, filename=filename, **kwargs)
+
+    options = _field_options(kwargs)
+    data = get(data_dir, filename, extent=extent, x_percent=x_percent, y_percent=y_percent, options=options)
+    if data is not None:
+        return data
+
+    data = reader(data_dir, filename=filename, **kwargs)
+    if data is not None:
+        try:
+            put(data_dir, filename, data, options=options)
+        except Exception as e:
+            _log.info('field cache write failed {}{}: {}'.format(data_dir, filename, str(e)))
+    return data
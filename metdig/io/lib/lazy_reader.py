@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+延迟读取：将多层多时次模式网格数据组装成dask数组的stda，每个(fhour, level)场为一个chunk，计算时才读取对应的场。
+需要安装dask（可选依赖）。
+
+'''
+
+import numpy as np
+import xarray as xr
+
+from metdig.io.lib import utility as utl
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+def lazy_model_3D_grids(get_model_grid, init_time=None, fhours=None, data_name=None, var_name=None, levels=None,
+                        extent=None, x_percent=0, y_percent=0, **kwargs):
+    '''
+
+    [延迟读取多层多时次模式网格数据，先读取第一个场确定网格信息，其余场在计算时读取]
+
+    Arguments:
+        get_model_grid {[function]} -- [数据源的单层单时次读取函数，如cassandra.get_model_grid]
+
+    Keyword Arguments:
+        init_time {[datetime]} -- [起报时间]
+        fhours {[list]} -- [预报时效]
+        data_name {[str]} -- [模式名]
+        var_name {[str]} -- [要素名]
+        levels {[list or number]} -- [层次，不传代表地面层] (default: {None})
+        extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
+        x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+        y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+
+    Returns:
+        [stda] -- [dask数组的stda格式数据，读取失败的场为nan（非延迟读取时读取失败的场会被丢弃）]
+    '''
+    try:
+        import dask
+        import dask.array as da
+    except ImportError:
+        raise Exception('lazy mode requires dask, please install dask first!')
+
+    fhours = utl.parm_tolist(fhours)
+    levels = utl.parm_tolist(levels)
+
+    def _get(fhour, level):
+        return get_model_grid(init_time=init_time, fhour=fhour, data_name=data_name, var_name=var_name, level=level,
+                              extent=extent, x_percent=x_percent, y_percent=y_percent, **kwargs)
+
+    # 读取第一个能读到的场作为模板，确定member/lat/lon/属性
+    template = None
+    for fhour in fhours:
+        for level in levels:
+            try:
+                template = _get(fhour, level)
+            except Exception as e:
+                _log.info(str(e))
+                continue
+            if template is not None and template.size > 0:
+                template_key = (fhour, level)
+                break
+            template = None
+        if template is not None:
+            break
+    if template is None:
+        raise Exception('Can not get data! {} {}'.format(data_name, var_name))
+
+    template = template.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+    shape = (template['member'].size, 1, 1, 1, template['lat'].size, template['lon'].size)
+    dtype = template.dtype if template.dtype.kind == 'f' else np.dtype('float64')
+
+    def _read(fhour, level):
+        try:
+            data = _get(fhour, level)
+            data = data.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+            if data.shape != shape:
+                raise Exception('field shape {} is not consistent with {}'.format(data.shape, shape))
+            return data.values.astype(dtype, copy=False)
+        except Exception as e:
+            _log.info('lazy read failed fhour={} level={}: {}'.format(fhour, level, str(e)))
+            return np.full(shape, np.nan, dtype=dtype)
+
+    # 每个(fhour, level)场一个chunk
+    level_blocks = []
+    for level in levels:
+        dtime_blocks = []
+        for fhour in fhours:
+            if (fhour, level) == template_key:
+                dtime_blocks.append(da.from_array(template.values.astype(dtype, copy=False), chunks=shape))
+            else:
+                dtime_blocks.append(da.from_delayed(dask.delayed(_read)(fhour, level), shape=shape, dtype=dtype))
+        level_blocks.append(da.concatenate(dtime_blocks, axis=3))
+    values = da.concatenate(level_blocks, axis=1)
+
+    level_coords = [level if level else template['level'].values[0] for level in levels]
+    stda_data = xr.DataArray(values,
+                             coords=[('member', template['member'].values), ('level', level_coords),
+                                     ('time', template['time'].values), ('dtime', fhours),
+                                     ('lat', template['lat'].values), ('lon', template['lon'].values)],
+                             attrs=template.attrs, name=template.name)
+    return stda_data
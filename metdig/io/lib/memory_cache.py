@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+进程内stda内存缓存（默认关闭，需要调用enable_memory_cache开启）
+
+按照字节数限制缓存大小，超出后按照最近最少使用(LRU)淘汰；以规范化后的读取参数为键，
+请求的extent被已缓存的更大范围数据覆盖时直接从缓存数据中裁剪返回，并记录命中/未命中/淘汰次数。
+
+Example:
+    import metdig
+    metdig.io.enable_memory_cache(max_bytes=2 * 1024 ** 3)
+    ...
+    print(metdig.io.memory_cache_info())
+
+'''
+
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import logging
+_log = logging.getLogger(__name__)
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(i) for i in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if hasattr(value, 'tolist') and not isinstance(value, str):
+        return _hashable(value.tolist())  # numpy
+    hash(value)
+    return value
+
+
+def _cut_extent(extent, x_percent=0, y_percent=0):
+    # 与utility.area_cut一致的实际裁剪范围
+    if extent is None:
+        return None
+    delt_x = (extent[1] - extent[0]) * x_percent
+    delt_y = (extent[3] - extent[2]) * y_percent
+    return (extent[0] - delt_x, extent[1] + delt_x, extent[2] - delt_y, extent[3] + delt_y)
+
+
+def _covers(big, small):
+    if big is None:
+        return True
+    if small is None:
+        return False
+    return big[0] <= small[0] and big[1] >= small[1] and big[2] <= small[2] and big[3] >= small[3]
+
+
+class StdaMemoryCache(object):
+    def __init__(self, max_bytes=1024 ** 3):
+        self.max_bytes = max_bytes
+        self.enabled = False
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key: (base_key, cut_extent), value: stda, 顺序即LRU顺序
+        self._extents = {}  # key: base_key, value: set(cut_extent)
+        self._nbytes = 0
+        self.hits = 0
+        self.crop_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._extents.clear()
+            self._nbytes = 0
+
+    def reset_counters(self):
+        with self._lock:
+            self.hits = 0
+            self.crop_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        '''[缓存状态及命中计数]'''
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_bytes': self.max_bytes,
+                'nbytes': self._nbytes,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'crop_hits': self.crop_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def get(self, base_key, cut_extent, cropable=True):
+        '''[查找缓存，未命中返回None，命中返回数据副本]'''
+        with self._lock:
+            key = (base_key, cut_extent)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key].copy(deep=True)
+
+            if cropable:
+                for ext in self._extents.get(base_key, ()):
+                    if ext != cut_extent and _covers(ext, cut_extent):
+                        data = self._entries[(base_key, ext)]
+                        self._entries.move_to_end((base_key, ext))
+                        self.hits += 1
+                        self.crop_hits += 1
+                        # stda的经纬度已经从小到大排序，闭区间裁剪与area_cut结果一致
+                        return data.sel(lon=slice(cut_extent[0], cut_extent[1]), lat=slice(cut_extent[2], cut_extent[3])).copy(deep=True)
+
+            self.misses += 1
+            return None
+
+    def put(self, base_key, cut_extent, data):
+        nbytes = int(data.nbytes)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            key = (base_key, cut_extent)
+            if key in self._entries:
+                self._nbytes -= int(self._entries.pop(key).nbytes)
+            self._entries[key] = data.copy(deep=True)
+            self._extents.setdefault(base_key, set()).add(cut_extent)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes and self._entries:
+                (old_base, old_ext), old = self._entries.popitem(last=False)
+                self._extents[old_base].discard(old_ext)
+                if not self._extents[old_base]:
+                    del self._extents[old_base]
+                self._nbytes -= int(old.nbytes)
+                self.evictions += 1
+
+
+# 进程内唯一的缓存实例
+_cache = StdaMemoryCache()
+
+
+def enable_memory_cache(max_bytes=1024 ** 3):
+    '''
+
+    [开启stda内存缓存]
+
+    Keyword Arguments:
+        max_bytes {int} -- [缓存最大字节数] (default: {1024 ** 3})
+    '''
+    with _cache._lock:
+        _cache.max_bytes = max_bytes
+        _cache.enabled = True
+    _log.info('memory cache enabled, max_bytes={}'.format(max_bytes))
+
+
+def disable_memory_cache(clear=True):
+    '''[关闭stda内存缓存，默认同时清空缓存数据]'''
+    _cache.enabled = False
+    if clear:
+        _cache.clear()
+
+
+def clear_memory_cache():
+    '''[清空stda内存缓存及计数]'''
+    _cache.clear()
+    _cache.reset_counters()
+
+
+def memory_cache_info():
+    '''[stda内存缓存状态，包括hits/crop_hits/misses/evictions计数]'''
+    return _cache.info()
+
+
+def cached(data_source, cropable=True):
+    '''
+
+    [读取单层单时次网格数据函数的缓存装饰器]
+
+    Arguments:
+        data_source {[str]} -- [数据源，作为缓存键的一部分]
+
+    Keyword Arguments:
+        cropable {bool} -- [返回数据的范围是否严格等于area_cut(extent, x_percent, y_percent)，为True时才允许从更大范围的缓存中裁剪] (default: {True})
+    '''
+    def decorator(func):
+        sig = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _cache.enabled:
+                return func(*args, **kwargs)
+
+            try:
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                parms = dict(bound.arguments)
+                for name, p in sig.parameters.items():
+                    if p.kind == inspect.Parameter.VAR_KEYWORD:
+                        parms.update(parms.pop(name))
+                extent = parms.pop('extent', None)
+                x_percent = parms.pop('x_percent', 0)
+                y_percent = parms.pop('y_percent', 0)
+                if 'level' in parms and not parms['level']:
+                    parms['level'] = None  # 地面层
+                base_key = (data_source, _hashable(parms))
+                cut_extent = _hashable(_cut_extent(extent, x_percent, y_percent))
+            except Exception as e:
+                _log.debug('memory cache bypass: {}'.format(str(e)))
+                return func(*args, **kwargs)
+
+            data = _cache.get(base_key, cut_extent, cropable=cropable)
+            if data is not None:
+                return data
+
+            data = func(*args, **kwargs)
+            if data is not None:
+                _cache.put(base_key, cut_extent, data)
+            return data
+        return wrapper
+    return decorator
@@ -5,11 +5,11 @@ import pandas as pd
 
 import numpy as np
 import threading
-
-from metpy.units import units
+from types import MappingProxyType
 
 
 def check_units(var_units):
+    from metpy.units import units  # metpy导入较慢，在第一次创建配置单例时才导入
     try:
         units(var_units)
     except Exception as e:
@@ -24,4 +24,23 @@ class SingletonMetaClass(type):
             with cls._lock:
                 if not hasattr(cls, '_instance'):
                     cls._instance = super(SingletonMetaClass, cls).__call__(*args, **kwargs)
-        return cls._instance
\ No newline at end of file
+        return cls._instance
+
+
+def build_cfg_index(cfg, keys):
+    '''
+
+    [按照keys列建立配置表的字典索引，在单例创建时调用一次，查询时不再对整个配置表做布尔筛选]
+
+    Arguments:
+        cfg {[pd.DataFrame]} -- [配置表]
+        keys {[list]} -- [索引列，如['data_name', 'level_type', 'var_name']]
+
+    Returns:
+        [dict] -- [{(索引列的值): (匹配的记录, ...)}，记录为只读字典（list转为tuple），顺序与配置表一致]
+    '''
+    index = {}
+    for record in cfg.to_dict('records'):
+        record = {k: tuple(v) if isinstance(v, list) else v for k, v in record.items()}
+        index.setdefault(tuple(record[k] for k in keys), []).append(MappingProxyType(record))
+    return {k: tuple(v) for k, v in index.items()}
@@ -5,7 +5,7 @@ import pandas as pd
 
 import numpy as np
 
-from metdig.io.lib.package_config.base import check_units, SingletonMetaClass
+from metdig.io.lib.package_config.base import check_units, SingletonMetaClass, build_cfg_index
 
 
 class cassandra_model_cfg(metaclass=SingletonMetaClass):
@@ -16,17 +16,16 @@ class cassandra_model_cfg(metaclass=SingletonMetaClass):
 
         self.model_cfg = self.model_cfg.fillna('')
         self.model_cfg.apply(lambda row: check_units(row['var_units']), axis=1)  # 检查是否满足units格式
+        self.model_cfg_index = build_cfg_index(self.model_cfg, ['data_name', 'level_type', 'var_name'])
 
     def get_model_cfg(self, level_type=None, data_name=None, var_name=None):
-        this_cfg = self.model_cfg[(self.model_cfg['data_name'] == data_name) &
-                                  (self.model_cfg['var_name'] == var_name) &
-                                  (self.model_cfg['level_type'] == level_type)].copy(deep=True).reset_index(drop=True)
+        this_cfg = self.model_cfg_index.get((data_name, level_type, var_name))
 
         # 此处建议修改为warning
-        if len(this_cfg) == 0:
+        if not this_cfg:
             raise Exception('can not get data_name={} level_type={} var_name={} in {}!'.format(data_name, level_type, var_name, self.model_cfg_csv))
 
-        return this_cfg.to_dict('index')[0]
+        return this_cfg[0]
 
     def model_cassandra_dir(self, level_type=None, data_name=None, var_name=None, level=None):
         path = self.get_model_cfg(level_type=level_type, data_name=data_name, var_name=var_name)['cassandra_path']
@@ -56,7 +55,37 @@ class cassandra_model_cfg(metaclass=SingletonMetaClass):
         return self.get_model_cfg(level_type=level_type, data_name=data_name, var_name=var_name)['cassandra_prod_type']
 
 
+def _benchmark_cfg_lookup(repeat=10000):
+    # 对比字典索引查询与原先整表布尔筛选查询的耗时
+    import time
+
+    cfg = cassandra_model_cfg()
+    keys = list(cfg.model_cfg_index.keys())
+
+    def _mask_lookup(data_name, level_type, var_name):
+        this_cfg = cfg.model_cfg[(cfg.model_cfg['data_name'] == data_name) &
+                                 (cfg.model_cfg['var_name'] == var_name) &
+                                 (cfg.model_cfg['level_type'] == level_type)].copy(deep=True).reset_index(drop=True)
+        return this_cfg.to_dict('index')[0]
+
+    n_mask = max(1, repeat // 100)
+    st = time.perf_counter()
+    for i in range(n_mask):
+        _mask_lookup(*keys[i % len(keys)])
+    t_mask = (time.perf_counter() - st) / n_mask
+
+    st = time.perf_counter()
+    for i in range(repeat):
+        data_name, level_type, var_name = keys[i % len(keys)]
+        cfg.get_model_cfg(level_type=level_type, data_name=data_name, var_name=var_name)
+    t_index = (time.perf_counter() - st) / repeat
+
+    print('rows={} mask lookup: {:.1f}us, index lookup: {:.2f}us, speedup: {:.0f}x'.format(
+        len(cfg.model_cfg), t_mask * 1e6, t_index * 1e6, t_mask / t_index))
+
+
 if __name__ == '__main__':
+    _benchmark_cfg_lookup()
 
     x = cassandra_model_cfg().model_cassandra_dir(data_name='ecmwf', var_name='tmp', level_type='high', level=100)
     print(x)
@@ -5,7 +5,7 @@ import pandas as pd
 
 import numpy as np
 
-from metdig.io.lib.package_config.base import check_units, SingletonMetaClass
+from metdig.io.lib.package_config.base import check_units, SingletonMetaClass, build_cfg_index
 from metdig.io.lib.package_config.cmadaas_datacode_cfg import cmadaas_datacode_cfg
 
 
@@ -16,27 +16,26 @@ class cmadaas_model_cfg(metaclass=SingletonMetaClass):
         self.model_cfg = self.model_cfg.fillna('')
         self.model_cfg.apply(lambda row: check_units(row['var_units']), axis=1)  # 检查是否满足units格式
         self.model_cfg['cmadaas_data_code'] = self.model_cfg.apply(lambda row: row['cmadaas_data_code'].strip('/').split('/'), axis=1)
+        self.model_cfg_index = build_cfg_index(self.model_cfg, ['data_name', 'level_type', 'var_name'])
 
     def get_model_cfg(self, data_name=None, var_name=None, level_type=None, data_code=None):
-        this_cfg = self.model_cfg[(self.model_cfg['data_name'] == data_name) &
-                                  (self.model_cfg['var_name'] == var_name) &
-                                  (self.model_cfg['level_type'] == level_type)].copy(deep=True).reset_index(drop=True)
+        this_cfg = self.model_cfg_index.get((data_name, level_type, var_name))
 
-        if len(this_cfg) == 0:
+        if not this_cfg:
             raise Exception('can not get data_name={} level_type={} var_name={}  in {}!'.format(data_name, level_type, var_name, self.model_cfg_csv))
 
         if len(this_cfg) > 1:
             raise Exception('error: greater than 1 recode! data_name={} level_type={} var_name={} in {}!'.format(
                 data_name, level_type, var_name, self.model_cfg_csv))
 
-        cmadaas_data_code = this_cfg['cmadaas_data_code'].values[0]
+        cmadaas_data_code = this_cfg[0]['cmadaas_data_code']
 
         if data_code.strip().lower() != 'any':
             if data_code not in cmadaas_data_code:
                 raise Exception('error: {} not in cmadaas_data_code! data_name={} level_type={} var_name={} in {}!'.format(
                     data_code, data_name, level_type, var_name, self.model_cfg_csv))
 
-        return this_cfg.to_dict('index')[0]
+        return this_cfg[0]
 
     def model_cmadaas_data_code(self, data_name=None, var_name=None, level_type=None, fhour=0):
         cmadaas_data_code = cmadaas_datacode_cfg().get_datacode_cfg(data_name=data_name, fhour=fhour)
@@ -5,7 +5,7 @@ import pandas as pd
 
 import numpy as np
 
-from metdig.io.lib.package_config.base import check_units, SingletonMetaClass
+from metdig.io.lib.package_config.base import check_units, SingletonMetaClass, build_cfg_index
 
 
 class cmadaas_obs_cfg(metaclass=SingletonMetaClass):
@@ -14,15 +14,15 @@ class cmadaas_obs_cfg(metaclass=SingletonMetaClass):
         self.obs_cfg = pd.read_csv(self.obs_cfg_csv, encoding='gbk', comment='#')
         self.obs_cfg = self.obs_cfg.fillna('')
         self.obs_cfg.apply(lambda row: check_units(row['var_units']), axis=1)  # 检查是否满足units格式
+        self.obs_cfg_index = build_cfg_index(self.obs_cfg, ['data_name', 'var_name'])
 
     def get_obs_cfg(self, data_name=None, var_name=None):
-        this_cfg = self.obs_cfg[(self.obs_cfg['data_name'] == data_name) &
-                                (self.obs_cfg['var_name'] == var_name)].copy(deep=True).reset_index(drop=True)
+        this_cfg = self.obs_cfg_index.get((data_name, var_name))
 
-        if len(this_cfg) == 0:
+        if not this_cfg:
             raise Exception('can not get data_name={} var_name={} in {}!'.format(data_name, var_name, self.obs_cfg_csv))
 
-        return this_cfg.to_dict('index')[0]
+        return this_cfg[0]
 
     def obs_cmadaas_data_code(self, data_name=None, var_name=None):
         return self.get_obs_cfg(data_name=data_name, var_name=var_name)['cmadaas_data_code']
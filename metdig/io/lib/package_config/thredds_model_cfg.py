@@ -5,7 +5,7 @@ import pandas as pd
 
 import numpy as np
 
-from metdig.io.lib.package_config.base import check_units, SingletonMetaClass
+from metdig.io.lib.package_config.base import check_units, SingletonMetaClass, build_cfg_index
 
 
 class thredds_model_cfg(metaclass=SingletonMetaClass):
@@ -15,17 +15,16 @@ class thredds_model_cfg(metaclass=SingletonMetaClass):
         self.model_cfg = pd.read_csv(self.model_cfg_csv, encoding='gbk', comment='#')
         self.model_cfg = self.model_cfg.fillna('')
         self.model_cfg.apply(lambda row: check_units(row['var_units']), axis=1)  # 检查是否满足units格式
+        self.model_cfg_index = build_cfg_index(self.model_cfg, ['data_name', 'level_type', 'var_name'])
 
     def get_model_cfg(self, level_type=None, data_name=None, var_name=None):
-        this_cfg = self.model_cfg[(self.model_cfg['data_name'] == data_name) &
-                                  (self.model_cfg['var_name'] == var_name) &
-                                  (self.model_cfg['level_type'] == level_type)].copy(deep=True).reset_index(drop=True)
+        this_cfg = self.model_cfg_index.get((data_name, level_type, var_name))
 
-        if len(this_cfg) == 0:
+        if not this_cfg:
             raise Exception('can not get data_name={} level_type={} var_name={} in {}!'.format(
                 data_name, level_type, var_name, self.model_cfg_csv))
 
-        return this_cfg.to_dict('index')[0]
+        return this_cfg[0]
 
     def model_thredds_path(self, level_type=None, data_name=None, var_name=None, level=None):
         path = self.get_model_cfg(level_type=level_type, data_name=data_name, var_name=var_name)['thredds_path']
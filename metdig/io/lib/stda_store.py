@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+stda合并缓存库：一个要素一个NetCDF4文件，level/time/dtime为无限维，按照(level, time, dtime)逐场追加，
+每个场为一个chunk(member, 1, 1, 1, lat, lon)，读取4D数据块时按chunk连续读取，替代每个场一个小文件的缓存方式。
+
+存储路径：
+    custom: {CACHE_DIR}/CUSTOM_STORE/{data_name}/{var_name}.nc
+    era5:   {CACHE_DIR}/ERA5_STORE/{var_name}/{var_name}_{extent[0]}_{extent[1]}_{extent[2]}_{extent[3]}.nc
+
+'''
+
+import os
+import glob
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+import netCDF4 as nc
+
+from metdig.io.lib import config as CONFIG
+
+import logging
+_log = logging.getLogger(__name__)
+
+_TIME_UNITS = 'seconds since 1970-01-01 00:00:00'
+
+# 同一个文件的读写加锁（HDF5非线程安全）
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _get_lock(path):
+    with _locks_lock:
+        if path not in _locks:
+            _locks[path] = threading.RLock()
+        return _locks[path]
+
+
+def _to_seconds(times):
+    return pd.to_datetime(np.atleast_1d(times)).values.astype('datetime64[s]').astype('int64')
+
+
+def _from_seconds(secs):
+    return np.asarray(secs).astype('int64').astype('datetime64[s]').astype('datetime64[ns]')
+
+
+def get_custom_store_file(data_name, var_name):
+    return os.path.join(CONFIG.get_cache_dir(), 'CUSTOM_STORE', data_name, '{}.nc'.format(var_name))
+
+
+def get_era5_store_file(var_name, extent):
+    return os.path.join(CONFIG.get_cache_dir(), 'ERA5_STORE', var_name,
+                        '{}_{}_{}_{}_{}.nc'.format(var_name, extent[0], extent[1], extent[2], extent[3]))
+
+
+def find_era5_store_file(var_name, extent):
+    '''
+
+    [查找覆盖extent的era5合并缓存文件，不存在返回None]
+    '''
+    store_dir = os.path.join(CONFIG.get_cache_dir(), 'ERA5_STORE', var_name)
+    exact = get_era5_store_file(var_name, extent)
+    if os.path.exists(exact):
+        return exact
+    for fname in glob.glob(os.path.join(store_dir, '{}_*.nc'.format(var_name))):
+        file_extent = re.findall(r"\-?\d+\.?\d*", os.path.splitext(os.path.basename(fname))[0][len(var_name):])
+        if len(file_extent) == 4:
+            file_extent = [float(i) for i in file_extent]
+            if file_extent[0] <= extent[0] and file_extent[1] >= extent[1] and file_extent[2] <= extent[2] and file_extent[3] >= extent[3]:
+                return fname
+    return None
+
+
+class StdaStore(object):
+    def __init__(self, path):
+        '''
+
+        [单要素stda合并缓存]
+
+        Arguments:
+            path {[str]} -- [NetCDF4文件路径]
+        '''
+        self.path = str(path)
+        self._lock = _get_lock(self.path)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _create(self, stda, complevel=4):
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        ds = nc.Dataset(self.path, 'w', format='NETCDF4')
+        ds.createDimension('member', stda['member'].size)
+        ds.createDimension('level', None)
+        ds.createDimension('time', None)
+        ds.createDimension('dtime', None)
+        ds.createDimension('lat', stda['lat'].size)
+        ds.createDimension('lon', stda['lon'].size)
+
+        v = ds.createVariable('member', str, ('member',))
+        for i, m in enumerate(stda['member'].values):
+            v[i] = str(m)
+        ds.createVariable('level', 'f8', ('level',))
+        v = ds.createVariable('time', 'i8', ('time',))
+        v.units = _TIME_UNITS
+        ds.createVariable('dtime', 'i4', ('dtime',))
+        ds.createVariable('lat', 'f8', ('lat',))[:] = stda['lat'].values
+        ds.createVariable('lon', 'f8', ('lon',))[:] = stda['lon'].values
+
+        chunks = (stda['member'].size, 1, 1, 1, stda['lat'].size, stda['lon'].size)  # 一个场一个chunk
+        v = ds.createVariable('data', stda.dtype if stda.dtype.kind == 'f' else 'f8',
+                              ('member', 'level', 'time', 'dtime', 'lat', 'lon'),
+                              chunksizes=chunks, zlib=complevel > 0, complevel=complevel, fill_value=np.nan)
+        for k, val in stda.attrs.items():
+            v.setncattr(k, val if not isinstance(val, bool) else int(val))
+        ds.createVariable('present', 'i1', ('level', 'time', 'dtime'), fill_value=0)  # 场是否已写入
+        return ds
+
+    @staticmethod
+    def _index(values, value):
+        idx = np.where(values == value)[0]
+        return int(idx[0]) if len(idx) > 0 else None
+
+    def append(self, stda, is_overwrite=True):
+        '''
+
+        [将stda按场追加到合并缓存中，网格(member/lat/lon)必须与已有缓存一致]
+
+        Arguments:
+            stda {[stda]} -- [stda格式网格数据]
+
+        Keyword Arguments:
+            is_overwrite {bool} -- [已存在的场是否覆盖] (default: {True})
+        '''
+        stda = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+        with self._lock:
+            ds = nc.Dataset(self.path, 'a') if self.exists() else self._create(stda)
+            try:
+                if ds.dimensions['member'].size != stda['member'].size or \
+                        not np.allclose(ds['lat'][:], stda['lat'].values) or not np.allclose(ds['lon'][:], stda['lon'].values):
+                    raise Exception('stda grid is not consistent with {}'.format(self.path))
+
+                levels = np.asarray(ds['level'][:])
+                times = np.asarray(ds['time'][:])
+                dtimes = np.asarray(ds['dtime'][:])
+                present = ds['present']
+                data = ds['data']
+                for ilvl, lvl in enumerate(stda['level'].values):
+                    il = self._index(levels, lvl)
+                    if il is None:
+                        il = len(levels)
+                        ds['level'][il] = lvl
+                        levels = np.append(levels, lvl)
+                    for itm, tm in enumerate(_to_seconds(stda['time'].values)):
+                        it = self._index(times, tm)
+                        if it is None:
+                            it = len(times)
+                            ds['time'][it] = tm
+                            times = np.append(times, tm)
+                        for idt, dt in enumerate(stda['dtime'].values):
+                            idd = self._index(dtimes, dt)
+                            if idd is None:
+                                idd = len(dtimes)
+                                ds['dtime'][idd] = dt
+                                dtimes = np.append(dtimes, dt)
+                            if not is_overwrite and il < present.shape[0] and it < present.shape[1] and idd < present.shape[2] \
+                                    and present[il, it, idd] == 1:
+                                continue
+                            data[:, il, it, idd, :, :] = stda.values[:, ilvl, itm, idt, :, :]
+                            present[il, it, idd] = 1
+            finally:
+                ds.close()
+
+    def coords(self):
+        '''[已存储的level/time/dtime坐标及present标记]'''
+        with self._lock:
+            with nc.Dataset(self.path, 'r') as ds:
+                return {
+                    'level': np.asarray(ds['level'][:]),
+                    'time': _from_seconds(ds['time'][:]),
+                    'dtime': np.asarray(ds['dtime'][:]),
+                    'present': np.asarray(ds['present'][:]),
+                }
+
+    def contains(self, levels=None, times=None, dtimes=None):
+        '''[是否包含所有请求的场，参数为None代表该维度不限制]'''
+        if not self.exists():
+            return False
+        c = self.coords()
+        try:
+            il = self._select(c['level'], levels)
+            it = self._select(_to_seconds(c['time']), None if times is None else _to_seconds(times))
+            idd = self._select(c['dtime'], dtimes)
+        except KeyError:
+            return False
+        return bool(np.all(c['present'][np.ix_(il, it, idd)] == 1))
+
+    @staticmethod
+    def _select(values, wanted, strict=True):
+        # 按请求顺序返回索引，strict=True时不存在的抛出KeyError，否则跳过
+        if wanted is None:
+            return list(range(len(values)))
+        idx = []
+        for w in np.atleast_1d(wanted):
+            i = np.where(values == w)[0]
+            if len(i) == 0:
+                if strict:
+                    raise KeyError(w)
+                continue
+            idx.append(int(i[0]))
+        return idx
+
+    @staticmethod
+    def _read_index(idx):
+        # 连续索引转成slice，按chunk连续读取
+        if len(idx) > 0 and list(idx) == list(range(idx[0], idx[0] + len(idx))):
+            return slice(idx[0], idx[0] + len(idx))
+        return idx
+
+    def read(self, levels=None, times=None, dtimes=None, extent=None, x_percent=0, y_percent=0):
+        '''
+
+        [读取4D数据块，不存在的level/time/dtime跳过]
+
+        Keyword Arguments:
+            levels {[list]} -- [层次列表，None代表全部] (default: {None})
+            times {[list]} -- [起报时间列表，None代表全部] (default: {None})
+            dtimes {[list]} -- [预报时效列表，None代表全部] (default: {None})
+            extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
+            x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+            y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+
+        Returns:
+            [stda] -- [stda格式数据，无数据时返回None]
+        '''
+        with self._lock:
+            with nc.Dataset(self.path, 'r') as ds:
+                ds.set_auto_mask(False)
+                all_levels = np.asarray(ds['level'][:])
+                all_times = np.asarray(ds['time'][:])
+                all_dtimes = np.asarray(ds['dtime'][:])
+                lat = np.asarray(ds['lat'][:])
+                lon = np.asarray(ds['lon'][:])
+                present = np.asarray(ds['present'][:])
+
+                il = self._select(all_levels, levels, strict=False)
+                it = self._select(all_times, None if times is None else _to_seconds(times), strict=False)
+                idd = self._select(all_dtimes, dtimes, strict=False)
+                if len(il) == 0 or len(it) == 0 or len(idd) == 0:
+                    return None
+                sub = present[np.ix_(il, it, idd)]
+                # 去掉完全没有数据的level/time/dtime
+                il = [i for k, i in enumerate(il) if sub[k].any()]
+                it = [i for k, i in enumerate(it) if sub[:, k].any()]
+                idd = [i for k, i in enumerate(idd) if sub[:, :, k].any()]
+                if len(il) == 0 or len(it) == 0 or len(idd) == 0:
+                    return None
+
+                ilat = np.arange(lat.size)
+                ilon = np.arange(lon.size)
+                if extent is not None:
+                    delt_x = (extent[1] - extent[0]) * x_percent
+                    delt_y = (extent[3] - extent[2]) * y_percent
+                    ilon = np.where((lon >= extent[0] - delt_x) & (lon <= extent[1] + delt_x))[0]
+                    ilat = np.where((lat >= extent[2] - delt_y) & (lat <= extent[3] + delt_y))[0]
+                    if ilat.size == 0 or ilon.size == 0:
+                        return None
+                lat_slice = slice(int(ilat[0]), int(ilat[-1]) + 1)
+                lon_slice = slice(int(ilon[0]), int(ilon[-1]) + 1)
+
+                # 按排序后的索引读取（尽量为连续chunk），再按照请求顺序重排
+                reads = []
+                for idx in (il, it, idd):
+                    sidx = sorted(idx)
+                    reads.append((self._read_index(sidx), [sidx.index(i) for i in idx]))
+                values = ds['data'][:, reads[0][0], reads[1][0], reads[2][0], lat_slice, lon_slice]
+                values = np.asarray(values)[:, reads[0][1]][:, :, reads[1][1]][:, :, :, reads[2][1]]
+
+                member = [str(m) for m in ds['member'][:]]
+                attrs = {k: ds['data'].getncattr(k) for k in ds['data'].ncattrs() if k != '_FillValue'}
+
+        stda = xr.DataArray(values,
+                            coords=[('member', member), ('level', all_levels[il]), ('time', _from_seconds(all_times[it])),
+                                    ('dtime', all_dtimes[idd]), ('lat', lat[lat_slice]), ('lon', lon[lon_slice])],
+                            attrs=attrs)
+        stda.name = attrs.get('var_name', None)
+        return stda
+
+
+def migrate_custom_cache(data_name='custom', var_name=None, remove=False):
+    '''
+
+    [将CUSTOM_DATA下逐场存放的自定义缓存迁移到合并缓存中]
+
+    Keyword Arguments:
+        data_name {str} -- [模式名] (default: {'custom'})
+        var_name {[str]} -- [要素名]
+        remove {bool} -- [迁移后是否删除原文件] (default: {False})
+
+    Returns:
+        [str] -- [合并缓存文件路径]
+    '''
+    cache_dir = os.path.join(CONFIG.get_cache_dir(), 'CUSTOM_DATA', data_name, var_name)
+    fnames = sorted(glob.glob(os.path.join(cache_dir, '*.nc')) + glob.glob(os.path.join(cache_dir, '*', '*.nc')))
+    store = StdaStore(get_custom_store_file(data_name, var_name))
+    for fname in fnames:
+        try:
+            stda = xr.load_dataarray(fname)
+            store.append(stda)
+        except Exception as e:
+            _log.info('migrate {} failed: {}'.format(fname, str(e)))
+            continue
+        if remove:
+            os.remove(fname)
+    _log.info('migrate {} files to {}'.format(len(fnames), store.path))
+    return store.path
+
+
+def migrate_era5_cache(var_name=None, extent=[50, 160, 0, 70], remove=False):
+    '''
+
+    [将ERA5_DATA下逐时次逐层次存放的era5缓存迁移到合并缓存中，缓存文件的时间为世界时，合并缓存中为stda格式（北京时）]
+
+    Keyword Arguments:
+        var_name {[str]} -- [要素名]
+        extent {list} -- [缓存数据区域] (default: {[50, 160, 0, 70]})
+        remove {bool} -- [迁移后是否删除原文件] (default: {False})
+
+    Returns:
+        [str] -- [合并缓存文件路径]
+    '''
+    import datetime
+    from metdig.io import era5
+
+    era5_dir = os.path.join(CONFIG.get_cache_dir(), 'ERA5_DATA')
+    ext = '{}_{}_{}_{}.nc'.format(extent[0], extent[1], extent[2], extent[3])
+    fnames = sorted(glob.glob(os.path.join(era5_dir, '*', 'hourly', var_name, '*_' + ext)) +
+                    glob.glob(os.path.join(era5_dir, '*', 'hourly', var_name, '*', '*_' + ext)))
+
+    store = StdaStore(get_era5_store_file(var_name, extent))
+    for fname in fnames:
+        try:
+            utc_time = datetime.datetime.strptime(os.path.basename(fname)[:12], '%Y%m%d%H%M')
+            parent = os.path.basename(os.path.dirname(fname))
+            level = int(parent) if parent != var_name else None
+            stda = era5.get_model_grid(init_time=utc_time + datetime.timedelta(hours=8), var_name=var_name, level=level,
+                                       extent=extent, force_local=True)
+            store.append(stda)
+        except Exception as e:
+            _log.info('migrate {} failed: {}'.format(fname, str(e)))
+            continue
+        if remove:
+            os.remove(fname)
+    _log.info('migrate {} files to {}'.format(len(fnames), store.path))
+    return store.path
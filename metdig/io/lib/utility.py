@@ -252,3 +252,29 @@ def obs_rename_colname(data):
     }
 
     return data.rename(columns=name_dict)
+
+
+def obs_concat_columns(datas, columns):
+    '''
+    多个时次的站点DataFrame按列拼接成numpy数组字典，每列只分配一次，某个时次缺少的列填充为nan
+    '''
+    datas = [data for data in datas if data is not None and len(data) > 0]
+    total = sum(len(data) for data in datas)
+    result = {}
+    for name in columns:
+        arrays = [data[name].to_numpy() if name in data.columns else None for data in datas]
+        dtypes = [a.dtype for a in arrays if a is not None]
+        if any(a is None for a in arrays):
+            dtypes.append(np.dtype('float64'))
+        try:
+            dtype = np.result_type(*dtypes)
+        except TypeError:
+            dtype = np.dtype('object')
+        out = np.empty(total, dtype=dtype)
+        start = 0
+        for data, a in zip(datas, arrays):
+            end = start + len(data)
+            out[start:end] = np.nan if a is None else a
+            start = end
+        result[name] = out
+    return result
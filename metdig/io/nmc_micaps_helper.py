@@ -6,6 +6,8 @@ nmc_met_io.retrieve_micaps_server的拓展方法，后续若nmc_met_io有相同
 
 import json
 import time
+import bisect
+import threading
 import datetime
 import numpy as np
 import xarray as xr
@@ -19,6 +21,123 @@ from nmc_met_io import DataBlock_pb2
 from nmc_met_io.retrieve_micaps_server import GDSDataService
 
 
+# 目录文件列表缓存的有效期（秒），过期后再次查询时刷新
+OBS_FILELIST_TTL = 60
+
+_obs_file_indexes = {}
+_obs_file_indexes_lock = threading.Lock()
+
+
+def _get_latest_filename(directory, suffix='*'):
+    # 只获取目录下最新的一个文件名，失败返回None
+    try:
+        service = GDSDataService()
+        status, response = service.getLatestDataName(directory, suffix)
+    except Exception:
+        return None
+    if status != 200:
+        return None
+    StringResult = DataBlock_pb2.StringResult()
+    StringResult.ParseFromString(response)
+    return StringResult.name or None
+
+
+class _ObsFileIndex(object):
+    '''
+    [目录下实况文件的时间索引，文件名及时间按时间升序保存，最近时间及时间范围查询通过bisect完成]
+    '''
+
+    def __init__(self, directory, filename_format):
+        self.directory = directory
+        self.filename_format = filename_format
+        self.times = []  # 升序
+        self.names = []
+        self.last_name = None  # 已解析过的最大文件名
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def _update(self, fnames):
+        # 去掉服务器上已不存在的文件，只解析比last_name新的文件名
+        fnames = set(fnames)
+        if any(name not in fnames for name in self.names):
+            keep = [i for i, name in enumerate(self.names) if name in fnames]
+            self.times = [self.times[i] for i in keep]
+            self.names = [self.names[i] for i in keep]
+
+        new = []
+        for name in fnames:
+            if self.last_name is not None and name <= self.last_name:
+                continue
+            try:
+                new.append((datetime.datetime.strptime(name, self.filename_format), name))
+            except ValueError:
+                continue  # 不符合文件名格式的文件
+        if not new:
+            return
+        new.sort()
+        if self.times and new[0][0] < self.times[-1]:
+            # 新文件的时间早于已有文件（文件名顺序与时间顺序不一致），整体重新排序
+            pairs = sorted(list(zip(self.times, self.names)) + new)
+            self.times = [p[0] for p in pairs]
+            self.names = [p[1] for p in pairs]
+        else:
+            self.times += [p[0] for p in new]
+            self.names += [p[1] for p in new]
+        newest = max(p[1] for p in new)
+        self.last_name = newest if self.last_name is None else max(self.last_name, newest)
+
+    def refresh(self, force=False):
+        '''[过期后刷新：最新文件名未变化时只延长有效期，否则重新获取文件列表并增量解析新文件]'''
+        with self.lock:
+            now = time.time()
+            if not force and now < self.expires:
+                return
+            if not force and self.last_name is not None and _get_latest_filename(self.directory) == self.last_name:
+                self.expires = now + OBS_FILELIST_TTL
+                return
+            fnames = nmc_micaps_io.get_file_list(self.directory)
+            self._update(fnames)
+            self.expires = now + OBS_FILELIST_TTL
+
+    def latest(self):
+        if not self.names:
+            return None, None
+        return self.names[-1], self.times[-1]
+
+    def nearest(self, obs_time):
+        '''[离obs_time最近的文件，距离相同时取较晚的时间]'''
+        if not self.times:
+            return None, None
+        i = bisect.bisect_left(self.times, obs_time)
+        if i >= len(self.times):
+            i = len(self.times) - 1
+        elif i > 0 and obs_time - self.times[i - 1] < self.times[i] - obs_time:
+            i = i - 1
+        return self.names[i], self.times[i]
+
+    def between(self, obs_st_time=None, obs_ed_time=None):
+        '''[时间范围[obs_st_time, obs_ed_time]内的文件，时间从大到小排列]'''
+        i0 = 0 if obs_st_time is None else bisect.bisect_left(self.times, obs_st_time)
+        i1 = len(self.times) if obs_ed_time is None else bisect.bisect_right(self.times, obs_ed_time)
+        return self.names[i0:i1][::-1], self.times[i0:i1][::-1]
+
+
+def _get_obs_file_index(directory, filename_format):
+    key = (directory, filename_format)
+    with _obs_file_indexes_lock:
+        if key not in _obs_file_indexes:
+            _obs_file_indexes[key] = _ObsFileIndex(directory, filename_format)
+        index = _obs_file_indexes[key]
+    index.refresh()
+    return index
+
+
+def clear_obs_filelist_cache():
+    '''[清空目录文件列表缓存]'''
+    with _obs_file_indexes_lock:
+        _obs_file_indexes.clear()
+
+
 def get_obs_filename(directory, filename_format, obs_time=None, isnearesttime=False):
     """[获取实况数据文件名以及日期]
 
@@ -28,25 +147,18 @@ def get_obs_filename(directory, filename_format, obs_time=None, isnearesttime=Fa
         obs_time ([dateime], optional): [需要读取的实况时间]. Defaults to None.
         isnearesttime (bool, optional): [如果obs_time非空，是否需要读取离obs_time最近的实况]. Defaults to False.
     """
-    if obs_time is None:
-        fnames = nmc_micaps_io.get_file_list(directory, latest=1) # 此方法如果遇到文件量多的情况会有点慢，后续看是否能优化
-        if len(fnames) == 0:
+    if obs_time is None or isnearesttime:
+        # 目录文件列表缓存OBS_FILELIST_TTL秒，期间的查询不再访问服务器
+        index = _get_obs_file_index(directory, filename_format)
+        if obs_time is None:
+            filename, filetime = index.latest()  # obs_time为空，获取最新的
+        else:
+            filename, filetime = index.nearest(obs_time)  # 离obs_time最近的一个
+        if filename is None:
             raise Exception('Can not retrieve data from ' + directory)
-        filename = fnames[0]  # obs_time为空，获取第一个就是最新的
     else:
-        if isnearesttime:
-            fnames = nmc_micaps_io.get_file_list(directory)  # 目录下所有文件名， 此方法如果遇到文件量多的情况会有点慢，后续看是否能优化
-            if len(fnames) == 0:
-                raise Exception('Can not retrieve data from ' + directory)
-            fnames.sort(reverse=True)  # 按照日期从大到小排序
-            times = list(map(lambda x: datetime.datetime.strptime(x, filename_format), fnames))  # 目录下所有文件名的日期
-            timestamps = list(map(lambda x: time.mktime(x.timetuple()), times))  # 目录下所有文件名的日期时间戳
-            idx = idx = np.argmin(np.abs(np.array(timestamps) - time.mktime(obs_time.timetuple())))  # 离obs_time最近的一个idx
-            nearesttime = times[idx]  # 离obs_time最近的一个日期
-            filename = datetime.datetime.strftime(nearesttime, filename_format)
-        else:
-            filename = datetime.datetime.strftime(obs_time, filename_format)
-    filetime = datetime.datetime.strptime(filename, filename_format)  # 文件名的日期
+        filename = datetime.datetime.strftime(obs_time, filename_format)
+        filetime = datetime.datetime.strptime(filename, filename_format)  # 文件名的日期
     return filename, filetime
 
 
@@ -56,18 +168,16 @@ def get_obs_filenames(directory, filename_format, obs_st_time=None, obs_ed_time=
     Args:
         directory ([str]): [cassandra中的目录，如：RADARMOSAIC/CREF/]
         filename_format ([str]): [cassandra中的文件名，必须带日期格式化的字符串，能用strftime正常格式化的字符串，如：ACHN_CREF_%Y%m%d_%H%M%S.BIN]
-        obs_st_time ([dateime], optional): [description]. Defaults to None.
-        obs_ed_time ([dateime], optional): [description]. Defaults to None.
+        obs_st_time ([dateime], optional): [开始时间，None代表不限制]. Defaults to None.
+        obs_ed_time ([dateime], optional): [结束时间，None代表不限制]. Defaults to None.
+
+    Returns:
+        [list, list] -- [日期范围内的文件名及时间，时间从大到小排列]
     """
-    fnames = nmc_micaps_io.get_file_list(directory)  # 目录下所有文件名， 此方法如果遇到文件量多的情况会有点慢，后续看是否能优化
-    if len(fnames) == 0:
+    index = _get_obs_file_index(directory, filename_format)
+    if not index.names:
         raise Exception('Can not retrieve data from ' + directory)
-    fnames.sort(reverse=True)  # 按照日期从大到小排序
-    fnames = np.array(fnames)
-    times = np.vectorize(lambda x: datetime.datetime.strptime(x, filename_format))(fnames)  # 目录下所有文件名的日期
-    fnames = fnames[(times >= obs_st_time) & (times <= obs_ed_time)]  # 日期范围内的文件名
-    ftimes = list(map(lambda x: datetime.datetime.strptime(x, filename_format), fnames))  # 日期范围内的时间
-    return list(fnames), ftimes
+    return index.between(obs_st_time, obs_ed_time)
 
 
 def get_wind_profiler(directory, filename=None, suffix="*.JSON", dropna=True, cache=True, cache_clear=True):
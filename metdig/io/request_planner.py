@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+多要素读取请求计划：onestep产品先声明需要的(要素, 层次, 时效)，去重合并后一次性并发读取。
+在with语句内，metdig.io.get_model_grid遇到已计划的请求直接返回已读取的数据，避免complexgrid_var等读取函数重复读取同一个场。
+
+Example:
+    plan = RequestPlanner(data_source='cassandra', data_name='ecmwf', init_time=init_time, fhour=24, extent=map_extent)
+    plan.add(['u', 'v'], level=[200, 500, 850])
+    plan.add(['prmsl', 'tcwv', 'psfc'])
+    datas = plan.fetch(max_workers=8)  # {('u', 200, 24): stda, ...}
+    with plan:
+        u500 = get_model_grid(data_source='cassandra', data_name='ecmwf', init_time=init_time, fhour=24, var_name='u', level=500, extent=map_extent)
+
+'''
+
+import threading
+
+from metdig.io.lib import utility as utl
+from metdig.io.lib import fetch_engine
+
+import logging
+_log = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# 参与请求匹配的参数，调用时含有其它参数的请求不从计划中获取
+_key_parms = ['data_source', 'init_time', 'fhour', 'data_name', 'var_name', 'level', 'extent', 'x_percent', 'y_percent']
+
+
+def _active_plans():
+    if not hasattr(_local, 'plans'):
+        _local.plans = []
+    return _local.plans
+
+
+def _request_key(data_source=None, init_time=None, fhour=None, data_name=None, var_name=None, level=None,
+                 extent=None, x_percent=0, y_percent=0):
+    # 地面层统一为None，extent统一为tuple
+    if not level:
+        level = None
+    if extent is not None:
+        extent = tuple(float(i) for i in extent)
+    return (data_source, init_time, fhour, data_name, var_name, level, extent, x_percent, y_percent)
+
+
+def lookup(data_source, kwargs):
+    '''
+
+    [从当前线程中激活的请求计划中查找数据，未计划的请求返回(False, None)]
+
+    Arguments:
+        data_source {[str]} -- [数据源]
+        kwargs {[dict]} -- [metdig.io.get_model_grid的kwargs]
+
+    Returns:
+        [tuple] -- [(是否命中, stda)]
+    '''
+    plans = _active_plans()
+    if not plans:
+        return False, None
+    if not set(kwargs.keys()).issubset(_key_parms):
+        return False, None
+    key = _request_key(data_source=data_source, **kwargs)
+    for plan in reversed(plans):
+        hit, data = plan._get_by_key(key)
+        if hit:
+            return hit, data
+    return False, None
+
+
+class RequestPlanner(object):
+    def __init__(self, data_source=None, data_name=None, init_time=None, fhour=None, extent=None, x_percent=0, y_percent=0):
+        '''
+
+        [多要素读取请求计划]
+
+        Keyword Arguments:
+            data_source {[str]} -- [数据源]
+            data_name {[str]} -- [模式名]
+            init_time {[datetime]} -- [起报时间]
+            fhour {[int32]} -- [默认预报时效，add时不传fhour则使用该时效]
+            extent {[tuple]} -- [裁剪区域，如(50, 150, 0, 65)] (default: {None})
+            x_percent {number} -- [根据裁剪区域经度方向扩充百分比] (default: {0})
+            y_percent {number} -- [根据裁剪区域纬度方向扩充百分比] (default: {0})
+        '''
+        self.data_source = data_source
+        self.data_name = data_name
+        self.init_time = init_time
+        self.fhour = fhour
+        self.extent = extent
+        self.x_percent = x_percent
+        self.y_percent = y_percent
+
+        self._requests = {}  # key: (var_name, level, fhour), value: get_model_grid的kwargs
+        self._datas = {}  # key: _request_key, value: stda或None(读取失败)
+
+    def add(self, var_names, level=None, fhour=None):
+        '''
+
+        [声明需要读取的要素，var_names/level/fhour均可为列表，按照笛卡尔积展开，重复的请求自动合并]
+
+        Arguments:
+            var_names {[str or list]} -- [要素名]
+
+        Keyword Arguments:
+            level {[int or list]} -- [层次，不传代表地面层] (default: {None})
+            fhour {[int or list]} -- [预报时效，不传代表使用默认时效] (default: {None})
+
+        Returns:
+            [RequestPlanner] -- [self，可链式调用]
+        '''
+        fhours = utl.parm_tolist(self.fhour if fhour is None else fhour)
+        for var_name in utl.parm_tolist(var_names):
+            for lvl in utl.parm_tolist(level):
+                for fh in fhours:
+                    lvl = lvl if lvl else None
+                    if (var_name, lvl, fh) in self._requests:
+                        continue
+                    self._requests[(var_name, lvl, fh)] = dict(
+                        data_source=self.data_source, init_time=self.init_time, fhour=fh, data_name=self.data_name,
+                        var_name=var_name, level=lvl, extent=self.extent, x_percent=self.x_percent, y_percent=self.y_percent)
+        return self
+
+    def requests(self):
+        '''[返回去重后的(var_name, level, fhour)列表]'''
+        return list(self._requests.keys())
+
+    def fetch(self, max_workers=4, timeout=None, retries=0):
+        '''
+
+        [并发读取所有已声明且尚未读取的请求]
+
+        Keyword Arguments:
+            max_workers {int} -- [最大线程数] (default: {4})
+            timeout {[number]} -- [单次读取超时时间（秒），None代表不超时] (default: {None})
+            retries {int} -- [单次读取失败后的重试次数] (default: {0})
+
+        Returns:
+            [dict] -- [键为(var_name, level, fhour)，值为stda，读取失败的请求值为None]
+        '''
+        from metdig.io import get_model_grid
+
+        todo = [(k, kw) for k, kw in self._requests.items() if _request_key(**kw) not in self._datas]
+        tasks = [dict(kw, throwexp=True) for _, kw in todo]
+        datas = fetch_engine.fetch_concurrent(get_model_grid, tasks, max_workers=max_workers, timeout=timeout, retries=retries)
+        for (_, kw), data in zip(todo, datas):
+            self._datas[_request_key(**kw)] = data
+
+        return {k: self.get(*k) for k in self._requests.keys()}
+
+    def get(self, var_name, level=None, fhour=None):
+        '''
+
+        [获取已读取的数据（副本），未读取或读取失败返回None]
+        '''
+        fhour = self.fhour if fhour is None else fhour
+        hit, data = self._get_by_key(_request_key(
+            data_source=self.data_source, init_time=self.init_time, fhour=fhour, data_name=self.data_name,
+            var_name=var_name, level=level, extent=self.extent, x_percent=self.x_percent, y_percent=self.y_percent))
+        return data
+
+    def _get_by_key(self, key):
+        if key not in self._datas:
+            return False, None
+        data = self._datas[key]
+        if data is None:
+            return True, None
+        return True, data.copy(deep=True)  # 返回副本，防止调用方修改共享数据
+
+    def __enter__(self):
+        _active_plans().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_plans().remove(self)
+        return False
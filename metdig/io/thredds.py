@@ -12,6 +12,7 @@ import metdig.utl as mdgstda
 
 from metdig.io.lib import thredds_model_cfg
 from metdig.io.lib import utility as utl
+from metdig.io.lib import memory_cache
 
 from metdig.io.lib import config as CONFIG
 
@@ -19,6 +20,7 @@ import logging
 _log = logging.getLogger(__name__)
 
 
+@memory_cache.cached('thredds')
 def get_model_grid(init_time=None, data_name=None,  var_name=None, level=None, extent=None, x_percent=0, y_percent=0, **kwargs):
     '''
 
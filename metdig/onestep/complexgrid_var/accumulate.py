@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+'''
+累积量（降水等）的前缀和计算：
+同一(data_source, data_name, init_time, extent, var_name)的基础场只读取一次并累加成前缀和，
+任意时段的累积量为两个前缀和之差，前缀和按字节数限制大小，超出后按最近最少使用(LRU)淘汰。
+'''
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from metdig.io import get_model_grid
+
+import logging
+_log = logging.getLogger(__name__)
+
+__all__ = [
+    'Accumulator',
+    'get_accumulator',
+    'set_accumulator_cache_size',
+    'clear_accumulator_cache',
+]
+
+# 前缀和缓存，键为(data_source, data_name, init_time, extent, var_name)，超出字节数后按最近最少使用淘汰
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_max_bytes = 1024 ** 3
+
+# 逐时段数据按分析时间读取的数据(起报时间不同，fhour=0)，此处为临时设置，未来需要考虑下架构改进
+_ANALYSIS_DATA_NAMES = ('era5', 'cldas')
+
+
+class Accumulator(object):
+    '''
+    [累积量前缀和，var_name为从起报时刻开始的累积量(如rain)时，前缀和即为读取的场；
+    var_name为逐时段量(如rain01)时，在连续的时间段内逐个累加(float64，缺测按0累加并记录有效值个数)。前缀和以有效时间为索引，
+    (valid_time - atime, valid_time]时段的累积量为两个前缀和之差，所需的基础场只在第一次用到时读取，
+    累加后即丢弃，只保留前缀和及一个用于构造结果的stda模板]
+
+    Example:
+        acc = get_accumulator(data_source='cassandra', data_name='ecmwf', init_time=init_time, extent=extent, var_name='rain')
+        rain06 = acc.window(fhour=24, atime=6)
+    '''
+
+    def __init__(self, data_source=None, data_name=None, init_time=None, extent=None, var_name='rain'):
+        '''
+
+        [初始化]
+
+        Keyword Arguments:
+            data_source {[str]} -- [数据源] (default: {None})
+            data_name {[str]} -- [模式名] (default: {None})
+            init_time {[datetime]} -- [起报时间，分析数据可不传] (default: {None})
+            extent {[tuple]} -- [裁剪区域] (default: {None})
+            var_name {str} -- [基础场要素名，rain为起报开始的累积量，rain01等为逐时段量] (default: {'rain'})
+        '''
+        self.data_source = data_source
+        self.data_name = data_name
+        self.init_time = init_time
+        self.extent = extent
+        self.var_name = var_name
+        self.is_total = var_name in ('rain', )
+        self.is_analysis = data_name in _ANALYSIS_DATA_NAMES
+        self.step = 1 if self.is_total else int(var_name[-2:]) # 逐时段量的时段长度(小时)
+
+        self._lock = threading.Lock()
+        self._template = None # 第一个读取的基础场，用于构造结果stda
+        self._coords = {} # key: 有效时间, value: 该时次基础场的(time, dtime)坐标
+        self._prefix = {} # key: 有效时间, value: 前缀和(ndarray)
+        self._start = None # 逐时段量前缀和的起点，self._prefix[self._start]为0
+        self._end = None
+        self.nbytes = 0 # 前缀和及模板占用的字节数
+
+    def _read(self, valid_time):
+        '''
+        [读取基础场，返回数值(ndarray)，只记录坐标，不保留读取的stda]
+        '''
+        if self.is_analysis:
+            field = get_model_grid(data_source=self.data_source, init_time=valid_time, fhour=0, data_name=self.data_name,
+                                   var_name=self.var_name, extent=self.extent, x_percent=0, y_percent=0, throwexp=False)
+        else:
+            fhour = int((valid_time - self.init_time).total_seconds() // 3600)
+            field = get_model_grid(data_source=self.data_source, init_time=self.init_time, fhour=fhour, data_name=self.data_name,
+                                   var_name=self.var_name, extent=self.extent, x_percent=0, y_percent=0, throwexp=False)
+        if field is None:
+            print('计算累积量时缺少' + valid_time.strftime('%Y年%m月%d日%H时数据'))
+            return None
+        if self._template is None:
+            self._template = field
+            self.nbytes += int(field.nbytes)
+        self._coords[valid_time] = (field['time'].values, field['dtime'].values)
+        return field.values
+
+    def _set_prefix(self, valid_time, value):
+        old = self._prefix.get(valid_time)
+        self.nbytes += _nbytes(value) - _nbytes(old)
+        self._prefix[valid_time] = value
+
+    def _total_prefix(self, valid_time):
+        if not self.is_analysis and valid_time == self.init_time:
+            return 0
+        if valid_time not in self._prefix:
+            values = self._read(valid_time)
+            if values is None:
+                return None
+            self._set_prefix(valid_time, values)
+        return self._prefix[valid_time]
+
+    def _extend(self, start, end):
+        '''
+        [将逐时段量的前缀和扩展到覆盖[start, end]，只读取尚未读取的时段]
+        '''
+        step = timedelta(hours=self.step)
+        if self._start is None:
+            self._start = self._end = start
+            self._set_prefix(start, _ZERO)
+        # 向前扩展：新增时段的和加到已有的所有前缀和上
+        if start < self._start:
+            values = {}
+            offset = _ZERO
+            t = self._start
+            while t > start:
+                values[t] = self._read(t)
+                if values[t] is None:
+                    return False
+                offset = _add(offset, values[t])
+                t = t - step
+            for key in list(self._prefix):
+                self._set_prefix(key, _add(self._prefix[key], offset))
+            t = start
+            self._set_prefix(start, _ZERO)
+            while t < self._start:
+                t = t + step
+                self._set_prefix(t, _add(self._prefix[t - step], values.pop(t)))
+            self._start = start
+        # 向后扩展
+        t = self._end
+        while t < end:
+            values = self._read(t + step)
+            if values is None:
+                return False
+            self._set_prefix(t + step, _add(self._prefix[t], values))
+            t = t + step
+            self._end = t
+        return True
+
+    def window(self, fhour=None, atime=6, valid_time=None):
+        '''
+
+        [(valid_time - atime, valid_time]时段的累积量]
+
+        Keyword Arguments:
+            fhour {[int]} -- [预报时效，分析数据可不传] (default: {None})
+            atime {int} -- [累积时段长度(小时)] (default: {6})
+            valid_time {[datetime]} -- [有效时间，不传则为init_time+fhour] (default: {None})
+
+        Returns:
+            [stda] -- [累积量，属性中的var_name为rainNN，读取失败返回None]
+        '''
+        if valid_time is None:
+            valid_time = self.init_time + timedelta(hours=int(fhour))
+        valid_time = pd.to_datetime(valid_time).to_pydatetime()
+        start_time = valid_time - timedelta(hours=atime)
+
+        with self._lock:
+            if self.is_total:
+                p1 = self._total_prefix(valid_time)
+                p0 = self._total_prefix(start_time)
+                if p1 is None or p0 is None:
+                    return None
+            else:
+                if atime % self.step != 0:
+                    raise Exception('atime must be a multiple of {}'.format(self.step))
+                if not self._extend(start_time, valid_time):
+                    return None
+                p1 = self._prefix[valid_time]
+                p0 = self._prefix[start_time]
+            if self.is_total:
+                data = p1 - p0
+            else:
+                # 与逐时段求和时跳过缺测一致，时段内全部缺测的格点才为nan
+                with np.errstate(invalid='ignore'):
+                    data = np.where(p1[1] - p0[1] > 0, p1[0] - p0[0], np.nan)
+            template = self._template
+            data = np.asarray(data, dtype=template.dtype)
+            time, dtime = self._coords[valid_time]
+        _trim_cache()
+
+        rain = template.copy(deep=False, data=data).assign_coords(time=time, dtime=dtime)
+        rain.attrs = dict(template.attrs)
+        rain.attrs['valid_time'] = atime
+        rain.attrs['var_cn_name'] = str(atime) + '小时降水'
+        rain.attrs['var_name'] = 'rain' + '%02d' % atime
+        return rain
+
+
+# 逐时段量的前缀和为(缺测按0累加的和(float64), 有效值个数)
+_ZERO = (0.0, 0)
+
+
+def _add(prefix, values):
+    if isinstance(values, tuple):
+        return (prefix[0] + values[0], prefix[1] + values[1])
+    valid = ~np.isnan(values)
+    return (prefix[0] + np.where(valid, values, 0).astype('float64'), prefix[1] + valid.astype('int32'))
+
+
+def _nbytes(value):
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return int(getattr(value, 'nbytes', 0))
+
+
+def _trim_cache():
+    # 前缀和在使用过程中增长，每次计算后按字节数淘汰最久未使用的前缀和
+    with _cache_lock:
+        nbytes = sum(acc.nbytes for acc in _cache.values())
+        while nbytes > _cache_max_bytes and _cache:
+            _, acc = _cache.popitem(last=False)
+            nbytes -= acc.nbytes
+
+
+def get_accumulator(data_source=None, data_name=None, init_time=None, extent=None, var_name='rain'):
+    '''
+
+    [获取累积量前缀和，相同(data_source, data_name, init_time, extent, var_name)只创建一次]
+
+    Keyword Arguments:
+        data_source {[str]} -- [数据源] (default: {None})
+        data_name {[str]} -- [模式名] (default: {None})
+        init_time {[datetime]} -- [起报时间，分析数据按有效时间读取，不区分起报时间] (default: {None})
+        extent {[tuple]} -- [裁剪区域] (default: {None})
+        var_name {str} -- [基础场要素名] (default: {'rain'})
+
+    Returns:
+        [Accumulator] -- [累积量前缀和]
+    '''
+    if init_time is not None:
+        init_time = pd.to_datetime(init_time).to_pydatetime()
+    key_init_time = None if data_name in _ANALYSIS_DATA_NAMES else init_time
+    key = (data_source, data_name, key_init_time, None if extent is None else tuple(extent), var_name)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        accumulator = Accumulator(data_source=data_source, data_name=data_name, init_time=init_time,
+                                  extent=extent, var_name=var_name)
+        _cache[key] = accumulator
+    return accumulator
+
+
+def set_accumulator_cache_size(max_bytes):
+    '''
+
+    [设置累积量前缀和缓存的最大字节数]
+
+    Arguments:
+        max_bytes {int} -- [缓存最大字节数]
+    '''
+    global _cache_max_bytes
+    _cache_max_bytes = max_bytes
+    _trim_cache()
+
+
+def clear_accumulator_cache():
+    '''[清空累积量前缀和缓存]'''
+    with _cache_lock:
+        _cache.clear()
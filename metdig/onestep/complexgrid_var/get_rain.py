@@ -5,6 +5,7 @@ import numpy as np
 import xarray as xr
 from datetime import datetime,timedelta
 from metdig.io import get_model_grid
+from metdig.onestep.complexgrid_var.accumulate import get_accumulator
 
 import metdig.utl as mdgstda
 
@@ -19,54 +20,16 @@ def _by_self(data_source=None, init_time=None, fhour=None, data_name=None, var_n
 
 
 def _by_rain(data_source=None, init_time=None, fhour=None,data_name=None, atime=None, extent=(50, 150, 0, 65)):
-    rain1 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name,
-                          var_name='rain', extent=extent, x_percent=0, y_percent=0, throwexp=False)
-    
-    if rain1 is None:
-        return None
-
-    rain = rain1.copy(deep=True)
-    
-    if((fhour - atime) != 0):
-        rain2 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour - atime, data_name=data_name,
-                            var_name='rain', extent=extent, x_percent=0, y_percent=0, throwexp=False)
-
-        if rain1 is None or rain2 is None:
-            return None
-        rain.values = rain1.values - rain2.values
-  
-    attrs=rain1.attrs
-    rain.attrs=attrs
-    rain.attrs['valid_time']=atime
-    rain.attrs['var_cn_name']=str(atime)+'小时降水'
-    rain.attrs['var_name']='rain'+'%02d'%atime
-    return rain
+    # 两个累积降水之差，累积降水场在同一起报时间的多个时效间复用
+    accumulator = get_accumulator(data_source=data_source, data_name=data_name, init_time=init_time, extent=extent, var_name='rain')
+    return accumulator.window(fhour=fhour, atime=atime)
 
 def _by_rain01(data_source=None, init_time=None, fhour=None, data_name=None, atime=None, extent=(50, 150, 0, 65)):
-
-    rain01=[]
-    for iatime in range(0,atime):
-        if(data_name=='era5' or data_name == 'cldas'):  #此处为临时设置，未来需要考虑下架构改进
-            temp = get_model_grid(data_source=data_source, init_time=init_time-timedelta(hours=iatime), fhour=0, data_name=data_name,
-                            var_name='rain01', extent=extent, x_percent=0, y_percent=0, throwexp=False)
-        else:
-            temp = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour-iatime, data_name=data_name,
-                            var_name='rain01', extent=extent, x_percent=0, y_percent=0, throwexp=False)
-        if temp is None:
-            print('计算累积降水时缺少'+(init_time-timedelta(hours=iatime)).strftime('%Y年%m月%d日%H时数据'))
-            return None
-
-        rain01.append(temp)
-    attrs=temp.attrs
+    # 逐小时降水的前缀和之差，逐小时降水场只读取一次
+    accumulator = get_accumulator(data_source=data_source, data_name=data_name, init_time=init_time, extent=extent, var_name='rain01')
     if(data_name=='era5' or data_name == 'cldas'):  #此处为临时设置，未来需要考虑下架构改进
-        rain=xr.concat(rain01,dim='time').sum('time').expand_dims({'time':[init_time]})
-    else:
-        rain=xr.concat(rain01,dim='dtime').sum('dtime').expand_dims({'dtime':[atime]})
-    rain.attrs=attrs
-    rain.attrs['valid_time']=atime
-    rain.attrs['var_cn_name']=str(atime)+'小时降水'
-    rain.attrs['var_name']='rain'+'%02d'%atime
-    return rain
+        return accumulator.window(atime=atime, valid_time=init_time)
+    return accumulator.window(fhour=fhour, atime=atime)
 
 def read_rain(data_source=None, init_time=None, fhour=None, extent=(50, 150, 0, 65),data_name=None, atime=6):
     rain=_by_self(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='rain'+'%02d'%atime, extent=extent)
@@ -149,9 +149,7 @@ def cumulated_precip(data_source='cassandra', data_name='ecmwf', init_time=None,
                                 var_name='rain{:02d}'.format(t_gap), extent=map_extent)
 
     rain = rain_data.copy(deep=True)
-    valid_time = []
-    for itime in range(1, len(rain_data['dtime'].values)):
-        rain.values[:, :, :, itime, :, :] = np.sum(rain_data.values[:, :, :, 0:itime + 1, :, :], axis=3)
+    rain.values = np.cumsum(rain_data.values, axis=3) # 沿dtime的前缀和
     rain.attrs['var_name'] = 'rain'
     rain.attrs['var_cn_name'] = ''
     rain.attrs['valid_time'] = ''
@@ -3,6 +3,7 @@
 import numpy as np
 
 from metdig.io import get_model_grid
+from metdig.io import RequestPlanner
 
 from metdig.onestep.lib.utility import get_map_area
 from metdig.onestep.lib.utility import mask_terrian
@@ -124,23 +125,34 @@ def syn_composite(data_source='cassandra', data_name='ecmwf', init_time=None, fh
     # get area
     map_extent = get_map_area(area)
 
-    # get data
-    vort500, u500, v500 = read_vort_uv(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, level=vort_lev, extent=map_extent)
-    wsp200, u200, v200 = read_wsp(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, level=wsp_lev, extent=map_extent)
-    hgt500 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour,
-                            data_name=data_name, var_name='hgt', level=hgt_lev, extent=map_extent)
-    u850 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='u', level=uv_lev, extent=map_extent)
-    v850 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='v', level=uv_lev, extent=map_extent)
-    prmsl = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='prmsl', extent=map_extent)
-    tcwv = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='tcwv', extent=map_extent)
-
-    # 隐藏被地形遮挡地区
+    # get data，声明所需全部数据，去重后一次性并发读取，read_vort_uv/read_wsp中的u/v不再重复读取
+    plan = RequestPlanner(data_source=data_source, data_name=data_name, init_time=init_time, fhour=fhour, extent=map_extent)
+    plan.add(['vort', 'u', 'v'], level=vort_lev)
+    plan.add(['wsp', 'u', 'v'], level=wsp_lev)
+    plan.add('hgt', level=hgt_lev)
+    plan.add(['u', 'v'], level=uv_lev)
+    plan.add(['prmsl', 'tcwv'])
     if is_mask_terrain:
-        psfc = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='psfc', extent=map_extent)
-        hgt500 = mask_terrian(psfc, hgt500)
-        vort500 = mask_terrian(psfc, vort500)
-        u850 = mask_terrian(psfc, u850)
-        v850 = mask_terrian(psfc, v850)
+        plan.add('psfc')
+    plan.fetch()
+
+    with plan:
+        vort500, u500, v500 = read_vort_uv(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, level=vort_lev, extent=map_extent)
+        wsp200, u200, v200 = read_wsp(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, level=wsp_lev, extent=map_extent)
+        hgt500 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour,
+                                data_name=data_name, var_name='hgt', level=hgt_lev, extent=map_extent)
+        u850 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='u', level=uv_lev, extent=map_extent)
+        v850 = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='v', level=uv_lev, extent=map_extent)
+        prmsl = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='prmsl', extent=map_extent)
+        tcwv = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='tcwv', extent=map_extent)
+
+        # 隐藏被地形遮挡地区
+        if is_mask_terrain:
+            psfc = get_model_grid(data_source=data_source, init_time=init_time, fhour=fhour, data_name=data_name, var_name='psfc', extent=map_extent)
+            hgt500 = mask_terrian(psfc, hgt500)
+            vort500 = mask_terrian(psfc, vort500)
+            u850 = mask_terrian(psfc, u850)
+            v850 = mask_terrian(psfc, v850)
 
     if is_return_data:
         dataret = {'hgt': hgt500, 'u850': u850, 'v850': v850, 'wsp200': wsp200, 'prmsl': prmsl}
@@ -32,6 +32,8 @@ def trajectory(data_source='cassandra', data_name='ecmwf',
                t_s=None, # 追踪起始时间 如果为空则代表全数据时段
                t_e=None, # 追踪终止时间 如果为空则代表全数据时段
                dt=1800, # 追踪时间步长 单位为s
+               method='euler', # 积分方法 euler、rk2或rk4，默认为原算法使用的前向欧拉
+               backend='numpy', # 插值计算方式 numpy或numba，质点数很多时使用numba
                area='全国', # 取数据的区域，绘图时会自动把区域缩小到质点追踪的范围
                is_mask_terrain=True,
                is_return_data=False, is_draw=True, **products_kwargs):
@@ -55,7 +57,9 @@ def trajectory(data_source='cassandra', data_name='ecmwf',
                                                        s_point=points,
                                                        t_s=t_s,
                                                        t_e=t_e,
-                                                       dt=dt)
+                                                       dt=dt,
+                                                       method=method,
+                                                       backend=backend)
     # trajectories = pd.read_csv('d:/trajectories.csv') # 测试
         
     if is_return_data:
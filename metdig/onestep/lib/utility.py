@@ -12,6 +12,7 @@ from functools import wraps
 import datetime
 
 from metdig.utl import utl_stda_grid
+from metdig.utl import utl_stda_interp
 
 
 def cross_extent(st_point=[20, 120.0], ed_point=[50, 130.0], area=None):
@@ -103,6 +104,16 @@ def get_map_area(area):
         raise ValueError('area must be str or list(len=4) or tuple(len=4)')
 
 
+def _interp_to_grid(stda, lon, lat):
+    # 双线性插值到新的经纬度网格上，返回numpy数组，相同网格的插值权重只计算一次
+    # 超出stda网格范围的点按边缘格点线性外推，与interp(kwargs={'fill_value': None})一致
+    lon2d, lat2d = np.meshgrid(lon, lat)
+    interpolator = utl_stda_interp.get_station_interpolator(stda['lon'].values, stda['lat'].values, lon2d.ravel(), lat2d.ravel(),
+                                                            extrapolate=True)
+    values = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon').values
+    return interpolator.interp_values(values).reshape(values.shape[:4] + lon2d.shape)
+
+
 def mask_terrian(psfc, stda_input, get_terrain=False):
     """根据pfsc隐藏地形
 
@@ -122,10 +133,7 @@ def mask_terrian(psfc, stda_input, get_terrain=False):
     if((stda_input.lon.shape[0]==1) and (stda_input.lat.shape[0]==1)):
         psfc_new=psfc.values.repeat(stda_input['level'].size, axis=1)
     else:
-        psfc_new = psfc.interp(lon=stda_input['lon'].values,
-                           lat=stda_input['lat'].values,
-                           kwargs={'fill_value': None},
-                           ).values.repeat(stda_input['level'].size, axis=1)
+        psfc_new = _interp_to_grid(psfc, stda_input['lon'].values, stda_input['lat'].values).repeat(stda_input['level'].size, axis=1)
     pressure=stda_input.level.broadcast_like(stda_input)
     if get_terrain:
         return (pressure-psfc_new).where(pressure-psfc_new > 0)  # 保留psfc-level>=0的，小于0的赋值成nan
@@ -152,10 +160,7 @@ def get_terrian(psfc, pressure, lt0nan=False):
     if((pressure.lon.shape[0] == 1) and (pressure.lat.shape[0] == 1)):
         psfc_new = psfc.values.repeat(pressure['level'].size, axis=1)
     else:
-        psfc_new = psfc.interp(lon=pressure['lon'].values,
-                               lat=pressure['lat'].values,
-                               kwargs={'fill_value': None},
-                              ).values.repeat(pressure['level'].size, axis=1)
+        psfc_new = _interp_to_grid(psfc, pressure['lon'].values, pressure['lat'].values).repeat(pressure['level'].size, axis=1)
     pressure=pressure.level.broadcast_like(pressure)
     if lt0nan:
         return (pressure - psfc_new).where(pressure - psfc_new > 0)  # 保留psfc-level>=0的，小于0的赋值成nan
@@ -32,8 +32,31 @@ def easy_sel_point(zoom_start=5, openinwebbrowser=False):
     return m
 
 
+def _benchmark_import_time(modules=['metdig', 'metdig.io', 'metdig.io.cassandra', 'metdig.utl', 'metdig.cal', 'metdig.graphics'], repeat=3):
+    '''
+    每个模块在新的python进程中导入，统计导入耗时（取repeat次中的最小值）
+    '''
+    import sys
+    import subprocess
+
+    code = 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'
+    for module in modules:
+        costs = []
+        for i in range(repeat):
+            out = subprocess.run([sys.executable, '-c', code.format(module)], capture_output=True, text=True)
+            if out.returncode != 0:
+                costs = None
+                print('import {} failed: {}'.format(module, out.stderr.strip().split('\n')[-1]))
+                break
+            costs.append(float(out.stdout.strip().split('\n')[-1]))
+        if costs:
+            print('import {}: {:.3f}s'.format(module, min(costs)))
+
+
 if __name__ == '__main__':
 
+    _benchmark_import_time()
+
     easy_sel_point()
 
     pass
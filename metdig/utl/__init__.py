@@ -1,4 +1,5 @@
 from .utl_stda_attrs import *
 from .utl_stda_grid import *
 from .utl_stda_station import *
+from .utl_stda_interp import *
 from .utl_units import *
\ No newline at end of file
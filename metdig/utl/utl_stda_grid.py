@@ -787,7 +787,7 @@ class __STDADataArrayAccessor(object):
         return self.calc_area(extent=extent, set_point_lon=set_point_lon, set_point_lat=set_point_lat, skipna=skipna, cal_type='area')
 
 
-    def interp_tosta(self, lon, lat, id=None, other={}, method='linear'):
+    def interp_tosta(self, lon, lat, id=None, other={}, method='linear', interpolator=None):
         """[插值到站点上，返回stda站点数据]
 
         Args:
@@ -796,6 +796,7 @@ class __STDADataArrayAccessor(object):
             id ([number or str or list], optional): [站号，不填站号则默认从1开始递增]
             other ([dict], optional): [其它坐标信息，以字典方式传参，值可以是列表可以是值，如：other={'city': '北京', 'province': '北京'}]. Defaults to {}.
             method ([str], optional): [interp function(linear or nearest) ]. Defaults to linear.
+            interpolator ([StationInterpolator], optional): [预先计算好的插值权重，不传时linear/nearest自动从插值权重缓存中获取]. Defaults to None.
         """
         def _to_list(parm):
             if isinstance(parm, list):
@@ -812,73 +813,45 @@ class __STDADataArrayAccessor(object):
 
         if id is None:
             id = np.arange(1, lon.size + 1)
+        id = np.array(_to_list(id))
 
         # 其它坐标信息名称
         points_keys = list(set(other.keys()).difference(set(['lon', 'lat', 'id'])))
 
         # get points data
-        points_xr = self._xr.interp(lon=('points', lon), lat=('points', lat), method=method)
-        # print(points_xr)
-        # print(points_xr.values.shape)
+        if interpolator is None and method in ('linear', 'nearest'):
+            # 相同网格和站点的插值权重只计算一次
+            interpolator = mdgstda.get_station_interpolator(self._xr['lon'].values, self._xr['lat'].values, lon, lat, method=method)
+        if interpolator is not None:
+            points_xr = interpolator.interp(self._xr)
+        else:
+            points_xr = self._xr.interp(lon=('points', lon), lat=('points', lat), method=method)
+        points_xr = points_xr.transpose('member', 'level', 'time', 'dtime', 'points')
 
         # get attrs
         attrs = deepcopy(self._xr.attrs)
         attrs['data_start_columns'] = 6 + len(points_keys)
 
         # points data to pd.DataFrame
-        ''''
-        # points = {k: _to_list(other[k]) for k in points_keys}
-        # columns = ['level', 'time', 'dtime', 'id', 'lon', 'lat'] + points_keys + list(self._xr['member'].values)
-        # lines = []
-        # for i_lv, _lv in enumerate(points_xr['level'].values):
-        #     for i_t, _t in enumerate(points_xr['time'].values):
-        #         for i_d, _d in enumerate(points_xr['dtime'].values):
-        #             _d = int(_d)
-        #             for i_id, _id in enumerate(id):
-        #                 _other = [points[_o][i_id] for _o in points_keys]  # 除去lon lat id之外的其它坐标信息名称对应的数据
-        #                 _lon = lon[i_id]
-        #                 _lat = lat[i_id]
-        #                 _data = points_xr.values[:, i_lv, i_t, i_d, i_id]
-        #                 line = [_lv, _t, _d, _id, _lon, _lat] + _other + list(_data)
-        #                 lines.append(line)
-
-        # df = pd.DataFrame(lines, columns=columns)
-
-        # df.attrs = attrs
-
-        # return df
-        '''
-        
-        name = self._xr.name
-        if name is None:
-            name = 'required_name'
-        df = points_xr.to_dataframe(name=name).reset_index()
-
-        if self._xr['member'].values.size == 1:
-            member = self._xr['member'].values[0]
-            newdf = df.rename(columns={name: member})
-            newdf = pd.merge(newdf, pd.DataFrame({'id': id, 'points': np.arange(len(id))}), on='points', how='left')
-            newdf = newdf.drop(columns=['member', 'points'])
-            newdf = newdf[['level', 'time', 'dtime', 'id', 'lon', 'lat'] + [member]]
-        else:
-            # 待优化 循环member效率比较低
-            newdf = None
-            for member in self._xr['member'].values:
-                _ = df[df['member'] == member]
-                _ = _.rename(columns={name: member})
-                _ = pd.merge(_, pd.DataFrame({'id': id, 'points': np.arange(len(id))}), on='points', how='left')
-                _ = _.drop(columns=['member', 'points'])
-                _ = _[['level', 'time', 'dtime', 'id', 'lon', 'lat'] + [member]]
-                if newdf is None:
-                    newdf = _.copy(deep=True)
-                    newdf = newdf.reset_index(drop=True)
-                else:
-                    newdf[member] = _[member]
-
+        # 按照level/time/dtime/points的顺序展开成行，所有member一次reshape成列，不再逐member筛选合并
+        nlv, nt, nd, ns = points_xr['level'].size, points_xr['time'].size, points_xr['dtime'].size, points_xr['points'].size
+        columns = {}
+        columns['level'] = np.repeat(points_xr['level'].values, nt * nd * ns)
+        columns['time'] = np.tile(np.repeat(points_xr['time'].values, nd * ns), nlv)
+        columns['dtime'] = np.tile(np.repeat(points_xr['dtime'].values, ns), nlv * nt)
+        columns['id'] = np.tile(id, nlv * nt * nd)
+        columns['lon'] = np.tile(points_xr['lon'].values, nlv * nt * nd)
+        columns['lat'] = np.tile(points_xr['lat'].values, nlv * nt * nd)
+        for k in points_keys:
+            columns[k] = np.tile(np.broadcast_to(np.array(_to_list(other[k])), (ns,)), nlv * nt * nd)
+        values = points_xr.values.reshape(points_xr['member'].size, -1)
+        for i_m, member in enumerate(self._xr['member'].values):
+            columns[member] = values[i_m]
+
+        newdf = pd.DataFrame(columns)
         newdf.attrs = attrs
 
         return newdf
 
-
 if __name__ == '__main__':
     pass
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+__all__ = [
+    'StationInterpolator',
+    'StationInterpolator3D',
+    'get_station_interpolator',
+    'clear_station_interpolator_cache',
+]
+
+# 插值权重缓存，键为(网格hash, 站点hash, method)，超出数量后按最近最少使用淘汰
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_size = 32
+
+
+def _axis_weights(grid, x, method='linear', extrapolate=False):
+    '''
+    计算一维坐标上的插值下标及权重，返回(i0, i1, w0, w1, valid)，超出范围的点valid为False
+    extrapolate=True时超出范围的点按边缘两格点线性外推(与xarray interp的fill_value=None一致)，valid全部为True
+    '''
+    grid = np.asarray(grid, dtype='float64')
+    x = np.asarray(x, dtype='float64')
+    n = grid.size
+    descending = n > 1 and grid[0] > grid[-1]
+    if descending:
+        grid = grid[::-1]
+
+    if extrapolate:
+        valid = np.ones(x.size, dtype='bool')
+    else:
+        valid = (x >= grid[0]) & (x <= grid[-1])
+    if n == 1:
+        i0 = np.zeros(x.size, dtype='int64')
+        i1 = i0.copy()
+        w1 = np.zeros(x.size)
+    else:
+        i0 = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, n - 2)
+        i1 = i0 + 1
+        w1 = (x - grid[i0]) / (grid[i1] - grid[i0])
+        if method == 'nearest':
+            w1 = np.where(w1 > 0.5, 1.0, 0.0)
+        elif method != 'linear':
+            raise Exception('method must be linear or nearest')
+    w0 = 1.0 - w1
+
+    if descending:
+        i0, i1 = n - 1 - i0, n - 1 - i1
+    return i0, i1, w0, w1, valid
+
+
+class StationInterpolator(object):
+    '''
+    [格点到站点的插值权重，按照网格经纬度和站点经纬度预先计算一次稀疏权重矩阵(points, lat*lon)，
+    之后对相同网格的stda插值时只需要对展平后的经纬度维做一次稀疏矩阵乘法]
+
+    Example:
+        interpolator = get_station_interpolator(stda['lon'].values, stda['lat'].values, lon=[116.4, 121.5], lat=[39.9, 31.2])
+        df = stda.stda.interp_tosta(lon=[116.4, 121.5], lat=[39.9, 31.2], interpolator=interpolator)
+    '''
+
+    def __init__(self, grid_lon, grid_lat, lon, lat, method='linear', extrapolate=False):
+        '''
+
+        [计算插值权重]
+
+        Arguments:
+            grid_lon {[list or ndarray]} -- [网格经度]
+            grid_lat {[list or ndarray]} -- [网格纬度]
+            lon {[list or ndarray]} -- [站点经度]
+            lat {[list or ndarray]} -- [站点纬度]
+
+        Keyword Arguments:
+            method {str} -- [插值方法(linear or nearest)] (default: {'linear'})
+            extrapolate {bool} -- [网格范围外的站点是否按边缘格点外推，否则为nan] (default: {False})
+        '''
+        self.grid_lon = np.asarray(grid_lon, dtype='float64')
+        self.grid_lat = np.asarray(grid_lat, dtype='float64')
+        self.lon = np.atleast_1d(np.asarray(lon))
+        self.lat = np.atleast_1d(np.asarray(lat))
+        self.method = method
+        self.extrapolate = extrapolate
+
+        x0, x1, wx0, wx1, xvalid = _axis_weights(self.grid_lon, self.lon, method, extrapolate)
+        y0, y1, wy0, wy1, yvalid = _axis_weights(self.grid_lat, self.lat, method, extrapolate)
+        self.valid = xvalid & yvalid
+
+        # 展平(lat, lon)后四个邻近格点的下标及权重，权重为0的格点不放入矩阵，避免缺测值传播
+        nlon = self.grid_lon.size
+        npoints = self.lon.size
+        index = np.stack([y0 * nlon + x0, y0 * nlon + x1, y1 * nlon + x0, y1 * nlon + x1], axis=-1)
+        weights = np.stack([wy0 * wx0, wy0 * wx1, wy1 * wx0, wy1 * wx1], axis=-1)
+        rows = np.repeat(np.arange(npoints), 4)
+        keep = (weights.ravel() != 0) & np.repeat(self.valid, 4)
+        self.matrix = sparse.csr_matrix((weights.ravel()[keep], (rows[keep], index.ravel()[keep])),
+                                        shape=(npoints, self.grid_lat.size * nlon))
+
+    def match(self, stda):
+        '''[stda的网格是否与计算权重时的网格一致]'''
+        return (stda['lon'].size == self.grid_lon.size and stda['lat'].size == self.grid_lat.size and
+                np.allclose(stda['lon'].values, self.grid_lon) and np.allclose(stda['lat'].values, self.grid_lat))
+
+    def interp_values(self, values):
+        '''
+
+        [对numpy数组插值，最后两维为(lat, lon)]
+
+        Arguments:
+            values {[ndarray]} -- [形状为(..., lat, lon)]
+
+        Returns:
+            [ndarray] -- [形状为(..., points)]
+        '''
+        shape = values.shape[:-2]
+        values = values.reshape(-1, values.shape[-2] * values.shape[-1])
+        data = np.asarray(self.matrix.dot(values.T).T)
+        data[:, ~self.valid] = np.nan
+        return data.reshape(shape + (self.lon.size,))
+
+    def interp(self, stda):
+        '''
+
+        [插值到站点上，结果与stda.interp(lon=('points', lon), lat=('points', lat))一致]
+
+        Arguments:
+            stda {[stda]} -- [stda网格数据]
+
+        Returns:
+            [xarray.DataArray] -- [维度为(member, level, time, dtime, points)]
+        '''
+        if not self.match(stda):
+            raise Exception('StationInterpolator: stda grid is not consistent with the interpolator grid')
+        stda = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+        data = self.interp_values(stda.values)
+
+        return xr.DataArray(data, dims=('member', 'level', 'time', 'dtime', 'points'),
+                            coords={'member': stda['member'].values, 'level': stda['level'].values,
+                                    'time': stda['time'].values, 'dtime': stda['dtime'].values,
+                                    'lon': ('points', self.lon), 'lat': ('points', self.lat)},
+                            attrs=stda.attrs, name=stda.name)
+
+
+def _hash_array(*arrays):
+    sha = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(np.asarray(a, dtype='float64'))
+        sha.update(str(a.shape).encode())
+        sha.update(a.tobytes())
+    return sha.hexdigest()
+
+
+def get_station_interpolator(grid_lon, grid_lat, lon, lat, method='linear', extrapolate=False):
+    '''
+
+    [获取插值权重，相同(网格, 站点, 插值方法, 是否外推)只计算一次]
+
+    Arguments:
+        grid_lon {[list or ndarray]} -- [网格经度]
+        grid_lat {[list or ndarray]} -- [网格纬度]
+        lon {[list or ndarray]} -- [站点经度]
+        lat {[list or ndarray]} -- [站点纬度]
+
+    Keyword Arguments:
+        method {str} -- [插值方法(linear or nearest)] (default: {'linear'})
+        extrapolate {bool} -- [网格范围外的站点是否按边缘格点外推，否则为nan] (default: {False})
+
+    Returns:
+        [StationInterpolator] -- [插值权重]
+    '''
+    key = (_hash_array(grid_lon, grid_lat), _hash_array(lon, lat), method, extrapolate)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    interpolator = StationInterpolator(grid_lon, grid_lat, lon, lat, method=method, extrapolate=extrapolate)
+
+    with _cache_lock:
+        _cache[key] = interpolator
+        while len(_cache) > _cache_size:
+            _cache.popitem(last=False)
+    return interpolator
+
+
+def clear_station_interpolator_cache():
+    '''[清空插值权重缓存]'''
+    with _cache_lock:
+        _cache.clear()
+
+
+class StationInterpolator3D(object):
+    '''
+    [按位势高度插值到站点海拔高度的三维插值权重，先按StationInterpolator计算水平双线性权重，
+    再根据插值到站点上的位势高度，一次性计算所有成员、时次每个站点上下相邻的两个层次及垂直权重，
+    之后对相同网格、相同层次的任意要素插值都只需要一次稀疏矩阵乘法和一次按下标取值]
+
+    Example:
+        interpolator = StationInterpolator3D(hgt, lon=[116.4, 121.5], lat=[39.9, 31.2], alt=[55, 10])
+        tmp_sta = interpolator.interp(tmp)
+    '''
+
+    def __init__(self, hgt, lon, lat, alt, method='linear'):
+        '''
+
+        [计算插值权重]
+
+        Arguments:
+            hgt {[stda]} -- [模式位势高度]
+            lon {[list or ndarray]} -- [站点经度]
+            lat {[list or ndarray]} -- [站点纬度]
+            alt {[list or ndarray]} -- [站点海拔高度(m)]
+
+        Keyword Arguments:
+            method {str} -- [水平插值方法(linear or nearest)] (default: {'linear'})
+        '''
+        hgt = hgt.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+        self.horizontal = get_station_interpolator(hgt['lon'].values, hgt['lat'].values, lon, lat, method=method)
+        self.alt = np.atleast_1d(np.asarray(alt, dtype='float64'))
+        self.coords = {dim: hgt[dim].values for dim in ('member', 'level', 'time', 'dtime')}
+
+        h = self.horizontal.interp_values(np.asarray(hgt.stda.quantity.to('m').magnitude, dtype='float64'))
+
+        # 层次按高度从低到高排列
+        self.level_order = np.argsort(np.nanmean(h, axis=(0, 2, 3, 4)))
+        h = h[:, self.level_order]
+
+        nlevel = h.shape[1]
+        k = np.clip(np.sum(h <= self.alt, axis=1) - 1, 0, max(nlevel - 2, 0))[:, np.newaxis]
+        h0 = np.take_along_axis(h, k, axis=1)[:, 0]
+        h1 = np.take_along_axis(h, np.minimum(k + 1, nlevel - 1), axis=1)[:, 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.where(h1 != h0, (self.alt - h0) / (h1 - h0), 0.0)
+
+        # 形状均为(member, time, dtime, points)
+        self.k = k
+        self.w = w
+        self.valid = (self.alt >= h[:, 0]) & (self.alt <= h[:, -1])
+        self.below_ground = self.alt < h[:, 0]  # 站点低于模式最低层
+
+    def match(self, stda):
+        '''[stda的网格、层次、成员、时次是否与计算权重时的hgt一致]'''
+        if not self.horizontal.match(stda):
+            return False
+        for dim, values in self.coords.items():
+            if stda[dim].size != values.size or not np.all(stda[dim].values == values):
+                return False
+        return True
+
+    def interp_values(self, values):
+        '''
+
+        [对numpy数组插值]
+
+        Arguments:
+            values {[ndarray]} -- [形状为(member, level, time, dtime, lat, lon)]
+
+        Returns:
+            [ndarray] -- [形状为(member, time, dtime, points)]
+        '''
+        v = self.horizontal.interp_values(values)[:, self.level_order]
+        nlevel = v.shape[1]
+        v0 = np.take_along_axis(v, self.k, axis=1)[:, 0]
+        v1 = np.take_along_axis(v, np.minimum(self.k + 1, nlevel - 1), axis=1)[:, 0]
+        data = v0 * (1 - self.w) + v1 * self.w
+        # 权重为0的层次不参与计算，避免缺测值传播
+        data = np.where(self.w == 0, v0, np.where(self.w == 1, v1, data))
+        data[~self.valid] = np.nan
+        return data
+
+    def interp(self, stda):
+        '''
+
+        [插值到站点海拔高度上]
+
+        Arguments:
+            stda {[stda]} -- [stda网格数据，网格及维度需与hgt一致]
+
+        Returns:
+            [xarray.DataArray] -- [维度为(member, time, dtime, points)]
+        '''
+        stda = stda.transpose('member', 'level', 'time', 'dtime', 'lat', 'lon')
+        if not self.match(stda):
+            raise Exception('StationInterpolator3D: stda is not consistent with the hgt used by the interpolator')
+        data = self.interp_values(stda.values)
+
+        return xr.DataArray(data, dims=('member', 'time', 'dtime', 'points'),
+                            coords={'member': stda['member'].values, 'time': stda['time'].values,
+                                    'dtime': stda['dtime'].values, 'lon': ('points', self.horizontal.lon),
+                                    'lat': ('points', self.horizontal.lat), 'alt': ('points', self.alt)},
+                            attrs=stda.attrs, name=stda.name)
@@ -103,7 +103,13 @@ def gridstda_to_stastda(grid_stda_data, points={},method='linear'):
     other = list(set(points.keys()).difference(set(['lon', 'lat', 'id'])))  # points中除去lon lat id之外的其它坐标信息名称
 
     # get points data
-    points_xr = grid_stda_data.interp(lon=('points', points['lon']), lat=('points', points['lat']),method=method)
+    if method in ('linear', 'nearest'):
+        # 相同网格和站点的插值权重只计算一次
+        interpolator = mdgstda.get_station_interpolator(grid_stda_data['lon'].values, grid_stda_data['lat'].values,
+                                                        points['lon'], points['lat'], method=method)
+        points_xr = interpolator.interp(grid_stda_data)
+    else:
+        points_xr = grid_stda_data.interp(lon=('points', points['lon']), lat=('points', points['lat']),method=method)
     # print(points_xr)
     # print(points_xr.values.shape)
 
@@ -112,6 +118,38 @@ def gridstda_to_stastda(grid_stda_data, points={},method='linear'):
     attrs['data_start_columns'] = 6 + len(other)
 
     # points data to pd.DataFrame
+    # 按照level/time/dtime/id的顺序展开成行，member为列，与逐行构造的结果一致
+    nlv, nt, nd, ns = points_xr['level'].size, points_xr['time'].size, points_xr['dtime'].size, points['id'].size
+    columns = {}
+    columns['level'] = np.repeat(points_xr['level'].values, nt * nd * ns)
+    columns['time'] = np.tile(np.repeat(points_xr['time'].values, nd * ns), nlv)
+    columns['dtime'] = np.tile(np.repeat(points_xr['dtime'].values.astype('int64'), ns), nlv * nt)
+    for name in ['id', 'lon', 'lat'] + other:  # 站点信息按照站点顺序重复
+        columns[name] = np.tile(np.asarray(points[name]), nlv * nt * nd)
+    values = points_xr.transpose('member', 'level', 'time', 'dtime', 'points').values.reshape(points_xr['member'].size, -1)
+    for i_m, _m in enumerate(grid_stda_data['member'].values):
+        columns[_m] = values[i_m]
+
+    df = pd.DataFrame(columns)
+    df.attrs = attrs
+
+    return df
+
+
+def _gridstda_to_stastda_rowloop(grid_stda_data, points={}, method='linear'):
+    # 逐行构造DataFrame的原始实现，仅用于_benchmark_gridstda_to_stastda对比结果及耗时
+    points['lon'] = np.array(points['lon'])
+    points['lat'] = np.array(points['lat'])
+    if 'id' in points.keys():
+        points['id'] = np.array(points['id'])
+    else:
+        points['id'] = np.arange(1, points['lon'].size + 1)
+    other = list(set(points.keys()).difference(set(['lon', 'lat', 'id'])))
+
+    points_xr = grid_stda_data.interp(lon=('points', points['lon']), lat=('points', points['lat']), method=method)
+    attrs = deepcopy(grid_stda_data.attrs)
+    attrs['data_start_columns'] = 6 + len(other)
+
     columns = ['level', 'time', 'dtime', 'id', 'lon', 'lat'] + other + list(grid_stda_data['member'].values)
     lines = []
     for i_lv, _lv in enumerate(points_xr['level'].values):
@@ -119,7 +157,7 @@ def gridstda_to_stastda(grid_stda_data, points={},method='linear'):
             for i_d, _d in enumerate(points_xr['dtime'].values):
                 _d = int(_d)
                 for i_id, _id in enumerate(points['id']):
-                    _other = [points[_o][i_id] for _o in other]  # 除去lon lat id之外的其它坐标信息名称对应的数据
+                    _other = [points[_o][i_id] for _o in other]
                     _lon = points['lon'][i_id]
                     _lat = points['lat'][i_id]
                     _data = points_xr.values[:, i_lv, i_t, i_d, i_id]
@@ -128,10 +166,50 @@ def gridstda_to_stastda(grid_stda_data, points={},method='linear'):
 
     df = pd.DataFrame(lines, columns=columns)
     df.attrs = attrs
-
     return df
 
 
+def _benchmark_gridstda_to_stastda(nstation=2400, nlevel=20, nfhour=40, nmember=1, repeat=1):
+    '''
+    gridstda_to_stastda向量化实现与逐行构造实现的耗时对比，并检查两者结果是否一致，
+    返回dict：vectorized/rowloop为平均耗时(秒)，vectorized_df/rowloop_df为结果，equal为是否一致
+    '''
+    import time
+    import datetime
+
+    lat = np.arange(15, 55.01, 0.25)
+    lon = np.arange(70, 140.01, 0.25)
+    members = ['m{}'.format(i) for i in range(nmember)]
+    levels = np.linspace(1000, 100, nlevel)
+    dtimes = np.arange(0, nfhour * 3, 3)
+    grid = mdgstda.numpy_to_gridstda(np.random.rand(nmember, nlevel, 1, nfhour, lat.size, lon.size),
+                                     members, levels, [datetime.datetime(2021, 7, 20, 8)], dtimes, lat, lon, var_name='tmp')
+    points = {'id': np.arange(nstation) + 50000,
+              'lon': np.random.uniform(75, 135, nstation),
+              'lat': np.random.uniform(20, 50, nstation),
+              'alt': np.random.uniform(0, 3000, nstation)}
+
+    result = {}
+    for name, func in [('vectorized', gridstda_to_stastda), ('rowloop', _gridstda_to_stastda_rowloop)]:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            df = func(grid, points=dict(points))
+        result[name] = (time.perf_counter() - t0) / repeat
+        result[name + '_df'] = df
+
+    # 向量化实现使用稀疏插值权重，逐行实现使用xarray interp，两者数值只在舍入误差范围内一致
+    try:
+        pd.testing.assert_frame_equal(result['vectorized_df'], result['rowloop_df'], check_exact=False)
+        result['equal'] = True
+    except AssertionError as e:
+        print(str(e))
+        result['equal'] = False
+    print('rows: {}, vectorized: {:.3f}s, rowloop: {:.3f}s, speedup: {:.1f}x, equal: {}'.format(
+        len(result['vectorized_df']), result['vectorized'], result['rowloop'], result['rowloop'] / result['vectorized'],
+        result['equal']))
+    return result
+
+
 def stastda_copy(data, iscopy_otherdim=True, iscopy_value=True):
     '''
 
@@ -561,4 +639,4 @@ class __STDADataFrameAccessor(object):
 
 
 if __name__ == '__main__':
-    pass
+    _benchmark_gridstda_to_stastda(nstation=2400, nlevel=5, nfhour=10, nmember=3)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.onestep.complexgrid_var.accumulate前缀和累积量与逐时段直接求和的对比
+'''
+
+import datetime
+
+import numpy as np
+import pytest
+
+from metdig.onestep.complexgrid_var import accumulate
+from metdig.utl import utl_stda_grid
+
+INIT_TIME = datetime.datetime(2024, 5, 1, 8)
+LATS = np.arange(30, 35.0)
+LONS = np.arange(110, 116.0)
+MISSING_FHOUR = 3  # 该时效的rain01在(0, 0)格点缺测
+ALL_MISSING_FHOURS = range(1, 7)  # 这些时效的rain01在(1, 1)格点全部缺测
+
+
+def _rain01_values(fhour):
+    rng = np.random.default_rng(fhour)
+    values = rng.gamma(0.5, 2.0, (1, 1, 1, 1, LATS.size, LONS.size)).astype('float32')
+    if fhour == MISSING_FHOUR:
+        values[..., 0, 0] = np.nan
+    if fhour in ALL_MISSING_FHOURS:
+        values[..., 1, 1] = np.nan
+    return values
+
+
+@pytest.fixture
+def fake_reader(monkeypatch):
+    calls = []
+
+    def get_model_grid(data_source=None, init_time=None, fhour=None, data_name=None, var_name=None, **kwargs):
+        calls.append(fhour)
+        return utl_stda_grid.numpy_to_gridstda(_rain01_values(fhour), ['ecmwf'], [0], [init_time], [fhour], LATS, LONS,
+                                               np_input_units='mm', var_name=var_name)
+
+    monkeypatch.setattr(accumulate, 'get_model_grid', get_model_grid)
+    accumulate.clear_accumulator_cache()
+    yield calls
+    accumulate.clear_accumulator_cache()
+
+
+def _direct_sum(fhour, atime):
+    values = np.concatenate([_rain01_values(f) for f in range(fhour - atime + 1, fhour + 1)], axis=3).astype('float64')
+    total = np.nansum(values, axis=3, keepdims=True)
+    return np.where(np.isnan(values).all(axis=3, keepdims=True), np.nan, total)
+
+
+@pytest.mark.parametrize('fhour, atime', [(12, 6), (6, 6), (9, 9), (24, 24)])
+def test_rain01_windows_skip_missing_values(fake_reader, fhour, atime):
+    acc = accumulate.get_accumulator(data_source='fake', data_name='ecmwf', init_time=INIT_TIME, var_name='rain01')
+    rain = acc.window(fhour=fhour, atime=atime)
+
+    np.testing.assert_allclose(rain.values, _direct_sum(fhour, atime), rtol=1e-6, equal_nan=True)
+    assert rain.attrs['var_name'] == 'rain%02d' % atime
+    assert rain['dtime'].values.tolist() == [fhour]
+
+
+def test_missing_hour_only_affects_windows_containing_it(fake_reader):
+    acc = accumulate.get_accumulator(data_source='fake', data_name='ecmwf', init_time=INIT_TIME, var_name='rain01')
+
+    assert np.isnan(acc.window(fhour=6, atime=6).values[..., 1, 1]).all()  # 时段内全部缺测
+    assert not np.isnan(acc.window(fhour=6, atime=6).values[..., 0, 0]).any()  # 只缺一个时次
+    later = acc.window(fhour=12, atime=6).values
+    assert not np.isnan(later).any()
+
+
+def test_long_windows_keep_precision(fake_reader):
+    acc = accumulate.get_accumulator(data_source='fake', data_name='ecmwf', init_time=INIT_TIME, var_name='rain01')
+    acc.window(fhour=240, atime=240)
+
+    for fhour in (30, 120, 240):
+        rain = acc.window(fhour=fhour, atime=3)
+        assert rain.dtype == np.float32
+        np.testing.assert_allclose(rain.values, _direct_sum(fhour, 3), rtol=1e-6, atol=1e-6)
+
+
+def test_fields_read_once(fake_reader):
+    acc = accumulate.get_accumulator(data_source='fake', data_name='ecmwf', init_time=INIT_TIME, var_name='rain01')
+    for fhour in range(6, 25, 6):
+        acc.window(fhour=fhour, atime=6)
+    acc.window(fhour=24, atime=24)
+    assert sorted(fake_reader) == list(range(1, 25))
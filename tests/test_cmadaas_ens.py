@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.io.cmadaas集合预报成员并发读取时缺失成员的处理
+'''
+
+import numpy as np
+import pytest
+import xarray as xr
+
+pytest.importorskip('nmc_met_io')
+
+from metdig.io import cmadaas
+
+LATS = np.arange(30, 35.0)
+LONS = np.arange(110, 116.0)
+
+
+@pytest.fixture
+def fake_member(monkeypatch):
+    def _get_ens_member(fcst_member=None, **kwargs):
+        if fcst_member in (2, 4):
+            raise Exception('member {} not found'.format(fcst_member))
+        values = np.full((1, 1, LATS.size, LONS.size), fcst_member, dtype='float32')
+        return xr.Dataset({'data': (('number', 'time', 'lat', 'lon'), values)},
+                          coords={'number': [fcst_member], 'time': [0], 'lat': LATS, 'lon': LONS})
+
+    monkeypatch.setattr(cmadaas, '_get_ens_member', _get_ens_member)
+
+
+def test_missing_members_kept_as_nan(fake_member):
+    members = list(range(6))
+    data, missing = cmadaas._get_ens_members(members, max_workers=3)
+
+    assert missing == [2, 4]
+    assert data['number'].values.tolist() == members
+    values = data['data'].values
+    assert np.isnan(values[[2, 4]]).all()
+    for m in (0, 1, 3, 5):
+        assert (values[m] == m).all()
+
+
+def test_all_members_missing(fake_member):
+    data, missing = cmadaas._get_ens_members([2, 4])
+    assert data is None
+    assert missing == [2, 4]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.cal.dynamic中整体差分的动力诊断与原逐层次逐时次循环计算结果的回归对比
+'''
+
+import datetime
+
+import numpy as np
+import pytest
+
+import metpy.calc as mpcalc
+from metpy.units import units
+
+from metdig.cal import dynamic
+from metdig.utl import utl_stda_grid
+
+STD_DIMS = ('member', 'level', 'time', 'dtime', 'lat', 'lon')
+LONLAT_DIMS = ('member', 'level', 'time', 'dtime', 'lon', 'lat')
+
+MEMBERS = ['m0', 'm1']
+LEVELS = [850, 700, 500]
+TIMES = [datetime.datetime(2023, 7, 29, 8)]
+DTIMES = [0, 12]
+LATS = np.arange(40, 29.5, -1.0)
+LONS = np.arange(100, 114.5, 1.5)
+
+
+def _field(var_name, base, scale, seed, units_str):
+    rng = np.random.default_rng(seed)
+    shape = (len(MEMBERS), len(LEVELS), len(TIMES), len(DTIMES), LATS.size, LONS.size)
+    data = base + scale * rng.standard_normal(shape)
+    data[0, 1, 0, 1, 3, 4] = np.nan  # 缺测
+    data[1, 0, 0, 0, 7, 0] = np.nan  # 边界缺测
+    return utl_stda_grid.numpy_to_gridstda(data, MEMBERS, LEVELS, TIMES, DTIMES, LATS, LONS,
+                                           np_input_units=units_str, var_name=var_name)
+
+
+@pytest.fixture(scope='module')
+def fields():
+    u = _field('u', 5, 10, 1, 'm/s')
+    v = _field('v', -2, 10, 2, 'm/s')
+    thta = _field('thta', 20, 5, 3, 'degC')
+    pres = utl_stda_grid.gridstda_full_like_by_levels(u, LEVELS)
+    return {'u': u, 'v': v, 'thta': thta, 'pres': pres}
+
+
+def _loop_2d(func, *stdas):
+    # 原实现：对每个(member, level, time, dtime)的二维(lat, lon)切片分别调用metpy
+    dx, dy = mpcalc.lat_lon_grid_deltas(LONS, LATS)
+    lats = np.meshgrid(LONS, LATS)[1] * units('degrees')
+    out = np.full(stdas[0].shape, np.nan)
+    result_units = None
+    for im in range(len(MEMBERS)):
+        for il in range(len(LEVELS)):
+            for it in range(len(TIMES)):
+                for idt in range(len(DTIMES)):
+                    args = [s.isel(member=im, level=il, time=it, dtime=idt).stda.quantity for s in stdas]
+                    res = func(*args, dx=dx, dy=dy, lats=lats)
+                    out[im, il, it, idt] = res.magnitude
+                    result_units = res.units
+    return out, result_units
+
+
+def _loop_pv(thta, pres, u, v):
+    # 原实现：对每个(member, time, dtime)的三维(level, lat, lon)切片分别调用metpy
+    dx, dy = mpcalc.lat_lon_grid_deltas(LONS, LATS)
+    dx = dx[np.newaxis, :, :]
+    dy = dy[np.newaxis, :, :]
+    lats = LATS[np.newaxis, :, np.newaxis] * units('degrees')
+    out = np.full(thta.shape, np.nan)
+    result_units = None
+    for im in range(len(MEMBERS)):
+        for it in range(len(TIMES)):
+            for idt in range(len(DTIMES)):
+                args = [s.isel(member=im, time=it, dtime=idt).stda.quantity for s in (thta, pres, u, v)]
+                res = mpcalc.potential_vorticity_baroclinic(*args, dx, dy, lats)
+                out[im, :, it, idt] = res.magnitude
+                result_units = res.units
+    return out, result_units
+
+
+def _assert_matches(result, expected, expected_units):
+    assert result.dims == STD_DIMS
+    if result.attrs['var_units'] != 'undefined stda':
+        expected = (expected * expected_units).to(result.attrs['var_units']).magnitude
+    np.testing.assert_allclose(result.values, expected, rtol=1e-10, atol=0, equal_nan=True)
+    assert np.isnan(expected).any()
+
+
+CASES = {
+    'vorticity': (dynamic.vorticity, ('u', 'v'),
+                  lambda u, v, dx, dy, lats: mpcalc.vorticity(u, v, dx=dx, dy=dy)),
+    'divergence': (dynamic.divergence, ('u', 'v'),
+                   lambda u, v, dx, dy, lats: mpcalc.divergence(u, v, dx=dx, dy=dy)),
+    'absolute_vorticity': (dynamic.absolute_vorticity, ('u', 'v'),
+                           lambda u, v, dx, dy, lats: mpcalc.absolute_vorticity(u, v, dx, dy, lats)),
+    'var_advect': (dynamic.var_advect, ('thta', 'u', 'v'),
+                   lambda var, u, v, dx, dy, lats: mpcalc.advection(var, u=u, v=v, dx=dx, dy=dy)),
+    'frontogenesis': (dynamic.frontogenesis, ('thta', 'u', 'v'),
+                      lambda thta, u, v, dx, dy, lats: mpcalc.frontogenesis(thta, u, v, dx=dx, dy=dy)),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+@pytest.mark.parametrize('dims', [STD_DIMS, LONLAT_DIMS], ids=['latlon', 'lonlat'])
+def test_2d_diagnostics_match_loop(fields, name, dims):
+    func, arg_names, loop_func = CASES[name]
+    expected, expected_units = _loop_2d(loop_func, *[fields[n] for n in arg_names])
+
+    result = func(*[fields[n].transpose(*dims) for n in arg_names])
+
+    _assert_matches(result.transpose(*STD_DIMS), expected, expected_units)
+
+
+@pytest.mark.parametrize('dims', [STD_DIMS, LONLAT_DIMS], ids=['latlon', 'lonlat'])
+def test_potential_vorticity_baroclinic_match_loop(fields, dims):
+    args = [fields[n] for n in ('thta', 'pres', 'u', 'v')]
+    expected, expected_units = _loop_pv(*args)
+
+    result = dynamic.potential_vorticity_baroclinic(*[a.transpose(*dims) for a in args])
+
+    _assert_matches(result.transpose(*STD_DIMS), expected, expected_units)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.io.era5_manual_download流水线下载的断点续传，使用本地模拟的cds客户端
+'''
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from metdig.io import era5_manual_download
+from metdig.io.lib import config as CONFIG
+from metdig.io.lib import era5_cache_index
+
+VAR_NAMES = ['t2m', 'psfc']
+EXTENT = [100, 104, 30, 33]
+DT_START = datetime.datetime(2021, 1, 30, 8)  # 北京时，多下载前后一天后跨1月、2月两个月
+DT_END = datetime.datetime(2021, 2, 1, 8)
+HOUR = [8, 20]  # 北京时
+
+
+class _Interrupted(BaseException):
+    # 模拟下载被中断，不会被流水线中的except Exception捕获，不写入manifest
+    pass
+
+
+class FakeClient(object):
+    '''[本地模拟的cdsapi.Client，按请求的时间和区域写一个era5格式的netcdf文件]'''
+
+    def __init__(self, log, interrupt_at=None):
+        self.log = log
+        self.interrupt_at = interrupt_at
+
+    def retrieve(self, name, request, target):
+        self.log.append((request['variable'], tuple(request['month']), tuple(request['day'])))
+        if self.interrupt_at is not None and len(self.log) >= self.interrupt_at:
+            with open(target, 'w') as f:
+                f.write('partial')  # 中断时留下不完整的.part文件
+            raise _Interrupted()
+
+        times = []
+        for y in request['year']:
+            for m in request['month']:
+                for d in request['day']:
+                    for t in request['time']:
+                        try:
+                            times.append(pd.Timestamp('{}-{}-{} {}'.format(y, m, d, t)))
+                        except ValueError:
+                            continue
+        north, west, south, east = request['area']
+        lat = np.arange(north, south - 0.5, -1.0)
+        lon = np.arange(west, east + 0.5, 1.0)
+        data = np.random.rand(len(times), lat.size, lon.size)
+        xr.Dataset({'var': (('valid_time', 'latitude', 'longitude'), data)},
+                   coords={'valid_time': times, 'latitude': lat, 'longitude': lon}).to_netcdf(target)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(CONFIG, 'get_cache_dir', lambda: str(tmp_path))
+    return tmp_path
+
+
+def _run(log, interrupt_at=None):
+    return era5_manual_download.era5_sfc_download_usepool(
+        dt_start=DT_START, dt_end=DT_END, var_names=VAR_NAMES, hour=HOUR, extent=EXTENT, max_pool=1,
+        pipeline=True, queue_size=10, client_factory=lambda: FakeClient(log, interrupt_at))
+
+
+def _manifest(cache_dir):
+    with open(os.path.join(str(cache_dir), 'ERA5_DATA', 'manual_download', 'era5_manifest.json')) as f:
+        return json.load(f)
+
+
+def _cached_times(cache_dir, var_name):
+    era5_dir = os.path.join(str(cache_dir), 'ERA5_DATA')
+    return era5_cache_index.cached_times(era5_dir, var_name, EXTENT)
+
+
+def test_resume_after_interrupted_download(cache_dir):
+    log = []
+    assert _run(log, interrupt_at=3) == {'done': 2, None: 2}  # 下载线程在第3个任务中断，第4个任务未开始
+    assert len(log) == 3
+    finished = _manifest(cache_dir)
+    assert sorted(finished.values()) == ['done', 'done']
+    part_files = [f for f in os.listdir(os.path.join(str(cache_dir), 'ERA5_DATA', 'manual_download')) if f.endswith('.part')]
+    assert len(part_files) == 1
+
+    log = []
+    result = _run(log)
+    assert result == {'done': 4}
+    assert len(log) == 2  # 只下载中断时尚未完成的两个任务
+    assert [i[0] for i in log] == ['surface_pressure', 'surface_pressure']
+    assert set(_manifest(cache_dir)) >= set(finished)
+    for var_name in VAR_NAMES:
+        assert len(_cached_times(cache_dir, var_name)) == 10  # 前后各多一天，1月29日至2月2日每天两个时次
+
+    log = []
+    assert _run(log) == {'done': 4}
+    assert log == []  # 全部完成后不再下载
+
+
+def test_resume_splits_downloaded_files_without_downloading(cache_dir, monkeypatch):
+    split_sfc = era5_manual_download._split_sfc
+
+    def interrupted_split(*args, **kwargs):
+        raise _Interrupted()
+
+    log = []
+    monkeypatch.setattr(era5_manual_download, '_split_sfc', interrupted_split)
+    _run(log)
+    assert len(log) == 4
+    assert set(_manifest(cache_dir).values()) == {'downloaded'}
+
+    log = []
+    monkeypatch.setattr(era5_manual_download, '_split_sfc', split_sfc)
+    assert _run(log) == {'done': 4}
+    assert log == []  # 已下载的文件直接拆分，不重复下载
+    for var_name in VAR_NAMES:
+        assert len(_cached_times(cache_dir, var_name)) == 10
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.io.lib.fetch_engine并发读取的超时、重试及整体超时
+'''
+
+import threading
+import time
+
+from metdig.io.lib import fetch_engine
+
+_never = threading.Event()  # 从不set，模拟永远不返回的请求
+
+
+def _fetch(key, block=False, fail=0, calls=None):
+    if calls is not None:
+        calls.append(key)
+        if calls.count(key) <= fail:
+            raise Exception('fail {}'.format(key))
+    if block:
+        _never.wait()
+    return key
+
+
+def _fetch_timed(kwargs_list, **kwargs):
+    t0 = time.time()
+    results = fetch_engine.fetch_concurrent(_fetch, kwargs_list, **kwargs)
+    return results, time.time() - t0
+
+
+def test_results_in_request_order():
+    kwargs_list = [{'key': i} for i in range(10)]
+    assert _fetch_timed(kwargs_list, max_workers=4)[0] == list(range(10))
+
+
+def test_hung_request_does_not_block_queued_requests():
+    kwargs_list = [{'key': 0, 'block': True}, {'key': 1}, {'key': 2}]
+    results, seconds = _fetch_timed(kwargs_list, max_workers=1, timeout=0.5)
+    assert results == [None, 1, 2]
+    assert seconds < 3
+
+
+def test_hung_request_retries_on_fresh_thread():
+    kwargs_list = [{'key': 0, 'block': True}, {'key': 1}]
+    results, seconds = _fetch_timed(kwargs_list, max_workers=1, timeout=0.3, retries=2)
+    assert results == [None, 1]
+    assert seconds < 3
+
+
+def test_retry_after_exception():
+    calls = []
+    kwargs_list = [{'key': i, 'fail': 1, 'calls': calls} for i in range(3)]
+    results, _ = _fetch_timed(kwargs_list, max_workers=2, timeout=5, retries=1)
+    assert results == [0, 1, 2]
+    assert sorted(calls) == [0, 0, 1, 1, 2, 2]
+
+
+def test_total_timeout_abandons_running_and_queued_requests():
+    kwargs_list = [{'key': i, 'block': True} for i in range(4)] + [{'key': 4}]
+    results, seconds = _fetch_timed(kwargs_list, max_workers=2, total_timeout=0.5)
+    assert results == [None] * 5
+    assert seconds < 3
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+'''
+metdig.io.lib.field_cache解码参数区分缓存及按字节数淘汰
+'''
+
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from metdig.io.lib import field_cache
+
+LATS = np.arange(20, 30.0)
+LONS = np.arange(100, 120.0)
+FIELD_BYTES = LATS.size * LONS.size * 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    field_cache.enable_field_cache(cache_dir=str(tmp_path), max_bytes=3 * FIELD_BYTES)
+    field_cache.clear_field_cache()
+    yield tmp_path
+    field_cache.disable_field_cache()
+
+
+@pytest.fixture
+def reader():
+    calls = []
+
+    def get_model_grid(directory, filename=None, varname='data', scale_off=None, **kwargs):
+        calls.append((filename, varname, scale_off))
+        values = np.full((LATS.size, LONS.size), len(calls), dtype='float32')
+        if scale_off is not None:
+            values = values * scale_off[0] + scale_off[1]
+        return xr.Dataset({varname: (('lat', 'lon'), values)}, coords={'lat': LATS, 'lon': LONS})
+
+    get_model_grid.calls = calls
+    return get_model_grid
+
+
+def test_decoding_kwargs_are_part_of_key(cache, reader):
+    data = field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024')
+    scaled = field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024', scale_off=[2.0, 1.0])
+    renamed = field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024', varname='t')
+    assert len(reader.calls) == 3
+    assert 't' in renamed.data_vars
+    assert float(scaled['data'][0, 0]) == 2 * 2 + 1
+
+    # 命中缓存时各自返回对应解码参数的结果，cache参数不参与key
+    assert float(field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024', cache=True)['data'][0, 0]) == float(data['data'][0, 0])
+    assert float(field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024', scale_off=[2.0, 1.0])['data'][0, 0]) == 5
+    assert 't' in field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.024', varname='t').data_vars
+    assert len(reader.calls) == 3
+
+    assert field_cache.contains('ECMWF_HR/TMP/850/', '24050108.024', scale_off=[2.0, 1.0])
+    assert not field_cache.contains('ECMWF_HR/TMP/850/', '24050108.024', scale_off=[1.0, 0.0])
+    assert field_cache.cached_files('ECMWF_HR/TMP/850/') == ['24050108.024']
+
+
+def test_evicts_least_recently_used_over_max_bytes(cache, reader):
+    for fhour in range(3):
+        field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.%03d' % fhour)
+    field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.000')  # 访问后不再是最久未使用
+    field_cache.read_field(reader, 'ECMWF_HR/TMP/850/', '24050108.003')
+
+    info = field_cache.field_cache_info()
+    assert info['fields'] == 3
+    assert info['nbytes'] <= info['max_bytes']
+    assert info['evictions'] == 1
+    assert field_cache.cached_files('ECMWF_HR/TMP/850/') == ['24050108.000', '24050108.002', '24050108.003']
+    evicted = field_cache._field_files(str(cache), field_cache._field_key('ECMWF_HR/TMP/850/', '24050108.001'))
+    assert not any(os.path.exists(f) for f in evicted)